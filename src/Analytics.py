@@ -0,0 +1,385 @@
+"""
+Where players get stuck, from saves, journals and transcripts, however many there are.
+
+    python Analytics.py saves/ sessions.jsonl --processes 4 --out report.json
+
+Inputs are streamed one session at a time and never held whole:
+
+    *.json       a save (GameState.save_state)
+    *.sav        a binary snapshot, or a save slot (which also knows its turn count)
+    *.journal    a SaveJournal: its snapshot, then the journaled commands played over it
+    *.jsonl      transcripts from `main.py --replay --out`, or session streams to replay
+
+Each session is encoded as ids: the rooms it visited, the items it picked up and the
+turn of each pickup, the turn it was solved on, and the first step of the world's hint
+checklist it never got past. The ids of a batch of sessions go into typed arrays
+(array("i")), and each batch is reduced at once into per-room and per-item counts and a
+histogram of turns to solve, so memory is bounded by the batch, not the input. Files are
+independent, so each is reduced in a pool worker and the partial counts are summed.
+"""
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from Commands import COMMANDS, tokenize
+from GameState import GameState
+from Hints import Step, hint_table
+from NameSet import mask_of
+from SaveSlots import read_save
+from Snapshot import BINARY_MAGIC, decode_binary
+from World import DEFAULT_WORLD_FILE, World, load_world
+
+# Sessions encoded before their columns are counted
+BATCH = 4096
+# Turns to solve above this share the last histogram bucket
+MAX_TURNS = 1000
+UNKNOWN = -1
+
+PICKUP = "\nYou pick up the "
+
+
+class SessionEvents(NamedTuple):
+    visited: array            # Room ids
+    items: array              # Item ids picked up, each once, in order
+    turns: array              # The turn of each pickup; UNKNOWN where only the final state is known
+    solved: bool
+    solved_turn: int          # Turns played when solved; UNKNOWN if unsolved or not known
+    stuck: int                # Index of the first checklist step not done; the step count once solved
+
+
+def _events(world: World, state: Dict, items: List[str], turns: List[int], solved_turn: int) -> SessionEvents:
+    room_ids, item_ids = world.room_ids, world.item_ids
+    visited = array("i", (room_ids[room] for room in state.get("visited_locations", ()) if room in room_ids))
+    picked = array("i")
+    picked_turns = array("i")
+    seen = set()
+    for item, turn in zip(items, turns):
+        item_id = item_ids.get(item)
+        if item_id is not None and item_id not in seen:
+            seen.add(item_id)
+            picked.append(item_id)
+            picked_turns.append(turn)
+    inventory = mask_of(item_ids[item] for item in state.get("inventory", ()) if item in item_ids)
+    unlocked = mask_of(room_ids[room] for room in state.get("unlocked", ()) if room in room_ids)
+    solved = bool(state.get("solved"))
+    table = hint_table(world)
+    stuck = table.next_index(inventory, unlocked, solved)
+    return SessionEvents(visited, picked, picked_turns, solved, solved_turn,
+                         len(table.steps) if stuck is None else stuck)
+
+
+def from_state(world: World, state: Dict, turns: int = UNKNOWN) -> SessionEvents:
+    # Only the end is known: what was carried, but not when it was picked up
+    inventory = list(state.get("inventory", ()))
+    solved_turn = turns if state.get("solved") else UNKNOWN
+    return _events(world, state, inventory, [UNKNOWN] * len(inventory), solved_turn)
+
+
+def from_transcript(world: World, result: Dict) -> SessionEvents:
+    items: List[str] = []
+    turns: List[int] = []
+    for turn, (command, response) in enumerate(result["transcript"], 1):
+        # By the verb the command dispatched to, so aliases ("grab") and typos ("tkae") count
+        if response.startswith(PICKUP) and COMMANDS.resolve(tokenize(command)[0]) == "take":
+            items.append(response[len(PICKUP):].split(".", 1)[0])
+            turns.append(turn)
+    solved_turn = len(result["transcript"]) if result.get("solved") else UNKNOWN
+    return _events(world, result["final_state"], items, turns, solved_turn)
+
+
+def from_commands(world: World, commands: Iterable[str], state: Optional[Dict] = None) -> SessionEvents:
+    # Plays the commands, from a saved state if given, watching the inventory grow
+    game_state = GameState(world)
+    game_state.keep_history = False
+    if state is not None:
+        game_state.load_state(state)
+    items: List[str] = []
+    turns: List[int] = []
+    solved_turn = UNKNOWN
+    turn = 0
+    for command in commands:
+        if game_state.is_over:
+            break
+        turn += 1
+        carried = len(game_state.inventory)
+        COMMANDS.dispatch(command, game_state, save_file=None)
+        for item in game_state.inventory[carried:]:
+            items.append(item)
+            turns.append(turn)
+        if game_state.solved and solved_turn == UNKNOWN:
+            solved_turn = turn
+    return _events(world, game_state.save_state(), items, turns, solved_turn)
+
+
+def _read_journal(world: World, filename: str) -> Iterator[SessionEvents]:
+    snapshot_file = filename[:-len(".journal")]
+    state = None
+    if os.path.exists(snapshot_file):
+        with open(snapshot_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    commands: List[str] = []
+    with open(filename, "rb") as f:
+        for index, line in enumerate(f):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # A torn final record
+            if index == 0:
+                # A journal from another generation is already part of the snapshot
+                if state is None or record != {"generation": state.get("journal_generation")}:
+                    break
+            else:
+                commands.append(record)
+    yield from_commands(world, commands, state)
+
+
+def _read_jsonl(world: World, filename: str) -> Iterator[SessionEvents]:
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "transcript" in record:
+                yield from_transcript(world, record)
+            else:
+                yield from_commands(world, record["commands"])
+
+
+def read_sessions(world: World, filename: str) -> Iterator[SessionEvents]:
+    """
+    The sessions recorded in one file, encoded one at a time.
+    """
+    if filename.endswith(".jsonl"):
+        yield from _read_jsonl(world, filename)
+    elif filename.endswith(".journal"):
+        yield from _read_journal(world, filename)
+    elif filename.endswith(".sav"):
+        with open(filename, "rb") as f:
+            data = f.read()
+        if data.startswith(BINARY_MAGIC):
+            yield from_state(world, decode_binary(data, world))
+        else:
+            info, snapshot = read_save(data)
+            yield from_state(world, decode_binary(snapshot, world), info.turns)
+    else:
+        with open(filename, "r", encoding="utf-8") as f:
+            yield from_state(world, json.load(f))
+
+
+def find_files(paths: Iterable[str]) -> Iterator[str]:
+    suffixes = (".json", ".jsonl", ".sav", ".journal")
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, subdirectories, filenames in os.walk(path):
+            subdirectories.sort()
+            names = set(filenames)
+            for filename in sorted(filenames):
+                # A journal's snapshot is read with the journal
+                if filename.endswith(suffixes) and filename + ".journal" not in names:
+                    yield os.path.join(directory, filename)
+
+
+class Summary:
+    """
+    Counts over any number of sessions; summaries of different files add up.
+    """
+
+    def __init__(self, rooms: int, items: int, steps: int) -> None:
+        self.files = 0
+        self.sessions = 0
+        self.solved = 0
+        self.unreadable = 0
+        self.room_visits = array("q", bytes(8 * rooms))
+        self.item_pickups = array("q", bytes(8 * items))
+        # Pickups with a known turn, and the sum of those turns, for the mean
+        self.timed_pickups = array("q", bytes(8 * items))
+        self.pickup_turns = array("q", bytes(8 * items))
+        self.solve_turns = array("q", bytes(8 * (MAX_TURNS + 1)))
+        # Sessions stuck before each checklist step; the last entry counts solved ones
+        self.stuck = array("q", bytes(8 * (steps + 1)))
+        self._clear()
+
+    def _clear(self) -> None:
+        self._rooms = array("i")
+        self._items = array("i")
+        self._turns = array("i")
+        self._solved = array("i")
+        self._stuck = array("i")
+
+    def add(self, events: SessionEvents) -> None:
+        self.sessions += 1
+        self._rooms.extend(events.visited)
+        self._items.extend(events.items)
+        self._turns.extend(events.turns)
+        self._stuck.append(events.stuck)
+        if events.solved:
+            self.solved += 1
+            if events.solved_turn != UNKNOWN:
+                self._solved.append(min(events.solved_turn, MAX_TURNS))
+        if len(self._stuck) >= BATCH:
+            self.flush()
+
+    def flush(self) -> None:
+        # Counting a column is one pass in C (Counter), whatever the batch size
+        for counts, column in ((self.room_visits, self._rooms), (self.item_pickups, self._items),
+                               (self.solve_turns, self._solved), (self.stuck, self._stuck)):
+            for value, count in Counter(column).items():
+                counts[value] += count
+        for item_id, turn in zip(self._items, self._turns):
+            if turn != UNKNOWN:
+                self.timed_pickups[item_id] += 1
+                self.pickup_turns[item_id] += turn
+        self._clear()
+
+    def merge(self, other: "Summary") -> None:
+        other.flush()
+        self.files += other.files
+        self.sessions += other.sessions
+        self.solved += other.solved
+        self.unreadable += other.unreadable
+        for mine, theirs in ((self.room_visits, other.room_visits), (self.item_pickups, other.item_pickups),
+                             (self.timed_pickups, other.timed_pickups), (self.pickup_turns, other.pickup_turns),
+                             (self.solve_turns, other.solve_turns), (self.stuck, other.stuck)):
+            for index, count in enumerate(theirs):
+                if count:
+                    mine[index] += count
+
+
+def _new_summary(world: World) -> Summary:
+    return Summary(len(world.rooms), len(world.item_names), len(hint_table(world).steps))
+
+
+def summarize_file(filename: str, world_file: str = DEFAULT_WORLD_FILE) -> Summary:
+    world = load_world(world_file)
+    summary = _new_summary(world)
+    summary.files = 1
+    try:
+        for events in read_sessions(world, filename):
+            summary.add(events)
+    except (OSError, ValueError, KeyError, TypeError):
+        # Whatever was read before the damage still counts
+        summary.unreadable += 1
+    summary.flush()
+    return summary
+
+
+def _summarize_task(task) -> Summary:
+    filename, world_file = task
+    return summarize_file(filename, world_file)
+
+
+def summarize(paths: Iterable[str], processes: int = 1, world_file: str = DEFAULT_WORLD_FILE) -> Summary:
+    total = _new_summary(load_world(world_file))
+    tasks = ((filename, world_file) for filename in find_files(paths))
+    if processes <= 1:
+        for task in tasks:
+            total.merge(_summarize_task(task))
+        return total
+    with multiprocessing.Pool(processes) as pool:
+        for summary in pool.imap_unordered(_summarize_task, tasks):
+            total.merge(summary)
+    return total
+
+
+def _percentile(histogram: array, fraction: float) -> int:
+    target = fraction * sum(histogram)
+    seen = 0
+    for turns, count in enumerate(histogram):
+        seen += count
+        if count and seen >= target:
+            return turns
+    return 0
+
+
+def describe_step(step: Step) -> str:
+    if step.kind == "take":
+        if step.via is not None:
+            return f"find the {step.item} in the {step.room} (using the {step.via})"
+        return f"find the {step.item} in the {step.room}"
+    if step.kind == "open":
+        return f"get past the locked {step.target} (with the {step.item})"
+    return f"use the {step.item}" + (f" in the {step.room}" if step.room else "")
+
+
+def report(summary: Summary, world: World) -> Dict:
+    summary.flush()
+    sessions = summary.sessions or 1
+    steps = hint_table(world).steps
+    # The funnel follows the winning plan, then every other item that was picked up
+    order = [world.item_ids[step.item] for step in steps if step.kind == "take"]
+    order += [item_id for item_id in range(len(world.item_names))
+              if item_id not in order and summary.item_pickups[item_id]]
+    timed = sum(summary.solve_turns)
+    return {
+        "files": summary.files,
+        "unreadable_files": summary.unreadable,
+        "sessions": summary.sessions,
+        "solved": summary.solved,
+        "heatmap": {world.rooms[room_id].name: count for room_id, count in enumerate(summary.room_visits)},
+        "funnel": [{
+            "item": world.item_names[item_id],
+            "sessions": summary.item_pickups[item_id],
+            "share": summary.item_pickups[item_id] / sessions,
+            "mean_turn": summary.pickup_turns[item_id] / summary.timed_pickups[item_id]
+            if summary.timed_pickups[item_id] else None,
+        } for item_id in order],
+        "time_to_solve": {
+            "sessions": timed,
+            "p50": _percentile(summary.solve_turns, 0.50) if timed else None,
+            "p90": _percentile(summary.solve_turns, 0.90) if timed else None,
+            "p99": _percentile(summary.solve_turns, 0.99) if timed else None,
+            "histogram": {turns: count for turns, count in enumerate(summary.solve_turns) if count},
+        },
+        "stuck": [{"step": describe_step(step), "sessions": summary.stuck[index]}
+                  for index, step in enumerate(steps) if summary.stuck[index]],
+    }
+
+
+def format_report(document: Dict, top: int = 10) -> str:
+    sessions = document["sessions"] or 1
+    lines = [f"{document['sessions']} sessions from {document['files']} files, "
+             f"{document['solved']} solved ({document['solved'] / sessions:.1%})"]
+    if document["unreadable_files"]:
+        lines[0] += f", {document['unreadable_files']} files unreadable"
+    rooms = sorted(document["heatmap"].items(), key=lambda pair: -pair[1])[:top]
+    lines.append("Most visited: " + ", ".join(f"{room} {count / sessions:.0%}" for room, count in rooms))
+    lines.append("Pickups: " + " > ".join(f"{step['item']} {step['share']:.0%}" for step in document["funnel"][:top]))
+    solve = document["time_to_solve"]
+    if solve["sessions"]:
+        lines.append(f"Turns to solve: p50 {solve['p50']}, p90 {solve['p90']}, p99 {solve['p99']} "
+                     f"({solve['sessions']} timed)")
+    stuck = sorted(document["stuck"], key=lambda entry: -entry["sessions"])[:top]
+    if stuck:
+        lines.append("Stuck before:")
+        lines.extend(f"  {entry['sessions'] / sessions:>6.1%}  {entry['step']}" for entry in stuck)
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Summarize where players get stuck, from saves and transcripts.")
+    parser.add_argument("paths", nargs="+", help="Files, or directories searched for .json/.jsonl/.sav/.journal.")
+    parser.add_argument("--world", default=DEFAULT_WORLD_FILE, help="World the sessions were played in.")
+    parser.add_argument("--processes", type=int, default=1, help="Summarize files across this many processes.")
+    parser.add_argument("--out", help="Write the full report as JSON to this file.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = summarize(args.paths, args.processes, args.world)
+    document = report(summary, load_world(args.world))
+    elapsed = time.perf_counter() - start
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(document, f, separators=(",", ":"))
+    print(format_report(document))
+    print(f"({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Command parsing and dispatch.
+
+A command line is split into a verb and its arguments, and the verb is resolved through
+a dict of registered words, so dispatch costs one lookup however many verbs exist. New
+verbs are added with CommandRegistry.register (or the COMMANDS.command decorator) rather
+than by editing a chain of string tests. A word that is not registered is tried as a typo
+or a shortening of one that is, and item names and directions are resolved the same way
+(see Resolver.py).
+"""
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import time
+
+from GameState import GameState
+from Hints import hint
+from Resolver import MIN_TYPO, NameIndex, find_direction, find_item, normalize
+
+# A handler receives the game state, the argument text after the verb, and any
+# session context the front end supplied, and returns (success, message).
+Handler = Callable[..., Tuple[bool, Optional[str]]]
+
+UNKNOWN_COMMAND = "You mutter something unintelligible. Try typing 'help' for a list of commands."
+
+
+class CommandResult(NamedTuple):
+    verb: Optional[str]       # Canonical verb, or None when the input was not recognised
+    success: bool
+    message: Optional[str]
+
+
+class _Registration(NamedTuple):
+    verb: str
+    handler: Handler
+    args: str                 # Arguments implied by an alias, e.g. "n" -> move "north"
+
+
+def tokenize(user_command: str) -> Tuple[str, str]:
+    # Splits "take  Old_Key " into ("take", "old_key"); the argument text keeps inner spaces
+    parts = user_command.strip().lower().split(None, 1)
+    if not parts:
+        return "", ""
+    return parts[0], parts[1] if len(parts) > 1 else ""
+
+
+class CommandRegistry:
+    def __init__(self) -> None:
+        self._words: Dict[str, _Registration] = {}
+        self._help: List[Tuple[str, str]] = []
+        self._help_text: Optional[str] = None
+        # Registered words for guessing misspelt verbs; rebuilt after a word is added
+        self._index: Optional[NameIndex] = None
+
+    def register(self, verb: str, handler: Handler, aliases: Tuple[str, ...] = (),
+                 usage: Optional[str] = None, description: Optional[str] = None) -> None:
+        for word in (verb, *aliases):
+            if word in self._words:
+                raise ValueError(f"'{word}' is already registered to '{self._words[word].verb}'.")
+            self._words[word] = _Registration(verb, handler, "")
+        self._index = None
+        if description is not None:
+            self._help.append((usage or verb, description))
+            self._help_text = None
+
+    def alias(self, word: str, verb: str, args: str = "") -> None:
+        # An alias that also supplies arguments, such as "n" for "move north"
+        if word in self._words:
+            raise ValueError(f"'{word}' is already registered to '{self._words[word].verb}'.")
+        self._words[word] = _Registration(verb, self._words[verb].handler, args)
+        self._index = None
+
+    def command(self, verb: str, aliases: Tuple[str, ...] = (),
+                usage: Optional[str] = None, description: Optional[str] = None) -> Callable[[Handler], Handler]:
+        def decorator(handler: Handler) -> Handler:
+            self.register(verb, handler, aliases, usage, description)
+            return handler
+        return decorator
+
+    def resolve(self, word: str) -> Optional[str]:
+        # The verb a word dispatches to, guessed as dispatch would
+        registration = self._lookup(word)
+        return registration.verb if registration is not None else None
+
+    def _lookup(self, word: str) -> Optional[_Registration]:
+        registration = self._words.get(word)
+        if registration is None and word:
+            registration = self.guess(word)
+        return registration
+
+    def guess(self, word: str) -> Optional[_Registration]:
+        # A misspelt or shortened word ("exmaine", "invent"), if it can only mean one thing.
+        # Words that run on past a registered one ("lookout", "user") are not guessed at.
+        if len(word) < MIN_TYPO:
+            return None
+        if any(word[:end] in self._words for end in range(2, len(word))) and \
+                not any(known.startswith(word) for known in self._words):
+            return None
+        if self._index is None:
+            self._index = NameIndex([known for known in self._words if len(known) > 1], min_prefix=MIN_TYPO)
+        registrations = {self._words[known] for known in self._index.find(word)}
+        return registrations.pop() if len(registrations) == 1 else None
+
+    def help_lines(self) -> List[str]:
+        return [f"  {usage:<18}- {description}" for usage, description in self._help]
+
+    def help_text(self) -> str:
+        # Rebuilt only after a new verb is registered
+        if self._help_text is None:
+            self._help_text = "\n".join(self.help_lines())
+        return self._help_text
+
+    def dispatch(self, user_command: str, game_state: GameState, **context) -> CommandResult:
+        word, args = tokenize(user_command)
+        registration = self._lookup(word)
+        if registration is None:
+            return CommandResult(None, False, UNKNOWN_COMMAND)
+        # Each recognised command is a turn that undo and rewind can take back
+        history = game_state.history or game_state.start_history()
+        if history is not None:
+            history.begin()
+        try:
+            if context:
+                success, message = registration.handler(game_state, args or registration.args, **context)
+            else:
+                success, message = registration.handler(game_state, args or registration.args)
+        finally:
+            if history is not None:
+                history.end()
+        return CommandResult(registration.verb, success, message)
+
+
+COMMANDS = CommandRegistry()
+
+
+def _inventory_text(game_state: GameState) -> str:
+    return ", ".join(game_state.inventory) if game_state.inventory else "nothing"
+
+
+def _location_title(game_state: GameState) -> str:
+    return game_state.world.room(game_state.current_location).title
+
+
+def _item_named(game_state: GameState, args: str, room: bool = True,
+                inventory: bool = True) -> Tuple[str, Optional[str]]:
+    # The item meant, or a question when several fit; a name that fits nothing is passed on for the usual reply
+    matches = find_item(game_state, args, room, inventory)
+    if len(matches) == 1:
+        return matches[0], None
+    if not matches:
+        return normalize(args), None
+    shown = [f"the {name}" for name in matches[:5]]
+    if len(matches) > 5:
+        shown.append(f"one of {len(matches) - 5} others")
+    return args, f"Which do you mean: {', '.join(shown[:-1])} or {shown[-1]}?"
+
+
+@COMMANDS.command("save", usage="save <slot>", description="Save your game to a named slot.")
+def _save(game_state: GameState, args: str, slots=None, **context) -> Tuple[bool, Optional[str]]:
+    if slots is None:
+        return False, "Save slots are not available here."
+    if not args:
+        return False, "Save to which slot? Try 'save before_cellar'."
+    try:
+        slots.save(args, game_state)
+    except ValueError as e:
+        return False, str(e)
+    return True, f"Game saved to slot '{args}'."
+
+
+@COMMANDS.command("saves", description="List your save slots.")
+def _saves(game_state: GameState, args: str, slots=None, **context) -> Tuple[bool, Optional[str]]:
+    saved = slots.list() if slots is not None else []
+    if not saved:
+        return True, "You have no saved games."
+    lines = ["Saved games:"]
+    for info in sorted(saved, key=lambda info: info.saved_at, reverse=True):
+        location = game_state.world.room(info.location).title if info.location in game_state.world.room_ids \
+            else info.location
+        saved_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(info.saved_at))
+        lines.append(f"  {info.name:<18}- {location}, turn {info.turns}, {saved_at}")
+    return True, "\n".join(lines)
+
+
+@COMMANDS.command("load", usage="load <slot>", description="Load a game saved to a slot.")
+def _load(game_state: GameState, args: str, journal=None, save_file: Optional[str] = "savegame.json",
+          slots=None, **context) -> Tuple[bool, Optional[str]]:
+    if args:
+        if slots is None:
+            return False, "Save slots are not available here."
+        try:
+            info = slots.load(args, game_state)
+        except FileNotFoundError:
+            return False, f"There is no save in slot '{args}'."
+        except ValueError as e:
+            return False, str(e)
+        if journal is not None:
+            # A new starting point for the journal, rather than a "load" record it could not replay
+            journal.compact(game_state)
+        return True, f"Game loaded from slot '{info.name}'.\nYou are in the {_location_title(game_state)}."
+    if journal is None and save_file is None:
+        # Headless runs have no save to read from
+        return False, "Saving and loading are disabled."
+    try:
+        if journal is not None:
+            journal.recover(game_state)
+        else:
+            game_state.load_from_file(save_file)
+        return True, "Game successfully loaded!"
+    except FileNotFoundError:
+        return False, "No save game file found."
+    except ValueError:
+        return False, "File is corrupted."
+
+
+@COMMANDS.command("look", aliases=("l",), description="Describe your current surroundings.")
+def _look(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    # Describe the current location thoroughly
+    return True, f"\nYou are currently in the {_location_title(game_state)}.\n\n{game_state.describe_current_location()}"
+
+
+@COMMANDS.command("move", usage="move <direction>", description="Move north, south, east, west, etc.")
+def _move(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    if not args:
+        return False, "Move where? Try 'move north', 'move east', etc."
+    word = args.split()[0]
+    success, message = game_state.move_player(find_direction(game_state.world, word) or word)
+    if not success:
+        return False, message
+    # After moving successfully, describe the new location
+    location_description = game_state.describe_current_location()
+    return True, f"\n{message}\n\nYou are now in the {_location_title(game_state)}.\n\n{location_description}"
+
+
+@COMMANDS.command("go", usage="go <room>", description="Walk to a room you have already visited.")
+def _go(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    if not args:
+        return False, "Go where? Try 'go garden' or 'go north'."
+    if args in game_state.world.direction_ids:
+        return _move(game_state, args)
+    destination = "_".join(args.split())
+    if destination.startswith("the_"):
+        destination = destination[4:]
+    if destination not in game_state.world.room_ids:
+        direction = find_direction(game_state.world, destination)
+        if direction is not None:
+            return _move(game_state, direction)
+        return False, f"You don't know of any {args} here."
+    success, message = game_state.travel_to(destination)
+    if not success:
+        return False, message
+    return True, f"\n{message}\n\nYou are now in the {_location_title(game_state)}.\n\n{game_state.describe_current_location()}"
+
+
+@COMMANDS.command("take", aliases=("get", "grab"), usage="take <item>", description="Pick up an item in your current location.")
+def _take(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    if not args:
+        return False, "Take what? Specify an item name."
+    item, question = _item_named(game_state, args, inventory=False)
+    if question is not None:
+        return False, question
+    success, message = game_state.pick_up_item(item)
+    if not success:
+        return False, message
+    # Mention the updated inventory after picking up an item
+    return True, f"{message}\n\nYou now carry: {_inventory_text(game_state)}"
+
+
+@COMMANDS.command("use", usage="use <item>", description="Use an item from your inventory.")
+def _use(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    if not args:
+        return False, "Use what? Specify an item you currently have."
+    item, question = _item_named(game_state, args, room=False)
+    if question is not None:
+        return False, question
+    success, message = game_state.use_item(item)
+    if not success:
+        return False, message
+    # Using an item might change the environment or inventory
+    return True, f"{message}\nYour current inventory: {_inventory_text(game_state)}"
+
+
+@COMMANDS.command("examine", aliases=("x", "inspect", "read"), usage="examine <item>", description="Take a closer look at an item.")
+def _examine(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    if not args:
+        return False, "Examine what? Specify an item to examine."
+    item, question = _item_named(game_state, args)
+    if question is not None:
+        return False, question
+    return True, game_state.examine_item(item)
+
+
+@COMMANDS.command("inventory", aliases=("inv", "i"), usage="inventory (inv)", description="Check what you are carrying.")
+def _inventory(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    return True, f"\nYou currently carry: {_inventory_text(game_state)}"
+
+
+@COMMANDS.command("undo", usage="undo [n]", description="Take back your last move (or last n moves).")
+def _undo(game_state: GameState, args: str, journal=None, **context) -> Tuple[bool, Optional[str]]:
+    history = game_state.history
+    if args and not args.isdigit():
+        return False, "Undo how many moves? Try 'undo' or 'undo 3'."
+    undone = history.undo(int(args) if args else 1) if history is not None else 0
+    if not undone:
+        return False, "There is nothing to undo."
+    if journal is not None:
+        # Replaying "undo" on recovery would have no history to undo, so the result is saved instead
+        journal.compact(game_state)
+    moves = "move" if undone == 1 else f"{undone} moves"
+    return True, f"You retrace your steps, taking back your last {moves}.\nYou are in the {_location_title(game_state)}."
+
+
+@COMMANDS.command("rewind", usage="rewind <turn>", description="Return to how things stood after a given turn.")
+def _rewind(game_state: GameState, args: str, journal=None, **context) -> Tuple[bool, Optional[str]]:
+    history = game_state.history
+    if history is None:
+        return False, "There is nothing to rewind."
+    if not args.isdigit():
+        return False, "Rewind to which turn? Try 'rewind 0' to start over."
+    try:
+        history.rewind(int(args))
+    except ValueError as e:
+        return False, str(e)
+    if journal is not None:
+        journal.compact(game_state)
+    return True, f"Time folds back to turn {args}.\nYou are in the {_location_title(game_state)}."
+
+
+@COMMANDS.command("hint", description="Get a nudge when you are stuck.")
+def _hint(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    return True, hint(game_state)
+
+
+@COMMANDS.command("quit", aliases=("exit", "q"), description="Quit the game.")
+def _quit(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    game_state.is_over = True
+    return True, "\nYou choose to step away, leaving the mystery unsolved."
+
+
+@COMMANDS.command("help", aliases=("commands",))
+def _help(game_state: GameState, args: str, **context) -> Tuple[bool, Optional[str]]:
+    return True, (
+        "Available commands:\n"
+        + COMMANDS.help_text() + "\n"
+        "\n"
+        "Hints:\n"
+        "  - 'look' often to rediscover details about your location.\n"
+        "  - If you find keys or tools, 'use' them where appropriate.\n"
+        "  - Shortcuts: n/s/e/w/u/d to move, 'x' to examine, 'inv' for inventory.\n"
+        "  - Part of a name will do, e.g. 'take ledger' or 'examine the journal'.\n"
+    )
+
+
+for _direction in ("north", "south", "east", "west", "up", "down"):
+    COMMANDS.alias(_direction, "move", _direction)
+    COMMANDS.alias(_direction[0], "move", _direction)
@@ -0,0 +1,170 @@
+"""
+Content packs: a world's room descriptions and item texts in one memory-mapped file.
+
+Layout (little-endian):
+
+    header   magic "MMCP", version u16, room count u32, item count u32, names crc32 u32
+    offsets  (room count + 1) u64 room text offsets, then (item count + 1) u64 item text offsets
+    blobs    UTF-8 text
+
+Text i spans offsets[i] to offsets[i + 1]; an empty item text means the item has none.
+The file is read through mmap, so every process serving the world shares one copy in the
+page cache, and a text is only decoded when a player looks or examines; the last few
+decoded texts are kept in a small LRU.
+
+A world definition refers to its pack with "content_pack" instead of carrying room
+descriptions and an "item_text" file:
+
+    python ContentPack.py data/manor.json --out manor_packed.json
+"""
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+PACK_MAGIC = b"MMCP"
+PACK_VERSION = 1
+_HEADER = struct.Struct("<4sHIII")
+_OFFSET = 8
+
+
+def names_crc(room_names: Sequence[str], item_names: Sequence[str]) -> int:
+    # Ties a pack to the ids of the world it was built for
+    return zlib.crc32("\0".join(room_names).encode("utf-8") + b"\1" + "\0".join(item_names).encode("utf-8"))
+
+
+def write_pack(filename: str, room_names: Sequence[str], room_texts: Sequence[str],
+               item_names: Sequence[str], item_texts: Sequence[Optional[str]]) -> None:
+    room_blobs = [text.encode("utf-8") for text in room_texts]
+    item_blobs = [(text or "").encode("utf-8") for text in item_texts]
+    offsets = array("Q")
+    position = _HEADER.size + _OFFSET * (len(room_blobs) + len(item_blobs) + 2)
+    for blobs in (room_blobs, item_blobs):
+        for blob in blobs:
+            offsets.append(position)
+            position += len(blob)
+        offsets.append(position)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    with open(filename, "wb") as f:
+        f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(room_blobs), len(item_blobs),
+                             names_crc(room_names, item_names)))
+        f.write(offsets.tobytes())
+        for blob in room_blobs + item_blobs:
+            f.write(blob)
+
+
+class ContentPack:
+    """
+    Read-only access to a pack. Only the mapping, a view of its offset table and the
+    LRU of decoded strings live in the process.
+    """
+
+    def __init__(self, filename: str, item_ids: Dict[str, int], cache_size: int = 256) -> None:
+        self.filename = filename
+        self._item_ids = item_ids
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[int, str]" = OrderedDict()
+        with open(filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, self.room_count, self.item_count, self.crc = _HEADER.unpack_from(self._map, 0)
+        except struct.error as e:
+            raise ValueError(f"{filename} is not a content pack.") from e
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{filename} is not a content pack.")
+        if version != PACK_VERSION:
+            raise ValueError(f"Content pack version {version} is not supported.")
+        table_end = _HEADER.size + _OFFSET * (self.room_count + self.item_count + 2)
+        if len(self._map) < table_end:
+            raise ValueError(f"{filename} is truncated.")
+        if sys.byteorder == "little":
+            # A view straight into the mapping: the offset table is never copied
+            self._offsets = memoryview(self._map)[_HEADER.size:table_end].cast("Q")
+        else:
+            self._offsets = array("Q", self._map[_HEADER.size:table_end])
+            self._offsets.byteswap()
+
+    def check(self, room_names: Sequence[str], item_names: Sequence[str]) -> None:
+        if (self.room_count, self.item_count) != (len(room_names), len(item_names)) \
+                or self.crc != names_crc(room_names, item_names):
+            raise ValueError(f"Content pack {self.filename} was built for a different world.")
+
+    def _text(self, index: int) -> str:
+        cache = self._cache
+        text = cache.get(index)
+        if text is not None:
+            cache.move_to_end(index)
+            return text
+        text = str(self._map[self._offsets[index]:self._offsets[index + 1]], "utf-8")
+        cache[index] = text
+        if len(cache) > self._cache_size:
+            cache.popitem(last=False)
+        return text
+
+    def room_description(self, room_id: int) -> str:
+        return self._text(room_id)
+
+    def describe(self, item_name: str) -> Optional[str]:
+        # Same interface as ItemCatalog
+        item_id = self._item_ids.get(item_name)
+        if item_id is None:
+            return None
+        return self._text(self.room_count + 1 + item_id) or None
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self._cache)
+
+    def close(self) -> None:
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._map.close()
+
+
+def pack_world(definition: Dict, item_texts: Dict[str, str], pack_filename: str) -> Dict:
+    """
+    Writes the definition's text to a pack and returns the definition without it, ready
+    to be saved beside the pack. Ids follow World's numbering of rooms and items.
+    """
+    from World import World  # World opens packs itself, so import it only here
+
+    world = World(dict(definition, item_text=None))
+    room_names = [room.name for room in world.rooms]
+    write_pack(pack_filename, room_names, [room.description for room in world.rooms],
+               world.item_names, [item_texts.get(name) for name in world.item_names])
+    rooms = {name: {key: value for key, value in room.items() if key != "description"}
+             for name, room in definition["rooms"].items()}
+    stripped = {key: value for key, value in definition.items() if key not in ("rooms", "item_text")}
+    stripped["rooms"] = rooms
+    stripped["content_pack"] = os.path.basename(pack_filename)
+    return stripped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move a world's text into a memory-mapped content pack.")
+    parser.add_argument("world", help="World definition with inline descriptions.")
+    parser.add_argument("--out", required=True, help="Packed world definition to write; the pack goes beside it.")
+    args = parser.parse_args()
+
+    with open(args.world, "r", encoding="utf-8") as f:
+        definition = json.load(f)
+    item_texts: Dict[str, str] = {}
+    if definition.get("item_text"):
+        with open(os.path.join(os.path.dirname(os.path.abspath(args.world)), definition["item_text"]),
+                  "r", encoding="utf-8") as f:
+            item_texts = json.load(f)
+    pack_filename = os.path.splitext(args.out)[0] + ".pack"
+    stripped = pack_world(definition, item_texts, pack_filename)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(stripped, f, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    main()
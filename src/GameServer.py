@@ -0,0 +1,409 @@
+"""
+Asyncio line-protocol server hosting many concurrent game sessions in one process.
+
+Every connection gets its own GameState. With a SessionManager, the server only keeps
+the sessions of recently active players in memory, and idle ones are hibernated to
+disk until their next command. With a SharedWorld, every connection is a detective in
+one shared manor: commands run on a thread pool under the shared world's per-room
+locks, and room events reach the other players in the room between their replies.
+With several worker processes (--workers), a supervisor hands each connection to one
+of them; see ShardedServer.py. Each line the client sends is run through
+process_command, and the reply is followed by a "\\n> " prompt, so clients can frame
+replies by reading up to the next prompt.
+
+Each session is known by a random token, unique across restarts and worker processes.
+Wherever sessions are kept, hibernated or saved to --save-dir, the player is told theirs,
+and a connection that sends "resume <token>" carries on with that session; a session
+whose game is over is deleted.
+
+    python GameServer.py --port 4000
+    python GameServer.py --unix /tmp/manor.sock
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import functools
+import itertools
+import logging
+import os
+import re
+import signal
+import socket
+import time
+import uuid
+
+from GameLoop import INTRO, process_command
+from GameState import GameState
+import Metrics
+from Metrics import Histogram
+from SessionManager import SessionManager
+from SharedWorld import SharedWorld
+from World import World, load_world
+
+PROMPT = "\n> "
+MAX_LINE = 4096
+SESSION_TOKEN = re.compile(r"[0-9a-f]{32}")
+COMMAND_FAILED = "Something went wrong with that command. Try something else."
+
+log = logging.getLogger(__name__)
+
+# Passes a connection's socket, the token it resumes and the bytes read after it on to another process
+Redirect = Callable[[int, str, bytes], bool]
+
+
+class _Outbox:
+    """
+    Room events waiting to be written to one connection. Events may arrive from any
+    thread; they are written from the event loop, all that have gathered in one write,
+    and never wait for the client: a client too far behind loses events instead.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter, limit: int,
+                 latency: Histogram) -> None:
+        self._loop = loop
+        self._writer = writer
+        self._limit = limit
+        self._latency = latency
+        self._pending: List[tuple] = []
+        self._scheduled = False
+        self.dropped = 0
+
+    def post(self, text: str, timestamp: int) -> None:
+        self._pending.append((text, timestamp))
+        if not self._scheduled:
+            # A second flush scheduled by a racing thread finds nothing left to write
+            self._scheduled = True
+            self._loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self) -> None:
+        self._scheduled = False
+        pending, self._pending = self._pending, []
+        if not pending or self._writer.is_closing():
+            return
+        if self._writer.transport.get_write_buffer_size() > self._limit:
+            self.dropped += len(pending)
+            return
+        self._writer.write("".join(f"\n* {text}" for text, _ in pending).encode("utf-8"))
+        now = time.perf_counter_ns()
+        for _, timestamp in pending:
+            self._latency.record(now - timestamp)
+
+
+class GameServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, unix_path: Optional[str] = None,
+                 read_timeout: float = 600.0, write_timeout: float = 30.0,
+                 output_buffer: int = 64 * 1024, save_dir: Optional[str] = None,
+                 world: Optional[World] = None, backlog: int = 1024,
+                 sessions: Optional[SessionManager] = None, shared: Optional[SharedWorld] = None,
+                 threads: int = 8, redirect: Optional[Redirect] = None) -> None:
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        # High-water mark of each connection's output buffer; writers wait for the
+        # client to drain below it before the next command is read
+        self.output_buffer = output_buffer
+        self.save_dir = save_dir
+        self.world = world if world is not None else load_world()
+        self.backlog = backlog
+        self.sessions = sessions
+        self.shared = shared
+        # Set in a worker process, to pass a resuming connection to the worker that holds the session
+        self.redirect = redirect
+        self.commands_handled = 0
+        self.commands_failed = 0
+        # Shared-world mode: commands run on a thread pool, and room events are timed until written
+        self.broadcast_latency = Histogram()
+        self.events_dropped = 0
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="detective") if shared is not None else None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamReader] = {}
+        self._closing = False
+        # Numbers connections for player names in a shared world; sessions are keyed by token
+        self._session_ids = itertools.count(1)
+
+    @property
+    def address(self):
+        if self.unix_path:
+            return self.unix_path
+        return self._server.sockets[0].getsockname()[:2]
+
+    @property
+    def active_sessions(self) -> int:
+        return len(self._connections)
+
+    async def start(self) -> None:
+        if self._server is not None:
+            return
+        if self.unix_path:
+            self._server = await asyncio.start_unix_server(
+                self._handle_connection, path=self.unix_path, limit=MAX_LINE, backlog=self.backlog)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle_connection, self.host, self.port, limit=MAX_LINE, backlog=self.backlog)
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    async def shutdown(self) -> None:
+        # Stop accepting, then end every session; each one saves itself on the way out.
+        # Sessions are ended by feeding EOF to their readers rather than by cancelling,
+        # so a session never stops halfway through a command.
+        if self._server is None and not self._connections:
+            return
+        self._closing = True
+        if self._server is not None:
+            self._server.close()
+        connections = list(self._connections)
+        for reader in self._connections.values():
+            reader.feed_eof()
+        if connections:
+            _, stragglers = await asyncio.wait(connections, timeout=self.write_timeout)
+            for task in stragglers:
+                task.cancel()
+            await asyncio.gather(*stragglers, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+
+    async def adopt(self, sock: socket.socket, session_key: str, resume: Optional[str] = None,
+                    pending: bytes = b"") -> None:
+        """
+        Serves a connection accepted by another process (see ShardedServer), as session
+        session_key. A connection redirected to resume a session starts with its "resume"
+        command instead of the greeting, followed by whatever it had sent after it.
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_LINE)
+        # Ahead of anything the socket has yet to deliver
+        reader.feed_data(pending)
+        protocol = asyncio.StreamReaderProtocol(reader)
+        transport, _ = await loop.connect_accepted_socket(lambda: protocol, sock)
+        writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+        await self._handle_connection(reader, writer, session_key, resume)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                                 session_key: Optional[str] = None, resume: Optional[str] = None) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = reader
+        session_id = next(self._session_ids)
+        if session_key is None:
+            session_key = uuid.uuid4().hex
+        # Tokens this connection was placed by, whose sessions this process would hold
+        placed = {session_key, resume}
+        handed_over = False
+        outbox = None
+        if self.shared is not None:
+            outbox = _Outbox(asyncio.get_running_loop(), writer, self.output_buffer, self.broadcast_latency)
+            game_state = self.shared.join(f"detective{session_id}", outbox.post)
+        elif self.sessions is not None:
+            game_state = self.sessions.get(session_key)
+        else:
+            game_state = GameState(self.world)
+        writer.transport.set_write_buffer_limits(high=self.output_buffer)
+        over = False
+        greeting = INTRO
+        if self.resumable:
+            greeting += f"\n\nYour session is {session_key}. To come back to it later, start with 'resume {session_key}'."
+        try:
+            if resume is None:
+                await self._send(writer, greeting + PROMPT)
+            while not over:
+                if self.sessions is not None:
+                    # Holding no reference while the player is idle lets the manager hibernate the session
+                    game_state = None
+                try:
+                    if resume is not None:
+                        line, resume = f"resume {resume}\n".encode("ascii"), None
+                    else:
+                        line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+                except asyncio.TimeoutError:
+                    await self._send(writer, "\nYou linger in silence for too long. The session ends.\n")
+                    break
+                except (asyncio.LimitOverrunError, ValueError):
+                    await self._send(writer, "\nThat command is far too long.\n")
+                    break
+                if not line:
+                    if self._closing:
+                        farewell = "\nThe manor closes its doors for the night."
+                        if self.save_dir is not None or self.sessions is not None:
+                            farewell += " Your progress has been saved."
+                        await self._send(writer, farewell + "\n")
+                    break
+
+                command = line.decode("utf-8", "replace")
+                if self.resumable and command.split(None, 1)[:1] == ["resume"]:
+                    args = command.split(None, 1)[1:]
+                    token = args[0].strip().lower() if args else ""
+                    if self.redirect is not None and token not in placed and SESSION_TOKEN.fullmatch(token):
+                        # The session may be held by another worker; whatever the player sent after
+                        # "resume" goes along with the connection
+                        writer.transport.pause_reading()
+                        reader.feed_eof()
+                        pending = await reader.read()
+                        handed_over = self.redirect(writer.get_extra_info("socket").fileno(), token, pending)
+                        if not handed_over:
+                            await self._send(writer, "\nThe manor cannot find that session just now. Try again later.\n")
+                        break
+                    session_key, game_state, reply = await self._resume(session_key, game_state, args)
+                    await self._send(writer, reply + PROMPT)
+                    continue
+                if game_state is None:
+                    game_state = self.sessions.get(session_key)
+                # save_file=None keeps a bare "load" from reading the save in the server's working directory
+                try:
+                    if self._executor is not None:
+                        result = await asyncio.get_running_loop().run_in_executor(
+                            self._executor, functools.partial(process_command, command, game_state, save_file=None))
+                    else:
+                        result = process_command(command, game_state, save_file=None)
+                except Exception:
+                    # A bug in one command should cost the player that command, not the connection
+                    log.exception("Command %r failed", command.strip())
+                    self.commands_failed += 1
+                    result = COMMAND_FAILED
+                self.commands_handled += 1
+
+                over = game_state.is_over
+                if over:
+                    await self._send(writer, f"{result or ''}\n\nThanks for playing.\n")
+                else:
+                    await self._send(writer, f"{result or ''}{PROMPT}")
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            if self.shared is not None:
+                self.shared.leave(game_state)
+                self.events_dropped += outbox.dropped
+            elif self.sessions is not None:
+                if over:
+                    # A finished game is never resumed
+                    self.sessions.discard(session_key)
+                else:
+                    self.sessions.hibernate(session_key)
+            elif over:
+                await self._remove_save(session_key)
+            else:
+                await self._save_session(session_key, game_state)
+            writer.close()
+
+    @property
+    def resumable(self) -> bool:
+        # Whether sessions outlive their connections, hibernated or saved, to be resumed by token
+        return self.shared is None and (self.sessions is not None or self.save_dir is not None)
+
+    async def _resume(self, session_key: str, game_state: Optional[GameState],
+                      args: List[str]) -> Tuple[str, Optional[GameState], str]:
+        # Switches the connection to the session of a token; the one it leaves can be resumed in turn
+        token = args[0].strip().lower() if args else ""
+        refused = "There is no session to resume with that token."
+        if not SESSION_TOKEN.fullmatch(token):
+            return session_key, game_state, refused
+        if self.sessions is not None:
+            if not self.sessions.exists(token):
+                return session_key, game_state, refused
+            if token != session_key:
+                self.sessions.hibernate(session_key)
+            resumed = self.sessions.get(token)
+        elif token == session_key:
+            resumed = game_state
+        else:
+            resumed = GameState(self.world)
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, resumed.load_from_file, self._save_path(token))
+            except (OSError, ValueError):
+                return session_key, game_state, refused
+            await self._save_session(session_key, game_state)
+        return token, resumed, (f"You pick up where you left off.\n"
+                                f"You are in the {resumed.world.room(resumed.current_location).title}.")
+
+    async def _send(self, writer: asyncio.StreamWriter, text: str) -> None:
+        writer.write(text.encode("utf-8"))
+        # Backpressure: only waits when the buffer is above the high-water mark
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    def _save_path(self, session_key: str) -> str:
+        return os.path.join(self.save_dir, f"session-{session_key}.json")
+
+    async def _save_session(self, session_key: str, game_state: GameState) -> None:
+        if self.save_dir is None:
+            return
+        await asyncio.get_running_loop().run_in_executor(None, game_state.save_to_file, self._save_path(session_key))
+
+    async def _remove_save(self, session_key: str) -> None:
+        # Including one written when an earlier connection to the session ended
+        if self.save_dir is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, os.remove, self._save_path(session_key))
+        except FileNotFoundError:
+            pass
+
+
+async def run_server(server: GameServer) -> None:
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Serving the manor on {server.address}")
+    serving = asyncio.ensure_future(server.serve_forever())
+    await stop.wait()
+    serving.cancel()
+    await server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Host Manor Murder Mystery sessions over TCP or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--unix", dest="unix_path", help="Listen on a Unix socket instead of TCP.")
+    parser.add_argument("--read-timeout", type=float, default=600.0)
+    parser.add_argument("--save-dir", help="Directory that receives each session's save when it ends.")
+    parser.add_argument("--hibernate-dir", help="Hibernate idle sessions to this directory.")
+    parser.add_argument("--max-resident", type=int, default=10000,
+                        help="Sessions kept in memory before the least recently used is hibernated.")
+    parser.add_argument("--max-idle", type=float, default=300.0,
+                        help="Seconds without a command before a session is hibernated.")
+    parser.add_argument("--shared", action="store_true", help="Put every player in one shared manor.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Spread sessions over this many worker processes (see ShardedServer.py).")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on localhost:PORT/metrics.")
+    args = parser.parse_args()
+
+    if args.save_dir:
+        os.makedirs(args.save_dir, exist_ok=True)
+    if args.metrics_port is not None:
+        Metrics.enable().serve(port=args.metrics_port)
+    if args.workers:
+        from ShardedServer import Supervisor, run_supervisor  # ShardedServer builds on this module
+
+        supervisor = Supervisor(args.workers, host=args.host, port=args.port, hibernate_dir=args.hibernate_dir,
+                                read_timeout=args.read_timeout, save_dir=args.save_dir)
+        asyncio.run(run_supervisor(supervisor))
+        return
+    sessions = None
+    if args.hibernate_dir:
+        sessions = SessionManager(args.hibernate_dir, max_resident=args.max_resident, max_idle=args.max_idle)
+    server = GameServer(host=args.host, port=args.port, unix_path=args.unix_path,
+                        read_timeout=args.read_timeout, save_dir=args.save_dir, sessions=sessions,
+                        shared=SharedWorld() if args.shared else None)
+    try:
+        asyncio.run(run_server(server))
+    finally:
+        if sessions is not None:
+            sessions.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Hints for stuck players, answered from a checklist worked out once per world.
+
+The checklist is the winning plan in dependency order, read off the world's data rather
+than searched for: the win rule's item and location, the items its rules require, where
+each item lies (or which use reveals it), and the locked rooms in the way, each opened
+by its required_item or by a use that unlocks it. Every step is one of
+
+    take  - the item is in the inventory
+    open  - the room is unlocked
+    win   - the mystery is solved
+
+so whether a step is done is a bit test against the session's inventory and unlock
+masks. The steps' masks are accumulated, so "everything up to step i is done" is a
+single mask test and the first unfinished step is found by binary search. The
+distance to where that step happens comes from the route tables `go` uses.
+
+Building the checklist walks the whole world once; with a cache directory it is stored
+as JSON keyed by the digest of the world file, so it survives restarts.
+"""
+from array import array
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import json
+import os
+
+from NameSet import bit_ids
+from Routing import UNREACHABLE, router
+from Rules import ANYWHERE, Rule
+from World import NO_EXIT, World
+
+HINTS_VERSION = 1
+# Where checklists are cached between runs; None keeps them in memory only
+CACHE_DIR: Optional[str] = None
+
+
+class Step(NamedTuple):
+    kind: str                 # "take", "open" or "win"
+    item: Optional[str]       # Item taken, or used to open or win
+    room: Optional[str]       # Where it happens; None for a use that works anywhere
+    target: Optional[str]     # The room opened
+    via: Optional[str]        # The item whose use reveals the one taken
+
+
+class HintTable:
+    def __init__(self, world: World, steps: List[Step]) -> None:
+        self.world = world
+        self.steps = steps
+        # Masks of everything steps[0..i] achieve
+        self._items: List[int] = []
+        self._rooms: List[int] = []
+        items = rooms = 0
+        for step in steps:
+            if step.kind == "take":
+                items |= 1 << world.item_ids[step.item]
+            elif step.kind == "open":
+                rooms |= 1 << world.room_ids[step.target]
+            self._items.append(items)
+            self._rooms.append(rooms)
+
+    def next_step(self, inventory: int, unlocked: int, solved: bool) -> Optional[Step]:
+        # The first step not done yet, or None once the mystery is solved
+        index = self.next_index(inventory, unlocked, solved)
+        return self.steps[index] if index is not None else None
+
+    def next_index(self, inventory: int, unlocked: int, solved: bool) -> Optional[int]:
+        if solved or not self.steps:
+            return None
+        low, high = 0, len(self.steps) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._done(middle, inventory, unlocked):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _done(self, index: int, inventory: int, unlocked: int) -> bool:
+        items, rooms = self._items[index], self._rooms[index]
+        return inventory & items == items and unlocked & rooms == rooms and self.steps[index].kind != "win"
+
+
+def _rule_locations(world: World) -> List[Tuple[Rule, Optional[int]]]:
+    # Every rule once, with the room it was declared for (None for anywhere)
+    anywhere = {id(rule) for (_, location_id), rules in world.rules.items() if location_id == ANYWHERE
+                for rule in rules}
+    seen = set()
+    found: List[Tuple[Rule, Optional[int]]] = []
+    for (_, location_id), rules in world.rules.items():
+        for rule in rules:
+            if id(rule) in anywhere:
+                if location_id == ANYWHERE and id(rule) not in seen:
+                    seen.add(id(rule))
+                    found.append((rule, None))
+            elif (id(rule), location_id) not in seen:
+                seen.add((id(rule), location_id))
+                found.append((rule, location_id))
+    return found
+
+
+def build_steps(world: World) -> List[Step]:
+    rooms = world.rooms
+    names = [room.name for room in rooms]
+    width = len(world.directions)
+    exits = world.exits
+    start = world.room_ids[world.start]
+
+    # Fewest locked rooms on the way from the start to each room (a 0-1 BFS)
+    locks = array("i", [-1]) * len(rooms)
+    parent = array("i", [-1]) * len(rooms)
+    locks[start] = 0
+    queue = deque((start,))
+    while queue:
+        room_id = queue.popleft()
+        for target in exits[room_id * width:(room_id + 1) * width]:
+            if target == NO_EXIT:
+                continue
+            cost = locks[room_id] + rooms[target].locked
+            if locks[target] == -1 or cost < locks[target]:
+                locks[target] = cost
+                parent[target] = room_id
+                if rooms[target].locked:
+                    queue.append(target)
+                else:
+                    queue.appendleft(target)
+
+    origin: Dict[str, int] = {}
+    for room in rooms:
+        for item in room.items:
+            origin.setdefault(item, room.id)
+    revealed: Dict[str, Tuple[Rule, int]] = {}
+    openers: Dict[int, Tuple[Rule, Optional[int]]] = {}
+    win: Optional[Tuple[Rule, Optional[int]]] = None
+    for rule, location_id in _rule_locations(world):
+        if rule.end_game and win is None:
+            win = rule, location_id
+        if location_id is not None:
+            for item in rule.reveal:
+                revealed.setdefault(item, (rule, location_id))
+        for room_id in bit_ids(rule.unlock):
+            openers.setdefault(room_id, (rule, location_id))
+    if win is None:
+        return []
+
+    steps: List[Step] = []
+    items_planned: Dict[str, None] = {}
+    rooms_planned: Dict[int, None] = {}
+
+    def reach(room_id: Optional[int]) -> None:
+        if room_id is None:
+            return
+        gates = []
+        while room_id != -1:
+            if rooms[room_id].locked:
+                gates.append(room_id)
+            room_id = parent[room_id]
+        for gate in reversed(gates):
+            open_room(gate)
+
+    def open_room(room_id: int) -> None:
+        if room_id in rooms_planned:
+            return
+        rooms_planned[room_id] = None
+        # The rooms before it come first, whatever opens it
+        before = parent[room_id]
+        if before != -1:
+            reach(before)
+        key = rooms[room_id].required_item
+        if key is not None:
+            take(key)
+            steps.append(Step("open", key, names[room_id], names[room_id], None))
+        elif room_id in openers:
+            rule, location_id = openers[room_id]
+            use(rule, location_id)
+            steps.append(Step("open", rule.item, names[location_id] if location_id is not None else None,
+                              names[room_id], None))
+
+    def use(rule: Rule, location_id: Optional[int]) -> None:
+        for item_id in bit_ids(rule.requires_items):
+            take(world.item_names[item_id])
+        take(rule.item)
+        reach(location_id)
+
+    def take(item: str) -> None:
+        if item in items_planned:
+            return
+        items_planned[item] = None
+        if item in origin:
+            reach(origin[item])
+            steps.append(Step("take", item, names[origin[item]], None, None))
+        elif item in revealed:
+            rule, location_id = revealed[item]
+            use(rule, location_id)
+            steps.append(Step("take", item, names[location_id], None, rule.item))
+
+    rule, location_id = win
+    use(rule, location_id)
+    steps.append(Step("win", rule.item, names[location_id] if location_id is not None else None, None, None))
+    return steps
+
+
+def hint_table(world: World, cache_dir: Optional[str] = None) -> HintTable:
+    # One table per world, from the cache directory when it has one for this world
+    if world.hints is not None:
+        return world.hints
+    cache_dir = cache_dir if cache_dir is not None else CACHE_DIR
+    filename = None
+    steps = None
+    # Only worlds loaded from a file have a digest to key the cache by
+    if cache_dir is not None and world.digest is not None:
+        filename = os.path.join(cache_dir, f"hints-{world.digest}.json")
+        try:
+            with open(filename, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") == HINTS_VERSION:
+                steps = [Step(*step) for step in cached["steps"]]
+        except (FileNotFoundError, ValueError, TypeError):
+            steps = None
+    if steps is None:
+        steps = build_steps(world)
+        if filename is not None:
+            from SaveJournal import atomic_write  # SaveJournal replays through the commands, which use hints
+
+            os.makedirs(cache_dir, exist_ok=True)
+            atomic_write(filename, json.dumps({"version": HINTS_VERSION, "steps": steps},
+                                              separators=(",", ":")).encode("utf-8"))
+    world.hints = HintTable(world, steps)
+    return world.hints
+
+
+def _moves(game_state, room: Optional[str]) -> str:
+    if room is None:
+        return ""
+    world = game_state.world
+    if room == game_state.current_location:
+        return ", right here"
+    distance = router(world).distances(world.room_ids[room], game_state._unlocked)[
+        world.room_ids[game_state.current_location]]
+    if distance == UNREACHABLE:
+        return ", though you haven't found a way there yet"
+    return f", {distance} move{'s' if distance != 1 else ''} away"
+
+
+def hint(game_state) -> str:
+    step = hint_table(game_state.world).next_step(game_state.inventory.mask, game_state._unlocked,
+                                                  game_state.solved)
+    world = game_state.world
+    if step is None:
+        if game_state.solved:
+            return "The mystery is solved. There is nothing left to find."
+        return "You have done all you can think of. Perhaps the answer lies elsewhere."
+    where = world.room(step.room).title if step.room is not None else None
+    moves = _moves(game_state, step.room)
+    if step.kind == "take":
+        if step.via is not None and step.item not in game_state.items_at(step.room):
+            return f"Something is hidden in the {where}{moves}. Try using the {step.via} there."
+        return f"You will need the {step.item}. It lies in the {where}{moves}."
+    if step.kind == "open":
+        target = world.room(step.target).title
+        if step.room == step.target:
+            return f"The {target} is locked, and the {step.item} opens it. Head for its door{moves}."
+        if where is None:
+            return f"The {target} is locked. Try using the {step.item}."
+        return f"The {target} is locked. Try using the {step.item} in the {where}{moves}."
+    if where is None:
+        return f"You have what you need. Use the {step.item}."
+    return f"You have what you need. Use the {step.item} in the {where}{moves}."
@@ -0,0 +1,164 @@
+"""
+Turn history for `undo` and `rewind`.
+
+Every command that changes the game appends one small record of what it changed: the
+previous location, the previous lengths of the inventory and visited rooms (both only
+grow during play), the previous unlocked mask, and the previous items of any room it
+touched. Nothing else is copied, so a turn costs O(its changes). Undoing a turn puts
+those values back.
+
+Every `checkpoint_every` turns the full snapshot is kept as well, so rewinding far back
+restores the nearest checkpoint after the target and only undoes the turns in between.
+The last `retain` changing turns can be undone; older ones are forgotten.
+"""
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:
+    from GameState import GameState
+
+
+class _Turn(NamedTuple):
+    turn: int                 # The turn that made these changes
+    location: str
+    inventory_length: int
+    visited_length: int
+    unlocked: int
+    solved: bool
+    is_over: bool
+    rooms: Tuple[Tuple[int, Optional[Tuple[str, ...]]], ...]   # Room id and its items before, None if not in the overlay
+
+
+class History:
+    __slots__ = ("game_state", "retain", "checkpoint_every", "turn", "floor", "_records", "_checkpoints",
+                 "_rooms", "_before", "_rewound")
+
+    def __init__(self, game_state: "GameState", retain: int = 1000, checkpoint_every: int = 100) -> None:
+        self.game_state = game_state
+        self.retain = retain
+        self.checkpoint_every = checkpoint_every
+        # Commands played in the current timeline, and the earliest turn that can be rewound to
+        self.turn = 0
+        self.floor = 0
+        self._records: Optional[Deque[_Turn]] = None
+        self._checkpoints: Optional[Deque[Tuple[int, Dict]]] = None
+        self._rooms: List[Tuple[int, Optional[Tuple[str, ...]]]] = []
+        self._before: Optional[tuple] = None
+        self._rewound = False
+
+    def begin(self) -> None:
+        game_state = self.game_state
+        inventory = game_state._inventory
+        visited = game_state._visited
+        self._before = (game_state.revision, game_state.current_location, inventory, len(inventory), visited,
+                        len(visited), game_state._unlocked, game_state.solved, game_state.is_over)
+        game_state._room_log = self._rooms
+
+    def end(self) -> None:
+        game_state = self.game_state
+        game_state._room_log = None
+        rooms = self._rooms
+        if self._rewound:
+            self._rewound = False
+            rooms.clear()
+            return
+        self.turn += 1
+        revision, location, inventory, inventory_length, visited, visited_length, unlocked, solved, is_over = \
+            self._before
+        if game_state.revision == revision:
+            return
+        if game_state._inventory is not inventory or game_state._visited is not visited:
+            # Replaced wholesale (a load): earlier turns belong to another game
+            self.reset()
+            rooms.clear()
+            return
+        if self._records is None:
+            self._records = deque()
+        records = self._records
+        records.append(_Turn(self.turn, location, inventory_length, visited_length, unlocked, solved, is_over,
+                             tuple(rooms)))
+        rooms.clear()
+        if len(records) > self.retain:
+            self.floor = records.popleft().turn
+            checkpoints = self._checkpoints
+            while checkpoints and checkpoints[0][0] < self.floor:
+                checkpoints.popleft()
+        checkpoints = self._checkpoints
+        if self.turn - (checkpoints[-1][0] if checkpoints else self.floor) >= self.checkpoint_every:
+            if checkpoints is None:
+                checkpoints = self._checkpoints = deque()
+            checkpoints.append((self.turn, game_state.save_state()))
+
+    def reset(self) -> None:
+        # Forgets every turn so far; the current state becomes the oldest one reachable
+        self._records = None
+        self._checkpoints = None
+        self.floor = self.turn
+
+    @property
+    def undoable(self) -> int:
+        return len(self._records) if self._records else 0
+
+    def undo(self, count: int = 1) -> int:
+        """
+        Takes back the last `count` turns that changed anything and returns how many were
+        taken back.
+        """
+        records = self._records
+        undone = 0
+        while records and undone < count:
+            self._undo_turn(records.pop())
+            undone += 1
+        if undone:
+            self._rewound = True
+            self._drop_checkpoints_after(self.turn)
+        return undone
+
+    def rewind(self, turn: int) -> None:
+        # Returns the game to how it was after `turn` commands
+        if not self.floor <= turn <= self.turn:
+            raise ValueError(f"Turn {turn} is out of range; you can rewind to turns {self.floor} to {self.turn}.")
+        records = self._records
+        checkpoint = self._checkpoint_at_or_after(turn)
+        if checkpoint is not None and records and records[-1].turn > checkpoint[0] + self.checkpoint_every:
+            # Far back: start from the nearest snapshot rather than undoing every turn since
+            checkpoint_turn, state = checkpoint
+            while records and records[-1].turn > checkpoint_turn:
+                records.pop()
+            self.game_state.load_state(state)
+        while records and records[-1].turn > turn:
+            self._undo_turn(records.pop())
+        self.turn = turn
+        self._rewound = True
+        self._drop_checkpoints_after(turn)
+
+    def _undo_turn(self, record: _Turn) -> None:
+        game_state = self.game_state
+        game_state.current_location = record.location
+        game_state.inventory.truncate(record.inventory_length)
+        game_state.visited_locations.truncate(record.visited_length)
+        game_state._unlocked = record.unlocked
+        game_state.solved = record.solved
+        game_state.is_over = record.is_over
+        room_items = game_state._room_items
+        # A room changed twice in one turn is logged twice; the first entry is the oldest
+        for room_id, items in reversed(record.rooms):
+            if items is None:
+                room_items.pop(room_id, None)
+            else:
+                room_items[room_id] = list(items)
+            if game_state._rendered:
+                game_state._rendered.pop(room_id, None)
+        game_state.revision += 1
+        self.turn = record.turn - 1
+
+    def _checkpoint_at_or_after(self, turn: int) -> Optional[Tuple[int, Dict]]:
+        for checkpoint in self._checkpoints or ():
+            if checkpoint[0] >= turn:
+                return checkpoint
+        return None
+
+    def _drop_checkpoints_after(self, turn: int) -> None:
+        checkpoints = self._checkpoints
+        while checkpoints and checkpoints[-1][0] > turn:
+            checkpoints.pop()
@@ -0,0 +1,32 @@
+from typing import Dict, Optional
+import json
+import os
+
+
+class ItemCatalog:
+    """
+    Descriptions of a world's items. The text lives in a separate content file that is
+    only read the first time an item is examined, then shared by every session.
+    """
+
+    def __init__(self, filename: Optional[str]) -> None:
+        self.filename = filename
+        self._texts: Optional[Dict[str, str]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._texts is not None
+
+    def describe(self, item_name: str) -> Optional[str]:
+        texts = self._texts
+        if texts is None:
+            texts = self._load()
+        return texts.get(item_name)
+
+    def _load(self) -> Dict[str, str]:
+        if self.filename is None or not os.path.exists(self.filename):
+            self._texts = {}
+        else:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                self._texts = json.load(f)
+        return self._texts
@@ -0,0 +1,332 @@
+"""
+Opt-in instrumentation for the command dispatcher, the GameState mutators and saves.
+
+Nothing is measured until enable() is called: it wraps the dispatcher and the measured
+methods in place, and disable() puts the originals back, so the uninstrumented game
+runs exactly the code it always did.
+
+    metrics = Metrics.enable()
+    ...
+    metrics.write_prometheus("metrics.prom")   # or: metrics.serve(port=9100)
+
+Latencies go into log-linear histograms (8 buckets per power of two, so every bucket is
+within 12.5% of its values) and are exported with power-of-two boundaries.
+"""
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import cProfile
+import functools
+import os
+import threading
+import time
+import tracemalloc
+
+from Commands import COMMANDS, CommandRegistry
+from GameState import GameState
+from SaveJournal import SaveJournal, atomic_write
+
+# Bucket precision: 2**_SUB_BITS buckets per power of two
+_SUB_BITS = 3
+_SUB_COUNT = 1 << _SUB_BITS
+# Exported boundaries, 2**10 ns (about 1 us) to 2**35 ns (about 34 s)
+_EXPORT_POWERS = range(10, 36)
+
+# GameState methods timed under game_state_call_duration_seconds
+MEASURED_METHODS = ("describe_current_location", "move_player", "pick_up_item", "use_item", "examine_item",
+                    "load_state")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Counts of nanosecond values in log-linear buckets. Values below 2 * 2**_SUB_BITS
+    get a bucket each; above that, a value's bucket is its power of two plus its next
+    _SUB_BITS bits.
+    """
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = []
+        self.total = 0
+        self.count = 0
+
+    @staticmethod
+    def bucket(value: int) -> int:
+        if value < 2 * _SUB_COUNT:
+            return max(value, 0)
+        shift = value.bit_length() - _SUB_BITS - 1
+        return shift * _SUB_COUNT + (value >> shift)
+
+    @staticmethod
+    def bucket_bounds(index: int) -> Tuple[int, int]:
+        # Smallest and largest value in a bucket
+        if index < 2 * _SUB_COUNT:
+            return index, index
+        shift, mantissa = divmod(index, _SUB_COUNT)
+        shift -= 1
+        mantissa += _SUB_COUNT
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        index = self.bucket(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def copy(self) -> "Histogram":
+        histogram = Histogram()
+        histogram.counts = list(self.counts)
+        histogram.total = self.total
+        histogram.count = self.count
+        return histogram
+
+    def percentile(self, percent: float) -> int:
+        # Upper bound of the bucket holding the given percentile, 0 if empty
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bucket_bounds(index)[1]
+        return self.bucket_bounds(len(self.counts) - 1)[1]
+
+    def cumulative_below(self, limit: int) -> int:
+        # Number of values below `limit`, which must be a power of two >= 2 * 2**_SUB_BITS
+        return sum(self.counts[:self.bucket(limit)])
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.help: Dict[str, str] = {}
+        self._installed: List[Tuple[object, str, object]] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+        # Commands may run on several threads (a shared world) while the HTTP thread renders
+        self._lock = threading.Lock()
+
+    def count(self, name: str, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def observe(self, name: str, labels: Labels, nanoseconds: int) -> None:
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram()
+            histogram.record(nanoseconds)
+
+    def snapshot(self) -> Tuple[Dict[str, Dict[Labels, float]], Dict[str, Dict[Labels, Histogram]]]:
+        # Copies of the counters and histograms, consistent with each other
+        with self._lock:
+            counters = {name: dict(series) for name, series in self.counters.items()}
+            histograms = {name: {labels: histogram.copy() for labels, histogram in series.items()}
+                          for name, series in self.histograms.items()}
+        return counters, histograms
+
+    # Wiring
+
+    def install(self) -> None:
+        if self._installed:
+            return
+        self._wrap_dispatch(COMMANDS)
+        for name in MEASURED_METHODS:
+            self._patch(GameState, name, self._timed(getattr(GameState, name), name))
+        self._patch(GameState, "save_to_file", self._timed_save(GameState.save_to_file))
+        self._patch(SaveJournal, "record", self._timed_journal(SaveJournal.record, "journal"))
+        self._patch(SaveJournal, "compact", self._timed_journal(SaveJournal.compact, "compaction"))
+
+    def uninstall(self) -> None:
+        for owner, name, original in reversed(self._installed):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._installed = []
+
+    def _patch(self, owner: object, name: str, replacement: object) -> None:
+        # Instance attributes are removed on uninstall; class attributes are restored
+        original = owner.__dict__.get(name) if isinstance(owner, type) else None
+        self._installed.append((owner, name, original))
+        setattr(owner, name, replacement)
+
+    def _wrap_dispatch(self, registry: CommandRegistry) -> None:
+        dispatch = registry.dispatch
+        perf_counter_ns = time.perf_counter_ns
+
+        def measured_dispatch(user_command: str, game_state: GameState, **context):
+            start = perf_counter_ns()
+            try:
+                result = dispatch(user_command, game_state, **context)
+            except Exception:
+                self.count("game_command_exceptions_total")
+                raise
+            verb = (("verb", result.verb or "unknown"),)
+            self.observe("game_command_duration_seconds", verb, perf_counter_ns() - start)
+            self.count("game_commands_total", verb)
+            if result.verb is None:
+                self.count("game_unknown_commands_total")
+            elif not result.success:
+                self.count("game_command_failures_total", verb)
+            return result
+
+        self._patch(registry, "dispatch", measured_dispatch)
+
+    def _timed(self, method: Callable, name: str) -> Callable:
+        labels = (("method", name),)
+        perf_counter_ns = time.perf_counter_ns
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.observe("game_state_call_duration_seconds", labels, perf_counter_ns() - start)
+
+        return timed
+
+    def _timed_save(self, method: Callable) -> Callable:
+        @functools.wraps(method)
+        def timed_save(game_state: GameState, filename: str, *args, **kwargs):
+            start = time.perf_counter_ns()
+            method(game_state, filename, *args, **kwargs)
+            labels = (("kind", "snapshot"),)
+            self.observe("game_save_duration_seconds", labels, time.perf_counter_ns() - start)
+            self.count("game_save_bytes_total", labels, os.path.getsize(filename))
+
+        return timed_save
+
+    def _timed_journal(self, method: Callable, kind: str) -> Callable:
+        labels = (("kind", kind),)
+
+        @functools.wraps(method)
+        def timed_journal(journal: SaveJournal, *args, **kwargs):
+            written = journal.bytes_written
+            start = time.perf_counter_ns()
+            method(journal, *args, **kwargs)
+            if journal.bytes_written != written:
+                self.observe("game_save_duration_seconds", labels, time.perf_counter_ns() - start)
+                self.count("game_save_bytes_total", labels, journal.bytes_written - written)
+
+        return timed_journal
+
+    # Export
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        counters, histograms = self.snapshot()
+        for name, series in sorted(counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_labels(labels)} {value:g}")
+        for name, series in sorted(histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in sorted(series.items()):
+                for power in _EXPORT_POWERS:
+                    le = f"{(1 << power) / 1e9:.9g}"
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} "
+                                 f"{histogram.cumulative_below(1 << power)}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.total / 1e9:.9g}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, filename: str) -> None:
+        # Atomic, so a scraper reading the file (e.g. node_exporter's textfile collector) never sees half of it
+        atomic_write(filename, self.render_prometheus().encode("utf-8"))
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9100) -> ThreadingHTTPServer:
+        """
+        Serves the metrics at http://host:port/metrics from a daemon thread and returns
+        the server; port 0 picks a free port (see server.server_address).
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+        thread.start()
+        self._server = server
+        return server
+
+    def stop_serving(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+_active: Optional[Metrics] = None
+
+
+def enable(metrics: Optional[Metrics] = None) -> Metrics:
+    # Starts measuring into `metrics` (a new one by default); only one can be active
+    global _active
+    if _active is not None:
+        _active.uninstall()
+    _active = metrics if metrics is not None else Metrics()
+    _active.install()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    if _active is not None:
+        _active.uninstall()
+        _active.stop_serving()
+        _active = None
+
+
+@contextmanager
+def profile_session(prefix: str, memory: bool = True) -> Iterator[None]:
+    """
+    Profiles everything run inside the block. Writes <prefix>.prof (cProfile stats, for
+    pstats or snakeviz) and, with memory=True, <prefix>.memory.txt with the top
+    allocation sites still alive at the end.
+    """
+    profiler = cProfile.Profile()
+    if memory:
+        tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(prefix + ".prof")
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            with open(prefix + ".memory.txt", "w", encoding="utf-8") as f:
+                for stat in snapshot.statistics("lineno")[:50]:
+                    f.write(f"{stat}\n")
@@ -0,0 +1,92 @@
+from typing import Dict, Iterable, Iterator, List
+
+
+class NameSet:
+    """
+    An insertion-ordered set of world names (items or rooms) backed by an integer bitmask
+    over their compiled ids. Membership is a bit test, and requirements on several names
+    are a single mask test with has_all. It behaves like the list it replaces, so existing
+    code can iterate, index, append, remove and compare it with plain lists.
+
+    Names the world does not define (e.g. from an old save) are kept in order too; only
+    their membership test falls back to a scan.
+    """
+
+    __slots__ = ("_ids", "_names", "mask")
+
+    def __init__(self, ids: Dict[str, int], names: Iterable[str] = ()) -> None:
+        self._ids = ids
+        self._names: List[str] = []
+        self.mask = 0
+        for name in names:
+            self.append(name)
+
+    def __contains__(self, name: object) -> bool:
+        name_id = self._ids.get(name)
+        if name_id is None:
+            return name in self._names
+        return bool(self.mask >> name_id & 1)
+
+    def has_all(self, mask: int) -> bool:
+        return self.mask & mask == mask
+
+    def has_any(self, mask: int) -> bool:
+        return bool(self.mask & mask)
+
+    def append(self, name: str) -> None:
+        # Adding a name that is already present is a no-op, as in a set
+        name_id = self._ids.get(name)
+        if name_id is None:
+            if name not in self._names:
+                self._names.append(name)
+        elif not self.mask >> name_id & 1:
+            self.mask |= 1 << name_id
+            self._names.append(name)
+
+    def remove(self, name: str) -> None:
+        self._names.remove(name)
+        name_id = self._ids.get(name)
+        if name_id is not None:
+            self.mask &= ~(1 << name_id)
+
+    def truncate(self, length: int) -> None:
+        # Drops the names added after the first `length`, newest first
+        names = self._names
+        while len(names) > length:
+            name_id = self._ids.get(names.pop())
+            if name_id is not None:
+                self.mask &= ~(1 << name_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __getitem__(self, index):
+        return self._names[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, NameSet):
+            return self._names == other._names
+        if isinstance(other, (list, tuple)):
+            return self._names == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self._names)
+
+
+def bit_ids(mask: int) -> Iterator[int]:
+    # Ids of the set bits, lowest first, without scanning the clear ones
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def mask_of(ids: Iterable[int]) -> int:
+    mask = 0
+    for name_id in ids:
+        mask |= 1 << name_id
+    return mask
@@ -0,0 +1,130 @@
+"""
+Headless replay of scripted sessions, used by `python main.py --replay`.
+
+A session is a list of commands, read either from a script file (one command per line,
+blank lines and lines starting with "#" ignored) or from a JSONL stream with one
+{"name": ..., "commands": [...]} object per line. Each session runs through the command
+dispatcher against a fresh GameState with nothing printed and nothing saved, and yields
+its transcript and final state. Sessions are independent, so they fan out across a
+process pool.
+
+Transcripts can be checked against golden files: <golden dir>/<session name>.txt.
+"""
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+import difflib
+import json
+import multiprocessing
+import os
+import re
+
+from Commands import COMMANDS
+from GameState import GameState
+from World import DEFAULT_WORLD_FILE, load_world
+
+
+class Session(NamedTuple):
+    name: str
+    commands: List[str]
+
+
+def read_script(filename: str) -> Session:
+    name = os.path.splitext(os.path.basename(filename))[0]
+    with open(filename, "r", encoding="utf-8") as f:
+        commands = [line.strip() for line in f]
+    return Session(name, [command for command in commands if command and not command.startswith("#")])
+
+
+def read_sessions(filename: str) -> Iterator[Session]:
+    # A JSONL stream of sessions; unnamed ones are named after their line
+    base = os.path.splitext(os.path.basename(filename))[0]
+    with open(filename, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                commands = [str(command) for command in record["commands"]]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{filename}:{number}: not a session record ({e}).") from e
+            yield Session(str(record.get("name", f"{base}-{number}")), commands)
+
+
+def load_sessions(filenames: Iterable[str]) -> List[Session]:
+    sessions: List[Session] = []
+    for filename in filenames:
+        if filename.endswith(".jsonl"):
+            sessions.extend(read_sessions(filename))
+        else:
+            sessions.append(read_script(filename))
+    return sessions
+
+
+def replay(session: Session, world_file: str = DEFAULT_WORLD_FILE) -> Dict:
+    """
+    Plays a session like the game loop would, stopping once the game is over, and
+    returns {"name", "transcript": [[command, response], ...], "final_state", "solved"}.
+    """
+    game_state = GameState(load_world(world_file))
+    transcript: List[List[str]] = []
+    for command in session.commands:
+        if game_state.is_over:
+            break
+        # save_file=None keeps "load" from reading whatever save is in the working directory
+        message = COMMANDS.dispatch(command, game_state, save_file=None).message
+        transcript.append([command, message or ""])
+    return {
+        "name": session.name,
+        "transcript": transcript,
+        "final_state": game_state.save_state(),
+        "solved": game_state.solved,
+    }
+
+
+def _replay_task(task) -> Dict:
+    session, world_file = task
+    return replay(session, world_file)
+
+
+def replay_all(sessions: List[Session], processes: int = 1, world_file: str = DEFAULT_WORLD_FILE) -> List[Dict]:
+    # Results come back in session order whatever the number of processes
+    if processes <= 1 or len(sessions) <= 1:
+        return [replay(session, world_file) for session in sessions]
+    tasks = [(session, world_file) for session in sessions]
+    chunksize = max(1, len(tasks) // (processes * 8))
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_replay_task, tasks, chunksize)
+
+
+def render_transcript(result: Dict) -> str:
+    lines: List[str] = []
+    for command, response in result["transcript"]:
+        lines.append(f"> {command}")
+        lines.append(response)
+    return "\n".join(lines) + "\n"
+
+
+def golden_path(golden_dir: str, name: str) -> str:
+    return os.path.join(golden_dir, re.sub(r"[^\w.-]", "_", name) + ".txt")
+
+
+def diff_golden(result: Dict, golden_dir: str) -> Optional[str]:
+    """
+    Returns a unified diff between the golden transcript and this one, or None if they
+    match. A missing golden file counts as a difference.
+    """
+    filename = golden_path(golden_dir, result["name"])
+    actual = render_transcript(result)
+    if not os.path.exists(filename):
+        return f"No golden transcript at {filename}.\n"
+    with open(filename, "r", encoding="utf-8") as f:
+        expected = f.read()
+    if expected == actual:
+        return None
+    return "".join(difflib.unified_diff(expected.splitlines(True), actual.splitlines(True),
+                                        fromfile=filename, tofile=f"{result['name']} (replayed)"))
+
+
+def write_golden(result: Dict, golden_dir: str) -> None:
+    os.makedirs(golden_dir, exist_ok=True)
+    with open(golden_path(golden_dir, result["name"]), "w", encoding="utf-8") as f:
+        f.write(render_transcript(result))
@@ -0,0 +1,210 @@
+"""
+Typo-tolerant names for what players type after a verb.
+
+Players need not type "take incriminating_ledger": "take the ledger", "take Incriminating
+Ledger", "take incrim" and "take incriminating_ledgr" find it too. A world's names are
+indexed once, on first use, from its item names and the synonyms in its definition, and
+a phrase is matched against them in tiers, best first:
+
+    exact   - the name or a synonym, with spaces (or nothing) for underscores, "the" dropped
+    word    - one whole word of a name, e.g. "ledger"
+    prefix  - the start of a name or of any of its words, e.g. "incrim"
+    typo    - a word with one letter missing, added or changed, or two letters swapped
+
+The first tier with a match the player can see (in the room, the inventory or both,
+depending on the verb) answers. Each tier costs a few dict lookups, or a bisect for
+prefixes, however many names the world has: typos go through a deletion index, where
+every word is filed under each of its one-letter deletions, so a word of n letters needs
+n + 1 lookups rather than a comparison with every name. Each word's names are kept as a
+bitmask over item ids, like the inventory (see NameSet.py), so narrowing the matches to
+what is visible is a single AND however many there are.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from NameSet import mask_of
+from World import World
+
+ARTICLES = frozenset(("the", "a", "an", "some"))
+# Shortest prefix and shortest word tried for typos; shorter ones match too much
+MIN_PREFIX = 2
+MIN_TYPO = 3
+
+
+def normalize(phrase: str) -> str:
+    # "the Old Key" -> "old_key"
+    words = phrase.lower().replace("_", " ").split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    return "_".join(words)
+
+
+def deletions(word: str) -> Set[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def within_one(a: str, b: str) -> bool:
+    # At most one insertion, deletion, substitution or swap of neighbouring letters apart
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < len(a) and i < len(b) and a[i] == b[i]:
+        i += 1
+    if len(a) > len(b):
+        return a[i + 1:] == b[i:]
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    if a[i + 1:] == b[i + 1:]:
+        return True
+    return i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+
+
+class NameIndex:
+    def __init__(self, names: Sequence[str], synonyms: Optional[Mapping[str, Sequence[str]]] = None,
+                 min_prefix: int = MIN_PREFIX) -> None:
+        self.names = tuple(names)
+        self.ids: Dict[str, int] = {name: name_id for name_id, name in enumerate(self.names)}
+        self.min_prefix = min_prefix
+        synonyms = synonyms or {}
+        full: Dict[str, Set[int]] = {}
+        words: Dict[str, List[int]] = {}
+        tails = []
+        for name_id, name in enumerate(self.names):
+            for form in (name, *(normalize(synonym) for synonym in synonyms.get(name, ()))):
+                full.setdefault(form, set()).add(name_id)
+                full.setdefault(form.replace("_", ""), set()).add(name_id)
+                parts = form.split("_")
+                for position, word in enumerate(parts):
+                    # Numbered names ("key_3") are not known by their numbers alone
+                    if not word.isdigit():
+                        words.setdefault(word, []).append(name_id)
+                    if position < len(parts) - 1:
+                        tails.append(("_".join(parts[position:]), name_id))
+        self._full: Dict[str, Tuple[int, ...]] = {key: tuple(ids) for key, ids in full.items()}
+        # Each word's names as a bitmask over their ids, to intersect with what is visible
+        self._words: Dict[str, int] = {word: mask_of(ids) for word, ids in words.items()}
+        self._sorted_words = sorted(self._words)
+        # Tails of names from each word on, for prefixes that span words
+        tails.sort()
+        self._tails = [tail for tail, _ in tails]
+        self._tail_ids = array("i", [name_id for _, name_id in tails])
+        # Every word under itself and each of its one-letter deletions
+        self._near: Dict[str, Set[str]] = {}
+        for word in self._words:
+            if len(word) >= MIN_TYPO:
+                for key in deletions(word) | {word}:
+                    self._near.setdefault(key, set()).add(word)
+
+    def find(self, phrase: str, visible: int = -1) -> List[str]:
+        """
+        The names a phrase could mean, from the best tier with a visible match, in name
+        order. visible is a bitmask of the ids that may match; by default all of them.
+        """
+        key = normalize(phrase)
+        if not key or not visible:
+            return []
+        hits = _pick(self._full.get(key, ()), visible)
+        if not hits and "_" not in key:
+            hits = self._words.get(key, 0) & visible
+        if not hits and len(key) >= self.min_prefix:
+            hits = self._prefixed(key, visible)
+        if not hits:
+            hits = self._typos(key, visible)
+        return sorted(self.names[name_id] for name_id in _ids_of(hits))
+
+    def _prefixed(self, key: str, visible: int) -> int:
+        after = key[:-1] + chr(ord(key[-1]) + 1)
+        if "_" in key:
+            low = bisect_left(self._tails, key)
+            return _pick(self._tail_ids[low:bisect_left(self._tails, after, low)], visible)
+        words = self._sorted_words
+        low = bisect_left(words, key)
+        mask = 0
+        for word in words[low:bisect_left(words, after, low)]:
+            mask |= self._words[word]
+        return mask & visible
+
+    def _typos(self, key: str, visible: int) -> int:
+        parts = key.split("_")
+        if len(parts) == 1:
+            mask = 0
+            for word in self._near_words(key):
+                mask |= self._words[word]
+            return mask & visible
+        hits = 0
+        for position, part in enumerate(parts):
+            for word in self._near_words(part):
+                # One misspelt word of a longer name: the name it would be, spelt right
+                name = "_".join(parts[:position] + [word] + parts[position + 1:])
+                hits |= _pick(self._full.get(name, ()), visible)
+        return hits
+
+    def _near_words(self, part: str) -> Set[str]:
+        found = set()
+        if len(part) < MIN_TYPO or part.isdigit():
+            return found
+        for key in deletions(part) | {part}:
+            for word in self._near.get(key, ()):
+                if word != part and within_one(part, word):
+                    found.add(word)
+        return found
+
+
+def _ids_of(mask: int) -> List[int]:
+    # Like NameSet.bit_ids, which steps over the whole mask once per bit; a common word can
+    # match hundreds of items, and finding the 1s in the mask's binary text is far quicker
+    text = bin(mask)[:1:-1]
+    ids = []
+    at = text.find("1")
+    while at >= 0:
+        ids.append(at)
+        at = text.find("1", at + 1)
+    return ids
+
+
+def _pick(ids: Sequence[int], visible: int) -> int:
+    mask = 0
+    for name_id in ids:
+        if visible >> name_id & 1:
+            mask |= 1 << name_id
+    return mask
+
+
+class Resolver:
+    def __init__(self, world: World) -> None:
+        self.items = NameIndex(world.item_names, world.synonyms)
+        # "n" for north, where no other direction starts with the same letter
+        initials = [direction[0] for direction in world.directions]
+        self.directions = NameIndex(world.directions, {direction: (direction[0],) for direction in world.directions
+                                                       if initials.count(direction[0]) == 1})
+
+
+def resolver(world: World) -> Resolver:
+    # One per world, built the first time a name is not found as typed
+    if world.resolver is None:
+        world.resolver = Resolver(world)
+    return world.resolver
+
+
+def find_item(game_state, phrase: str, room: bool = True, inventory: bool = True) -> List[str]:
+    """
+    The visible items a phrase could mean: those in the current room, the inventory, or
+    both. An exact name in sight is returned without consulting the index.
+    """
+    key = normalize(phrase)
+    world = game_state.world
+    items = game_state.items_at(game_state.current_location)
+    if key in world.item_ids and ((inventory and key in game_state.inventory) or (room and key in items)):
+        return [key]
+    visible = game_state.inventory.mask if inventory else 0
+    if room:
+        visible |= mask_of(world.item_ids[item] for item in items if item in world.item_ids)
+    return resolver(world).items.find(key, visible)
+
+
+def find_direction(world: World, word: str) -> Optional[str]:
+    if word in world.direction_ids:
+        return word
+    matches = resolver(world).directions.find(word)
+    return matches[0] if len(matches) == 1 else None
@@ -0,0 +1,153 @@
+"""
+Shortest routes between rooms, for the `go <room>` command.
+
+A route table holds, for one destination, every room's distance to it in moves (-1
+where there is no way through), so the next hop from any room is an exit whose target
+is one move closer. Tables are built lazily, by a breadth-first search backwards from
+the destination, the first time anyone travels there, and kept in a small LRU shared by
+every session playing the world. Nothing is precomputed for destinations nobody visits,
+so a world of 100k rooms costs nothing up front.
+
+Rooms still locked for a player are impassable, except for the destination itself (the
+last move tries its door as a normal move would). A table therefore depends on which of
+the world's locked rooms a player has opened, and is cached under that set. When a lock
+flips, the new table is derived from the one for the previous set: opening a room only
+shortens routes, so only the rooms it brings closer are updated.
+"""
+from array import array
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+from NameSet import bit_ids
+from World import NO_EXIT, World
+
+UNREACHABLE = -1
+
+
+class Router:
+    def __init__(self, world: World, cache_size: int = 32) -> None:
+        self.world = world
+        self.cache_size = cache_size
+        self.built = 0
+        self.derived = 0
+        self._tables: "OrderedDict[Tuple[int, int], array]" = OrderedDict()
+        width = len(world.directions)
+        count = len(world.rooms)
+        # Predecessors of every room in compressed rows: those of room r are
+        # _pred_rooms[_pred_start[r]:_pred_start[r + 1]]
+        exits = world.exits
+        counts = [0] * (count + 1)
+        for target in exits:
+            if target != NO_EXIT:
+                counts[target + 1] += 1
+        for room_id in range(count):
+            counts[room_id + 1] += counts[room_id]
+        self._pred_start = array("i", counts)
+        fill = counts[:-1]
+        self._pred_rooms = array("i", bytes(4 * counts[-1]))
+        for index, target in enumerate(exits):
+            if target != NO_EXIT:
+                self._pred_rooms[fill[target]] = index // width
+                fill[target] += 1
+        self._locked = bytearray(count)
+        for room_id in bit_ids(world.locked_mask):
+            self._locked[room_id] = 1
+
+    def _blocked(self, opened: int) -> bytearray:
+        blocked = bytearray(self._locked)
+        for room_id in bit_ids(opened):
+            blocked[room_id] = 0
+        return blocked
+
+    def distances(self, destination: int, unlocked: int) -> array:
+        """
+        Every room's distance to `destination` for a player who has opened the rooms in
+        the `unlocked` mask.
+        """
+        opened = unlocked & self.world.locked_mask
+        key = (destination, opened)
+        tables = self._tables
+        table = tables.get(key)
+        if table is not None:
+            tables.move_to_end(key)
+            return table
+        # Usually a single lock flipped since this player's last trip to the same place
+        for room_id in bit_ids(opened):
+            previous = tables.get((destination, opened & ~(1 << room_id)))
+            if previous is not None:
+                table = self._open(previous, room_id, self._blocked(opened))
+                self.derived += 1
+                break
+        else:
+            table = self._search(destination, self._blocked(opened))
+            self.built += 1
+        tables[key] = table
+        if len(tables) > self.cache_size:
+            tables.popitem(last=False)
+        return table
+
+    def _search(self, destination: int, blocked: bytearray) -> array:
+        distance = array("i", [UNREACHABLE]) * len(self.world.rooms)
+        distance[destination] = 0
+        pred_start, pred_rooms = self._pred_start, self._pred_rooms
+        queue = deque((destination,))
+        while queue:
+            room_id = queue.popleft()
+            step = distance[room_id] + 1
+            for source in pred_rooms[pred_start[room_id]:pred_start[room_id + 1]]:
+                if distance[source] == UNREACHABLE and not blocked[source]:
+                    distance[source] = step
+                    queue.append(source)
+        return distance
+
+    def _open(self, previous: array, room_id: int, blocked: bytearray) -> array:
+        # Opening a room only shortens routes, so updates spread out from it and stop
+        # wherever a room is already as close as it can get
+        distance = array("i", previous)
+        width = len(self.world.directions)
+        exits = self.world.exits
+        best = UNREACHABLE
+        for target in exits[room_id * width:(room_id + 1) * width]:
+            if target != NO_EXIT and distance[target] != UNREACHABLE and (best == UNREACHABLE or distance[target] < best):
+                best = distance[target]
+        if best == UNREACHABLE or (distance[room_id] != UNREACHABLE and distance[room_id] <= best + 1):
+            return distance
+        distance[room_id] = best + 1
+        pred_start, pred_rooms = self._pred_start, self._pred_rooms
+        queue = deque((room_id,))
+        while queue:
+            current = queue.popleft()
+            step = distance[current] + 1
+            for source in pred_rooms[pred_start[current]:pred_start[current + 1]]:
+                if not blocked[source] and (distance[source] == UNREACHABLE or distance[source] > step):
+                    distance[source] = step
+                    queue.append(source)
+        return distance
+
+    def route(self, start: int, destination: int, unlocked: int) -> Optional[List[int]]:
+        """
+        The rooms entered on a shortest way from `start` to `destination`, ending with
+        the destination; None if there is none.
+        """
+        distance = self.distances(destination, unlocked)
+        if distance[start] == UNREACHABLE:
+            return None
+        width = len(self.world.directions)
+        exits = self.world.exits
+        path: List[int] = []
+        room_id = start
+        while room_id != destination:
+            closer = distance[room_id] - 1
+            for target in exits[room_id * width:(room_id + 1) * width]:
+                if target != NO_EXIT and distance[target] == closer:
+                    room_id = target
+                    break
+            path.append(room_id)
+        return path
+
+
+def router(world: World) -> Router:
+    # One router per world, built on the first trip
+    if world.routes is None:
+        world.routes = Router(world)
+    return world.routes
@@ -0,0 +1,122 @@
+"""
+Item interaction rules for the "use" command.
+
+Rules are declared as data next to the rooms in the world definition:
+
+    {"item": "carving_knife", "location": "kitchen",
+     "requires": {"locked": ["cellar"]}, "effects": {"unlock": ["cellar"]},
+     "success": true, "message": "You pry the cellar door open."}
+
+"location" may be a room, a list of rooms, or left out to make the rule the item's
+fallback anywhere. Preconditions ("requires") are:
+    items   - all of these are in the inventory
+    locked  - all of these rooms are still locked
+    absent  - none of these items are carried or lying in the current room
+Effects are:
+    unlock   - rooms to unlock
+    reveal   - items that appear in the current room
+    end_game - the mystery is solved and the game ends
+A message may contain "{item}", which is replaced with the item's name.
+
+Rules are compiled into an index keyed by (item id, room id), so resolving a use is a
+dict lookup whatever the number of items. Rules sharing a key are tried in order; the
+first whose preconditions hold applies, and the item's fallback rules follow.
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import sys
+
+from NameSet import mask_of
+
+# Location id of a rule that applies anywhere
+ANYWHERE = -1
+
+_RULE_KEYS = {"item", "location", "requires", "effects", "success", "message"}
+_REQUIRES_KEYS = {"items", "locked", "absent"}
+_EFFECTS_KEYS = {"unlock", "reveal", "end_game"}
+
+
+class Rule(NamedTuple):
+    # Sets of items and rooms are bitmasks over their compiled ids
+    item: str
+    requires_items: int
+    requires_locked: int
+    absent: Tuple[str, ...]
+    absent_items: int
+    unlock: int
+    reveal: Tuple[str, ...]
+    end_game: bool
+    success: bool
+    message: str
+
+
+RuleIndex = Dict[Tuple[int, int], Tuple[Rule, ...]]
+
+
+def revealed_items(rule_defs: List[Dict]) -> List[str]:
+    # Items that only come into play through a rule, so the world can give them ids
+    return [item for rule in rule_defs for item in rule.get("effects", {}).get("reveal", [])]
+
+
+def compile_rules(rule_defs: List[Dict], room_ids: Dict[str, int], item_ids: Dict[str, int]) -> RuleIndex:
+    index: Dict[Tuple[int, int], List[Rule]] = {}
+    for number, rule in enumerate(rule_defs):
+        where = f"Rule {number} ({rule.get('item')})"
+        _check_keys(rule, _RULE_KEYS, where)
+        requires = rule.get("requires", {})
+        effects = rule.get("effects", {})
+        _check_keys(requires, _REQUIRES_KEYS, where)
+        _check_keys(effects, _EFFECTS_KEYS, where)
+
+        item = rule.get("item")
+        if item not in item_ids:
+            raise ValueError(f"{where} uses unknown item '{item}'.")
+        for name in (*requires.get("items", []), *requires.get("absent", []), *effects.get("reveal", [])):
+            if name not in item_ids:
+                raise ValueError(f"{where} refers to unknown item '{name}'.")
+        if "message" not in rule:
+            raise ValueError(f"{where} has no message.")
+
+        location = rule.get("location")
+        locations = [location] if isinstance(location, str) else list(location or [])
+        compiled = Rule(
+            item=sys.intern(item),
+            requires_items=mask_of(item_ids[name] for name in requires.get("items", [])),
+            requires_locked=mask_of(_room_refs(requires.get("locked", []), room_ids, where)),
+            absent=tuple(sys.intern(name) for name in requires.get("absent", [])),
+            absent_items=mask_of(item_ids[name] for name in requires.get("absent", [])),
+            unlock=mask_of(_room_refs(effects.get("unlock", []), room_ids, where)),
+            reveal=tuple(sys.intern(name) for name in effects.get("reveal", [])),
+            end_game=bool(effects.get("end_game", False)),
+            success=bool(rule.get("success", location is not None)),
+            message=rule["message"].replace("{item}", item),
+        )
+        for location_id in _room_refs(locations, room_ids, where) or (ANYWHERE,):
+            index.setdefault((item_ids[item], location_id), []).append(compiled)
+
+    # Location-specific entries carry the item's fallback rules too, so a use is one lookup
+    compiled_index: RuleIndex = {}
+    for (item_id, location_id), rules in index.items():
+        if location_id != ANYWHERE:
+            rules = rules + index.get((item_id, ANYWHERE), [])
+        compiled_index[item_id, location_id] = tuple(rules)
+    return compiled_index
+
+
+def _room_refs(names: List[str], room_ids: Dict[str, int], where: str) -> Tuple[int, ...]:
+    for name in names:
+        if name not in room_ids:
+            raise ValueError(f"{where} refers to unknown room '{name}'.")
+    return tuple(room_ids[name] for name in names)
+
+
+def _check_keys(section: Dict, allowed: set, where: str) -> None:
+    unknown = set(section) - allowed
+    if unknown:
+        raise ValueError(f"{where} has unknown keys: {', '.join(sorted(unknown))}.")
+
+
+def find_rules(index: RuleIndex, item_id: Optional[int], room_id: int) -> Tuple[Rule, ...]:
+    if item_id is None:
+        return ()
+    rules = index.get((item_id, room_id))
+    return rules if rules is not None else index.get((item_id, ANYWHERE), ())
@@ -0,0 +1,160 @@
+"""
+Journaled persistence for a single game session.
+
+Instead of rewriting the whole save after every command, each command that changed
+the game state is appended to a journal. The journal is fsynced in batches and
+periodically compacted into an atomically replaced snapshot. Recovery loads the
+snapshot and replays the journal tail through process_command.
+"""
+from typing import Optional
+import json
+import os
+import time
+
+from GameLoop import process_command
+from GameState import GameState
+
+
+def atomic_write(filename: str, data: bytes) -> None:
+    # Write to a temp file beside the target, then rename over it, so readers only
+    # ever see the old file or the complete new one
+    directory = os.path.dirname(os.path.abspath(filename))
+    temp_name = f"{filename}.tmp"
+    with open(temp_name, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_name, filename)
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class SaveJournal:
+    def __init__(self, snapshot_path: str = "savegame.json", journal_path: Optional[str] = None,
+                 sync_every: int = 16, sync_interval: float = 1.0, compact_every: int = 512) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path if journal_path is not None else snapshot_path + ".journal"
+        # fsync once this many records are pending, or once this many seconds have passed
+        # since the last fsync, whichever comes first. sync_every=1 syncs every record.
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        self.bytes_written = 0
+        self.records_written = 0
+        self._file = None
+        self._pending = 0
+        self._records_since_compact = 0
+        self._last_sync = time.monotonic()
+        self._revision: Optional[int] = None
+        self._generation: Optional[str] = None
+
+    def record(self, command: str, game_state: GameState) -> None:
+        """
+        Called after every command. Commands that left the game state untouched are ignored,
+        so read-only commands cost no I/O at all.
+        """
+        if game_state.revision == self._revision:
+            return
+        if self._revision is None or self._records_since_compact >= self.compact_every:
+            # The first change of a new session replaces whatever game was saved before
+            self.compact(game_state)
+            return
+
+        line = (json.dumps(command.strip()) + "\n").encode("utf-8")
+        self._file.write(line)
+        self.bytes_written += len(line)
+        self.records_written += 1
+        self._pending += 1
+        self._records_since_compact += 1
+        self._revision = game_state.revision
+
+        if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self) -> None:
+        if self._file is None or not self._pending:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def compact(self, game_state: GameState) -> None:
+        # The snapshot and the journal header carry the same fresh generation id. The new
+        # snapshot is renamed into place before the journal is restarted, so after a crash
+        # in between, recovery sees a journal from another generation and skips its
+        # records, which are already in the snapshot.
+        self._generation = os.urandom(8).hex()
+        state = game_state.save_state()
+        state["journal_generation"] = self._generation
+        data = json.dumps(state).encode("utf-8")
+        atomic_write(self.snapshot_path, data)
+        self.bytes_written += len(data)
+        self._restart_journal()
+        self._records_since_compact = 0
+        self._revision = game_state.revision
+
+    def recover(self, game_state: GameState) -> int:
+        """
+        Loads the snapshot and replays the journal tail into game_state, then continues
+        journaling after the last complete record. Returns the number of replayed commands.
+        """
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        game_state.load_state(state)
+        self._generation = state.get("journal_generation")
+
+        commands = []
+        valid_bytes = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as f:
+                for index, line in enumerate(f):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # A torn final record from a crash mid-append
+                    if not line.endswith(b"\n"):
+                        break
+                    if index == 0:
+                        if self._generation is None or record != {"generation": self._generation}:
+                            break  # Left over from before the snapshot was taken
+                    else:
+                        commands.append(record)
+                    valid_bytes += len(line)
+
+        for command in commands:
+            process_command(command, game_state)
+
+        if self._file is not None:
+            self._file.close()
+        if valid_bytes:
+            self._file = open(self.journal_path, "ab")
+            self._file.truncate(valid_bytes)
+            self._pending = 0
+            self._last_sync = time.monotonic()
+        else:
+            self._restart_journal()
+        self._records_since_compact = len(commands)
+        self._revision = game_state.revision
+        return len(commands)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _restart_journal(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.journal_path, "wb")
+        header = (json.dumps({"generation": self._generation}) + "\n").encode("utf-8")
+        self._file.write(header)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.bytes_written += len(header)
+        self._pending = 0
+        self._last_sync = time.monotonic()
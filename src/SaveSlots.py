@@ -0,0 +1,201 @@
+"""
+Named save slots: a directory of saves plus an index of their headers.
+
+    saves/
+        index        magic "MMSI", version u16, record size u16, then one record per slot
+        <slot>.sav   the slot's record, then its save as a binary snapshot (see Snapshot.py)
+
+A record is a fixed-size header: the slot name and location (NUL-padded UTF-8), the
+turn count, when it was saved, the size and CRC-32 of the snapshot, and a CRC-32 of the
+record itself. Listing the slots reads the index alone, however many there are. A save
+is written to a temp file and renamed into place, then its record is written over the
+slot's old one in the index (or appended), so saving costs the same with 10 slots or 10k.
+
+Each save carries its own record, so the save file is the authority and the index only
+a fast way to list: a load checks the snapshot against the record in its own file, a
+torn index record fails its CRC and is left out of the listing, and rebuild() writes a
+fresh index from the save files' records.
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import os
+import re
+import struct
+import time
+import zlib
+
+from SaveJournal import atomic_write
+from Snapshot import decode_binary, encode_binary
+
+INDEX_MAGIC = b"MMSI"
+INDEX_VERSION = 1
+_HEADER = struct.Struct("<4sHH")
+# name, location, turns, saved at, snapshot size, snapshot CRC, record CRC
+_RECORD = struct.Struct("<32s48sIdIII")
+_RECORD_BODY = _RECORD.size - 4
+
+SLOT_NAME = re.compile(r"[a-z0-9_-]{1,32}")
+
+
+class SlotInfo(NamedTuple):
+    name: str
+    location: str
+    turns: int
+    saved_at: float           # Unix time
+    size: int                 # Bytes of snapshot
+    checksum: int             # CRC-32 of the snapshot
+
+
+def _text(value: str, size: int) -> bytes:
+    # Cut at a character boundary when too long for its field
+    return value.encode("utf-8")[:size].decode("utf-8", "ignore").encode("utf-8")
+
+
+def pack_record(info: SlotInfo) -> bytes:
+    body = _RECORD.pack(info.name.encode("ascii"), _text(info.location, 48), info.turns, info.saved_at,
+                        info.size, info.checksum, 0)[:_RECORD_BODY]
+    return body + struct.pack("<I", zlib.crc32(body))
+
+
+def unpack_record(data: bytes, offset: int = 0) -> Optional[SlotInfo]:
+    # None for a torn or blank record
+    name, location, turns, saved_at, size, checksum, crc = _RECORD.unpack_from(data, offset)
+    if zlib.crc32(data[offset:offset + _RECORD_BODY]) != crc or not name.strip(b"\0"):
+        return None
+    return SlotInfo(name.rstrip(b"\0").decode("ascii"), location.rstrip(b"\0").decode("utf-8"), turns, saved_at,
+                    size, checksum)
+
+
+def read_save(data: bytes) -> Tuple[SlotInfo, bytes]:
+    # The record and snapshot of a save file, checked against each other
+    info = unpack_record(data) if len(data) >= _RECORD.size else None
+    snapshot = data[_RECORD.size:]
+    if info is None or len(snapshot) != info.size or zlib.crc32(snapshot) != info.checksum:
+        raise ValueError("Not an intact slot save.")
+    return info, snapshot
+
+
+class SaveSlots:
+    def __init__(self, directory: str, durable: bool = True) -> None:
+        self.directory = directory
+        # Without durable, writes are still renamed into place but never fsynced
+        self.durable = durable
+        self.index_path = os.path.join(directory, "index")
+        # Record number of each slot in the index; read on first use
+        self._positions: Optional[Dict[str, int]] = None
+
+    def path(self, slot: str) -> str:
+        return os.path.join(self.directory, f"{slot}.sav")
+
+    def _read_index(self) -> Optional[bytes]:
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            magic, version, record_size = _HEADER.unpack_from(data)
+        except struct.error:
+            return None
+        if magic != INDEX_MAGIC or version != INDEX_VERSION or record_size != _RECORD.size:
+            return None
+        return data
+
+    def _records(self, data: bytes) -> List[Optional[SlotInfo]]:
+        # A partial record at the end is an append cut short; it is left out
+        count = (len(data) - _HEADER.size) // _RECORD.size
+        return [unpack_record(data, _HEADER.size + number * _RECORD.size) for number in range(count)]
+
+    def list(self) -> List[SlotInfo]:
+        """
+        Every slot with an intact index record, in the order they were first saved.
+        """
+        data = self._read_index()
+        if data is None:
+            return []
+        records = self._records(data)
+        if self._positions is None:
+            self._positions = {info.name: number for number, info in enumerate(records) if info is not None}
+        return [info for info in records if info is not None]
+
+    def info(self, slot: str) -> Optional[SlotInfo]:
+        for info in self.list():
+            if info.name == slot:
+                return info
+        return None
+
+    def save(self, slot: str, game_state) -> SlotInfo:
+        if not SLOT_NAME.fullmatch(slot):
+            raise ValueError("Slot names are up to 32 letters, digits, '_' or '-'.")
+        snapshot = encode_binary(game_state.save_state(), game_state.world)
+        history = game_state.history
+        info = SlotInfo(slot, game_state.current_location, history.turn if history is not None else 0, time.time(),
+                        len(snapshot), zlib.crc32(snapshot))
+        record = pack_record(info)
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(self.path(slot), record + snapshot)
+        self._write_record(slot, record)
+        return info
+
+    def load(self, slot: str, game_state) -> SlotInfo:
+        """
+        Restores game_state from a slot. Raises FileNotFoundError for an empty slot and
+        ValueError when the save does not match its checksum.
+        """
+        if not SLOT_NAME.fullmatch(slot):
+            raise FileNotFoundError(slot)
+        with open(self.path(slot), "rb") as f:
+            data = f.read()
+        try:
+            info, snapshot = read_save(data)
+        except ValueError:
+            info = None
+        if info is None or info.name != slot:
+            raise ValueError(f"Save '{slot}' is corrupted.")
+        game_state.load_state(decode_binary(snapshot, game_state.world))
+        if game_state.history is not None:
+            # The slot's turns before this one are not in the history, so none can be rewound to
+            game_state.history.turn = info.turns
+            game_state.history.reset()
+        return info
+
+    def rebuild(self) -> int:
+        # A fresh index from the records at the head of every intact save file
+        records = []
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith(".sav"):
+                continue
+            with open(os.path.join(self.directory, filename), "rb") as f:
+                head = f.read(_RECORD.size)
+            if len(head) == _RECORD.size and unpack_record(head) is not None:
+                records.append(head)
+        self._write(self.index_path, _HEADER.pack(INDEX_MAGIC, INDEX_VERSION, _RECORD.size) + b"".join(records))
+        self._positions = {unpack_record(record).name: number for number, record in enumerate(records)}
+        return len(records)
+
+    def _write(self, filename: str, data: bytes) -> None:
+        if self.durable:
+            atomic_write(filename, data)
+        else:
+            with open(filename + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(filename + ".tmp", filename)
+
+    def _write_record(self, slot: str, record: bytes) -> None:
+        if self._positions is None:
+            if self._read_index() is None:
+                self.rebuild()
+            else:
+                self.list()
+        positions = self._positions
+        with open(self.index_path, "r+b") as f:
+            number = positions.get(slot)
+            if number is None:
+                # Appended after the last whole record, over any partial one
+                end = f.seek(0, os.SEEK_END)
+                number = (end - _HEADER.size) // _RECORD.size
+                positions[slot] = number
+            f.seek(_HEADER.size + number * _RECORD.size)
+            f.write(record)
+            if self.durable:
+                f.flush()
+                os.fsync(f.fileno())
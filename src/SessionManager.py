@@ -0,0 +1,240 @@
+"""
+Keeps a bounded set of live GameStates and hibernates the rest to disk.
+
+Sessions are looked up by id. The most recently used ones stay resident in an LRU;
+when there are more than the budget allows, or one has been idle too long, the least
+recently used is encoded with the binary snapshot codec and handed to a background
+writer thread, so the request path never waits on the disk. The next command for a
+hibernated session rehydrates it from its snapshot (or from the in-flight bytes if the
+write has not finished yet).
+
+    sessions = SessionManager("sessions", max_resident=10000, max_idle=300)
+    reply = sessions.run("alice", "take matches")
+    sessions.close()   # flushes every resident session
+"""
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import logging
+import os
+import queue
+import re
+import threading
+import time
+
+from GameLoop import process_command
+from GameState import GameState
+from Metrics import Histogram
+from SaveJournal import atomic_write
+from Snapshot import decode_binary, encode_binary
+from World import World, load_world
+
+# Rough resident cost of a session that has been played a little, for memory budgets
+SESSION_BYTES = 1024
+
+log = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("game_state", "last_used", "saved_revision")
+
+    def __init__(self, game_state: GameState, last_used: float, saved_revision: int) -> None:
+        self.game_state = game_state
+        self.last_used = last_used
+        # Revision of the session as it is on disk
+        self.saved_revision = saved_revision
+
+
+class SessionManager:
+    def __init__(self, directory: str, world: Optional[World] = None, max_resident: int = 10000,
+                 memory_budget: Optional[int] = None, max_idle: Optional[float] = 300.0,
+                 session_bytes: int = SESSION_BYTES, durable: bool = True) -> None:
+        self.directory = directory
+        self.world = world if world is not None else load_world()
+        # The memory budget, in bytes, is turned into a session count using session_bytes
+        self.max_resident = max_resident
+        if memory_budget is not None:
+            self.max_resident = max(1, min(max_resident, memory_budget // session_bytes))
+        self.max_idle = max_idle
+        self.durable = durable
+        self.hits = 0
+        self.misses = 0
+        self.rehydrations = 0
+        self.hibernations = 0
+        self.snapshots_written = 0
+        self.write_errors = 0
+        self.rehydration_latency = Histogram()
+        self._resident: "OrderedDict[str, _Entry]" = OrderedDict()
+        # Snapshots queued for the writer but not yet on disk
+        self._pending: Dict[str, bytes] = {}
+        self._pending_lock = threading.Lock()
+        self._writes: "queue.Queue[Optional[Tuple[str, bytes]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="session-writer", daemon=True)
+        os.makedirs(directory, exist_ok=True)
+        self._writer.start()
+
+    @property
+    def resident(self) -> int:
+        return len(self._resident)
+
+    def path(self, session_id: str) -> str:
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", session_id) + ".sav")
+
+    def get(self, session_id: str) -> GameState:
+        """
+        The live GameState of a session: resident, rehydrated from its snapshot, or new.
+        """
+        now = time.monotonic()
+        entry = self._resident.get(session_id)
+        if entry is not None:
+            self.hits += 1
+            self._resident.move_to_end(session_id)
+            entry.last_used = now
+            self.evict_idle(now)
+            return entry.game_state
+
+        self.misses += 1
+        start = time.perf_counter_ns()
+        game_state = GameState(self.world)
+        data = self._snapshot_bytes(session_id)
+        if data is not None:
+            game_state.load_state(decode_binary(data, self.world))
+            self.rehydrations += 1
+            self.rehydration_latency.record(time.perf_counter_ns() - start)
+        # A new session matches the world's starting state, which needs no snapshot either
+        self._resident[session_id] = _Entry(game_state, now, game_state.revision)
+        self._enforce_budgets(now)
+        return game_state
+
+    def run(self, session_id: str, command: str) -> Optional[str]:
+        return process_command(command, self.get(session_id))
+
+    def exists(self, session_id: str) -> bool:
+        # Whether a session is resident or has a snapshot to rehydrate from
+        if session_id in self._resident:
+            return True
+        with self._pending_lock:
+            data = self._pending.get(session_id)
+        if data is not None:
+            return bool(data)
+        return os.path.exists(self.path(session_id))
+
+    def discard(self, session_id: str) -> None:
+        # Forgets a session for good, snapshot and all, e.g. once its game is over.
+        # The snapshot is removed by the writer, after any write still queued for it.
+        self._resident.pop(session_id, None)
+        with self._pending_lock:
+            self._pending[session_id] = b""
+        self._writes.put((session_id, b""))
+
+    def hibernate(self, session_id: str) -> None:
+        # Takes a session out of memory now, e.g. when its player disconnects
+        entry = self._resident.pop(session_id, None)
+        if entry is not None:
+            self._spill(session_id, entry)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        # The LRU is in last-use order, so idle sessions are all at its head
+        if self.max_idle is None:
+            return 0
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        while self._resident:
+            session_id, entry = next(iter(self._resident.items()))
+            if now - entry.last_used < self.max_idle:
+                break
+            del self._resident[session_id]
+            self._spill(session_id, entry)
+            evicted += 1
+        return evicted
+
+    def _enforce_budgets(self, now: float) -> None:
+        while len(self._resident) > self.max_resident:
+            session_id, entry = self._resident.popitem(last=False)
+            self._spill(session_id, entry)
+        self.evict_idle(now)
+
+    def _spill(self, session_id: str, entry: _Entry) -> None:
+        self.hibernations += 1
+        game_state = entry.game_state
+        if entry.saved_revision == game_state.revision:
+            # Unchanged since it was last written
+            return
+        # Encoding is cheap and happens here, so the writer never touches a live GameState
+        data = encode_binary(game_state.save_state(), self.world)
+        self.snapshots_written += 1
+        with self._pending_lock:
+            self._pending[session_id] = data
+        self._writes.put((session_id, data))
+
+    def _snapshot_bytes(self, session_id: str) -> Optional[bytes]:
+        with self._pending_lock:
+            data = self._pending.get(session_id)
+        if data is not None:
+            # Empty for a discarded session whose snapshot is not yet removed
+            return data or None
+        try:
+            with open(self.path(session_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_loop(self) -> None:
+        while True:
+            item = self._writes.get()
+            try:
+                if item is None:
+                    return
+                session_id, data = item
+                try:
+                    self._write(session_id, data)
+                except Exception:
+                    # A full disk, say. The snapshot stays pending, so the session can still be
+                    # rehydrated from memory, and the writer carries on with the next one
+                    log.exception("Could not write the snapshot of session %s", session_id)
+                    self.write_errors += 1
+                    continue
+                with self._pending_lock:
+                    # A newer snapshot may have been queued meanwhile; it stays pending
+                    if self._pending.get(session_id) is data:
+                        del self._pending[session_id]
+            finally:
+                self._writes.task_done()
+
+    def _write(self, session_id: str, data: bytes) -> None:
+        filename = self.path(session_id)
+        if not data:
+            try:
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
+        elif self.durable:
+            atomic_write(filename, data)
+        else:
+            with open(filename + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(filename + ".tmp", filename)
+
+    def flush(self) -> None:
+        # Waits until every queued snapshot is on disk
+        self._writes.join()
+
+    def close(self) -> None:
+        while self._resident:
+            session_id, entry = self._resident.popitem(last=False)
+            self._spill(session_id, entry)
+        self._writes.put(None)
+        self._writer.join()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "resident": len(self._resident),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "rehydrations": self.rehydrations,
+            "hibernations": self.hibernations,
+            "snapshots_written": self.snapshots_written,
+            "pending_writes": len(self._pending),
+            "write_errors": self.write_errors,
+            "rehydration_p50_us": self.rehydration_latency.percentile(50) / 1000,
+            "rehydration_p99_us": self.rehydration_latency.percentile(99) / 1000,
+        }
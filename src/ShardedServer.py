@@ -0,0 +1,348 @@
+"""
+Sessions spread over several worker processes, to use more than the one core a single
+CPython process can keep busy.
+
+A supervisor accepts every connection and pre-forks the workers. Each connection is given
+a session token and handed to a worker, socket and all, over a Unix socket pair
+(SCM_RIGHTS), so the supervisor never sees the player's traffic afterwards. The worker is
+chosen by rendezvous hashing of the token: every live worker scores it and the highest
+score wins. When a worker dies only its share of the sessions moves, spread evenly over
+the others, until its replacement is forked and takes the share back. A worker tells the
+supervisor over the same socket pair whenever one of its sessions ends, so the supervisor
+knows how many each is serving.
+
+A player who sends "resume <token>" is handed back to the supervisor with whatever they
+sent after it, and placed again by the token they resume. A session is therefore always
+served, hibernated and rehydrated by the same worker, which never reads a snapshot
+another worker may still be writing.
+
+The world is compiled once, in the supervisor, before the workers are forked. Its exit
+table is moved into multiprocessing.shared_memory and its text, in a packed world, is
+already a memory-mapped file; the rest is inherited copy-on-write, with the collector
+frozen across the fork so it does not copy those pages into every worker by touching them.
+
+    python GameServer.py --workers 4 --port 4000
+"""
+from array import array
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+import asyncio
+import gc
+import hashlib
+import multiprocessing
+import signal
+import socket
+import uuid
+
+from GameServer import GameServer
+from SessionManager import SessionManager
+from World import DEFAULT_WORLD_FILE, World, read_world
+
+# Workers are forked so they inherit the compiled world rather than rebuild it
+_FORK = multiprocessing.get_context("fork")
+# Largest message over a worker's socket pair: a resume, and what the player sent after it
+MAX_MESSAGE = 16 * 1024
+
+
+def share_exits(world: World) -> shared_memory.SharedMemory:
+    # Moves the exit table into shared memory; world.exits becomes a view of it
+    data = world.exits.tobytes()
+    memory = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    memory.buf[:len(data)] = data
+    world.exits = memory.buf[:len(data)].cast("i")
+    return memory
+
+
+def release_exits(world: World, memory: shared_memory.SharedMemory) -> None:
+    view = world.exits
+    world.exits = array("i", view)
+    view.release()
+    memory.close()
+    memory.unlink()
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    # Proportional and private memory of a process, where /proc has them
+    found = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Pss", "Private_Dirty"):
+                    found[name.lower()] = int(value.split()[0])
+    except OSError:
+        pass
+    return found
+
+
+class _Worker:
+    def __init__(self, slot: int, process, channel: socket.socket) -> None:
+        self.slot = slot
+        self.process = process
+        self.channel = channel
+        self.key = f"worker-{slot}".encode("ascii")
+        # Live sessions, and every connection ever handed to this worker
+        self.sessions = 0
+        self.handed_off = 0
+
+
+class Supervisor:
+    def __init__(self, workers: int = 4, host: str = "127.0.0.1", port: int = 0,
+                 world_file: str = DEFAULT_WORLD_FILE, respawn: bool = True,
+                 hibernate_dir: Optional[str] = None, **server_options) -> None:
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.world_file = world_file
+        self.respawn = respawn
+        self.hibernate_dir = hibernate_dir
+        # Passed on to each worker's GameServer
+        self.server_options = server_options
+        self.world: Optional[World] = None
+        self.deaths = 0
+        self.handoff_failures = 0
+        self._memory: Optional[shared_memory.SharedMemory] = None
+        self._listener: Optional[socket.socket] = None
+        self._workers: Dict[int, _Worker] = {}
+        self._closing = False
+
+    @property
+    def address(self):
+        return self._listener.getsockname()[:2]
+
+    @property
+    def live_workers(self) -> List[int]:
+        return sorted(self._workers)
+
+    async def start(self) -> None:
+        if self._listener is not None:
+            return
+        self.world = read_world(self.world_file)
+        self._memory = share_exits(self.world)
+        self._listener = socket.create_server((self.host, self.port), backlog=4096)
+        self._listener.setblocking(False)
+        for slot in range(self.workers):
+            self._spawn(slot)
+        asyncio.get_running_loop().add_reader(self._listener.fileno(), self._accept)
+
+    def _spawn(self, slot: int) -> None:
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        # Every channel end the supervisor holds, so the child can close its copies
+        inherited = [worker.channel for worker in self._workers.values()] + [ours]
+        process = _FORK.Process(target=self._run_worker, args=(theirs, inherited), name=f"worker-{slot}")
+        gc.freeze()
+        try:
+            process.start()
+        finally:
+            gc.unfreeze()
+        theirs.close()
+        worker = self._workers[slot] = _Worker(slot, process, ours)
+        loop = asyncio.get_running_loop()
+        loop.add_reader(process.sentinel, self._reap, worker)
+        loop.add_reader(ours.fileno(), self._from_worker, worker)
+
+    def _run_worker(self, channel: socket.socket, inherited: List[socket.socket]) -> None:
+        # In the forked child: drop what belongs to the supervisor, then serve
+        signal.set_wakeup_fd(-1)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, signal.SIG_DFL)
+        self._listener.close()
+        for other in inherited:
+            other.close()
+        asyncio.run(_serve_worker(channel, self.world, self.hibernate_dir, self.server_options))
+
+    def _from_worker(self, worker: _Worker) -> None:
+        # One message per session that ends or connection handed back; the channel is readable,
+        # so this never blocks
+        try:
+            message, fds, _, _ = socket.recv_fds(worker.channel, MAX_MESSAGE, 1)
+        except OSError:
+            message, fds = b"", []
+        if not message:
+            # The worker has gone; _reap deals with it
+            asyncio.get_running_loop().remove_reader(worker.channel.fileno())
+            return
+        if not fds:
+            worker.sessions = max(0, worker.sessions - 1)
+            return
+        # "resume <token>\n" and what followed it, with the player's connection
+        header, _, pending = message.partition(b"\n")
+        with socket.socket(fileno=fds[0]) as connection:
+            self._hand_off(connection, header.split()[1].decode("ascii"), pending)
+
+    def _reap(self, worker: _Worker) -> None:
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(worker.process.sentinel)
+        loop.remove_reader(worker.channel.fileno())
+        worker.process.join()
+        worker.channel.close()
+        if self._workers.get(worker.slot) is worker:
+            # Leaving the slot out of the hash spreads its sessions over the survivors
+            del self._workers[worker.slot]
+        if self._closing:
+            return
+        self.deaths += 1
+        if self.respawn:
+            self._spawn(worker.slot)
+
+    def route(self, token: str) -> _Worker:
+        """
+        The worker serving a session: the live worker scoring the session token highest.
+        """
+        if not self._workers:
+            raise RuntimeError("No workers are running.")
+        key = str(token).encode("ascii")
+        return max(self._workers.values(),
+                   key=lambda worker: hashlib.blake2b(key, digest_size=8, key=worker.key).digest())
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # Out of descriptors, say; the connection stays queued for the next try
+                return
+            with connection:
+                self._hand_off(connection, uuid.uuid4().hex)
+
+    def _hand_off(self, connection: socket.socket, token: str, pending: Optional[bytes] = None) -> None:
+        # A new session, or with pending set, a connection resuming the session of token
+        while self._workers:
+            worker = self.route(token)
+            if pending is None:
+                message = f"new {token}".encode("ascii")
+            else:
+                # Should the resume fail, the player carries on with a new session kept by the same worker
+                message = f"resume {token} {self._token_for(worker)}\n".encode("ascii") + pending
+            try:
+                socket.send_fds(worker.channel, [message], [connection.fileno()])
+                worker.sessions += 1
+                worker.handed_off += 1
+                return
+            except OSError:
+                # The worker died before its death was noticed; rebalance now
+                self.handoff_failures += 1
+                del self._workers[worker.slot]
+        # Nobody left to serve it: closing the connection tells the player
+
+    def _token_for(self, worker: _Worker) -> str:
+        # A new token that routes to worker; one try in as many as there are workers succeeds
+        while True:
+            token = uuid.uuid4().hex
+            if self.route(token) is worker:
+                return token
+
+    def stats(self) -> Dict[str, object]:
+        workers = {}
+        for slot, worker in sorted(self._workers.items()):
+            workers[slot] = dict(pid=worker.process.pid, sessions=worker.sessions, handed_off=worker.handed_off,
+                                 **memory_kb(worker.process.pid))
+        return {
+            "workers": workers,
+            "deaths": self.deaths,
+            "handoff_failures": self.handoff_failures,
+            # Sessions live now, and connections handed to the live workers since they started
+            "sessions": sum(worker.sessions for worker in self._workers.values()),
+            "handed_off": sum(worker.handed_off for worker in self._workers.values()),
+        }
+
+    async def shutdown(self, timeout: float = 30.0) -> None:
+        # Stop accepting, then ask every worker to end its sessions, which saves them
+        if self._listener is None:
+            return
+        self._closing = True
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self._listener.fileno())
+        self._listener.close()
+        workers = list(self._workers.values())
+        for worker in workers:
+            loop.remove_reader(worker.process.sentinel)
+            loop.remove_reader(worker.channel.fileno())
+            worker.process.terminate()
+        for worker in workers:
+            await loop.run_in_executor(None, worker.process.join, timeout)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.channel.close()
+        self._workers.clear()
+        release_exits(self.world, self._memory)
+        self._memory = None
+
+
+async def _serve_worker(channel: socket.socket, world: World, hibernate_dir: Optional[str],
+                        server_options: Dict) -> None:
+    def redirect(fd: int, token: str, pending: bytes) -> bool:
+        # Hands a resuming connection back to the supervisor, to be placed by the token it resumes
+        message = f"resume {token}\n".encode("ascii") + pending
+        if len(message) > MAX_MESSAGE:
+            return False
+        try:
+            socket.send_fds(channel, [message], [fd])
+        except OSError:
+            return False
+        return True
+
+    sessions = SessionManager(hibernate_dir, world=world) if hibernate_dir else None
+    server = GameServer(world=world, sessions=sessions, redirect=redirect, **server_options)
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    # The loop only keeps weak references to tasks
+    connections = set()
+
+    def receive() -> None:
+        while True:
+            try:
+                message, fds, _, _ = socket.recv_fds(channel, MAX_MESSAGE, 1)
+            except (BlockingIOError, InterruptedError):
+                return
+            if not message:
+                # The supervisor has gone
+                loop.remove_reader(channel.fileno())
+                stop.set()
+                return
+            # "new <token>", or "resume <token> <new token>\n" and what the player sent after it
+            header, _, pending = message.partition(b"\n")
+            kind, *tokens = header.decode("ascii").split()
+            for fd in fds:
+                sock = socket.socket(fileno=fd)
+                if kind == "new":
+                    adopted = server.adopt(sock, tokens[0])
+                else:
+                    adopted = server.adopt(sock, tokens[1], resume=tokens[0], pending=pending)
+                task = asyncio.ensure_future(adopted)
+                connections.add(task)
+                task.add_done_callback(connections.discard)
+                task.add_done_callback(ended)
+
+    def ended(task: asyncio.Future) -> None:
+        # Tells the supervisor, which counts the sessions each worker is serving
+        try:
+            channel.send(b"end")
+        except OSError:
+            pass
+
+    channel.setblocking(False)
+    loop.add_reader(channel.fileno(), receive)
+    await stop.wait()
+    loop.remove_reader(channel.fileno())
+    await server.shutdown()
+    if sessions is not None:
+        sessions.close()
+
+
+async def run_supervisor(supervisor: Supervisor, ready=None) -> None:
+    await supervisor.start()
+    if ready is not None:
+        ready.put(supervisor.address)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Serving the manor on {supervisor.address} with {supervisor.workers} workers")
+    await stop.wait()
+    await supervisor.shutdown()
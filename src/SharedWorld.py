@@ -0,0 +1,224 @@
+"""
+One manor shared by several detectives.
+
+Each player still has a GameState of their own, holding what is theirs alone: location,
+inventory, visited rooms. What players change together lives in a SharedWorld: the items
+lying in each room and which locked rooms have been opened. Every room has its own lock,
+taken only around changes to that room, so players in different rooms never wait for
+each other; a move takes the locks of the two rooms involved, in room id order.
+Opening a room flips a byte from 0 to 1 and never back, so reading it needs no lock; the
+same rooms are also kept as a bitmask, as in a single-player GameState, for routing and
+hints, and that is updated under a lock of its own.
+
+Whatever a player does in a room is told to the others in it ("detective3 picks up
+the lantern."). Each occupant registers a deliver callback when joining; it is called
+with the event text and the time it happened, and must not block (GameServer queues the
+text and writes it out in batches).
+"""
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+
+from GameState import GameState
+from Metrics import Histogram
+from NameSet import bit_ids
+from Rules import Rule
+from World import World, load_world, render_location
+
+# Called with the event text and its time.perf_counter_ns() timestamp
+Deliver = Callable[[str, int], None]
+
+
+class SharedWorld:
+    def __init__(self, world: Optional[World] = None) -> None:
+        self.world = world if world is not None else load_world()
+        self.opened = bytearray(len(self.world.rooms))
+        # The opened rooms again, as a mask over room ids like GameState._unlocked
+        self.unlocked = 0
+        self._unlock_lock = threading.Lock()
+        # Items of the rooms players have changed; every player's GameState reads this dict
+        self.room_items: Dict[int, List[str]] = {}
+        self._locks: Dict[int, threading.RLock] = {}
+        self._occupants: Dict[int, Dict[str, Deliver]] = {}
+        # Statistics; counted without a lock of their own, so approximate under contention
+        self.lock_acquisitions = 0
+        self.lock_contended = 0
+        self.lock_wait = Histogram()
+        self.events = 0
+
+    def open(self, room_id: int) -> None:
+        with self._unlock_lock:
+            self.unlocked |= 1 << room_id
+        self.opened[room_id] = 1
+
+    def lock(self, room_id: int) -> threading.RLock:
+        lock = self._locks.get(room_id)
+        if lock is None:
+            # setdefault is atomic, so two players arriving together still share one lock
+            lock = self._locks.setdefault(room_id, threading.RLock())
+        return lock
+
+    @contextmanager
+    def locked(self, *room_ids: int) -> Iterator[None]:
+        # Always in id order, so two players crossing between the same rooms cannot deadlock
+        locks = [self.lock(room_id) for room_id in sorted(set(room_ids))]
+        for lock in locks:
+            self.lock_acquisitions += 1
+            if not lock.acquire(blocking=False):
+                self.lock_contended += 1
+                start = time.perf_counter_ns()
+                lock.acquire()
+                self.lock_wait.record(time.perf_counter_ns() - start)
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def occupants(self, room_id: int) -> List[str]:
+        return list(self._occupants.get(room_id, ()))
+
+    def join(self, name: str, deliver: Deliver) -> "SharedGameState":
+        game_state = SharedGameState(self, name)
+        room_id = self.world.room_ids[game_state.current_location]
+        with self.locked(room_id):
+            self.broadcast(room_id, f"{name} arrives.")
+            self._occupants.setdefault(room_id, {})[name] = deliver
+        return game_state
+
+    def leave(self, game_state: "SharedGameState") -> None:
+        room_id = self.world.room_ids[game_state.current_location]
+        with self.locked(room_id):
+            self._occupants.get(room_id, {}).pop(game_state.name, None)
+            self.broadcast(room_id, f"{game_state.name} leaves.")
+
+    def relocate(self, name: str, from_id: int, to_id: int, direction: Optional[str]) -> None:
+        with self.locked(from_id, to_id):
+            deliver = self._occupants.get(from_id, {}).pop(name, None)
+            self.broadcast(from_id, f"{name} leaves {direction}." if direction else f"{name} leaves.")
+            self.broadcast(to_id, f"{name} arrives.")
+            if deliver is not None:
+                self._occupants.setdefault(to_id, {})[name] = deliver
+
+    def broadcast(self, room_id: int, text: str, exclude: Optional[str] = None) -> None:
+        # Called with the room's lock held, so the occupants cannot change meanwhile
+        occupants = self._occupants.get(room_id)
+        if not occupants:
+            return
+        now = time.perf_counter_ns()
+        for name, deliver in occupants.items():
+            if name != exclude:
+                self.events += 1
+                deliver(text, now)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "lock_acquisitions": self.lock_acquisitions,
+            "lock_contended": self.lock_contended,
+            "contention_rate": self.lock_contended / self.lock_acquisitions if self.lock_acquisitions else 0.0,
+            "lock_wait_p99_us": self.lock_wait.percentile(99) / 1000,
+            "events": self.events,
+        }
+
+
+class SharedGameState(GameState):
+    """
+    A player in a SharedWorld. Room items and opened rooms come from the shared world;
+    everything else is the player's own, changed only by their own commands.
+    """
+
+    # Turns cannot be taken back once others have seen them
+    keep_history = False
+
+    def __init__(self, shared: SharedWorld, name: str) -> None:
+        self.shared = shared
+        super().__init__(shared.world)
+        self.name = name
+        self._room_items = shared.room_items
+        # The direction of the move under way, for the "leaves north" event
+        self._direction: Optional[str] = None
+
+    def load_state(self, state: Dict) -> None:
+        # A save holds a whole manor, and this one's rooms and doors belong to every player
+        raise ValueError("A saved game cannot be loaded into a shared manor.")
+
+    def _render_changed(self, room_id: int, items: List[str]) -> str:
+        # Other players change rooms too, so shared rooms are never cached per player
+        return render_location(self.world.description(room_id), items)
+
+    @property
+    def _unlocked(self) -> int:
+        # Routing and hints read the shared rooms through the same mask as a single player's
+        return self.shared.unlocked
+
+    @_unlocked.setter
+    def _unlocked(self, mask: int) -> None:
+        # Opened rooms stay open for everyone, so a mask can only add to them
+        for room_id in bit_ids(mask):
+            self.shared.open(room_id)
+
+    def _is_locked_id(self, room_id: int) -> bool:
+        return self.world.rooms[room_id].locked and not self.shared.opened[room_id]
+
+    def _unlock(self, room_id: int) -> None:
+        self.shared.open(room_id)
+        self.revision += 1
+
+    def _change_location(self, new_location: str, success_message: str) -> Tuple[bool, str]:
+        room_ids = self.world.room_ids
+        from_id = room_ids[self.current_location]
+        result = super()._change_location(new_location, success_message)
+        self.shared.relocate(self.name, from_id, room_ids[new_location], self._direction)
+        return result
+
+    def move_player(self, direction: str) -> Tuple[bool, str]:
+        room_ids = self.world.room_ids
+        from_id = room_ids[self.current_location]
+        target = self.world.exit_target(from_id, direction)
+        if target is None:
+            return super().move_player(direction)
+        with self.shared.locked(from_id, target):
+            was_locked = self._is_locked_id(target)
+            self._direction = direction
+            try:
+                success, message = super().move_player(direction)
+            finally:
+                self._direction = None
+            if success and was_locked:
+                self.shared.broadcast(from_id, f"{self.name} unlocks the way to the {self.world.rooms[target].title}.")
+        return success, message
+
+    def pick_up_item(self, item_name: str) -> Tuple[bool, str]:
+        room_id = self.world.room_ids[self.current_location]
+        with self.shared.locked(room_id):
+            success, message = super().pick_up_item(item_name)
+            if success:
+                self.shared.broadcast(room_id, f"{self.name} picks up the {item_name}.", exclude=self.name)
+        return success, message
+
+    def use_item(self, item_name: str) -> Tuple[bool, str]:
+        room_id = self.world.room_ids[self.current_location]
+        with self.shared.locked(room_id):
+            success, message = super().use_item(item_name)
+            if success:
+                self.shared.broadcast(room_id, f"{self.name} uses the {item_name}.", exclude=self.name)
+        return success, message
+
+    def _rule_applies(self, rule: Rule, room_id: int) -> bool:
+        if not self._inventory.has_all(rule.requires_items):
+            return False
+        for locked_id in bit_ids(rule.requires_locked):
+            if not self._is_locked_id(locked_id):
+                return False
+        if self._inventory.has_any(rule.absent_items):
+            return False
+        room_items = self._items_by_id(room_id)
+        return not any(item in room_items for item in rule.absent)
+
+    def _apply_rule(self, rule: Rule, room_id: int) -> None:
+        for unlocked_id in bit_ids(rule.unlock):
+            self.shared.open(unlocked_id)
+        super()._apply_rule(rule._replace(unlock=0), room_id)
+        if rule.unlock:
+            self.revision += 1
@@ -0,0 +1,189 @@
+"""
+Versioned save snapshots.
+
+A snapshot is the whole per-session state stored as a delta against the shared world:
+where the player is, what they carry and have seen, which rooms they unlocked, the item
+lists of only the rooms they changed, and whether the mystery was solved. It is a plain
+dict (what GameState.save_state returns), saved as JSON or in the binary encoding below.
+
+Older snapshots are upgraded on load by the MIGRATIONS chain, one version at a time.
+"""
+from typing import Callable, Dict, List, Sequence, Tuple
+import struct
+
+from NameSet import bit_ids
+from World import World
+
+SNAPSHOT_VERSION = 2
+
+# Binary layout, all little-endian whatever the machine:
+#   header    magic, version, flags, room count, item count of the world it was saved against
+#   names     names the world does not know (u16 count, then u16 length + UTF-8 each)
+#   location  u32 room reference
+#   inventory u32 count + u32 item references
+#   visited   u32 count + u32 room references
+#   unlocked  bitset over room ids
+#   rooms     u32 count, then per changed room: u32 room id, u32 count, u32 item references
+# A reference below the world's room/item count is an id; anything above indexes the names table.
+BINARY_MAGIC = b"MMSV"
+_HEADER = struct.Struct("<4sBBII")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_FLAG_SOLVED = 1
+
+
+def _migrate_v1(state: Dict) -> Dict:
+    # Version 1 saves only held the location, inventory and visited rooms
+    migrated = dict(state)
+    migrated.setdefault("inventory", [])
+    migrated.setdefault("visited_locations", [])
+    migrated.setdefault("unlocked", [])
+    migrated.setdefault("room_items", {})
+    migrated.setdefault("solved", False)
+    migrated["version"] = 2
+    return migrated
+
+
+# Maps a snapshot version to the function that upgrades it to the next version
+MIGRATIONS: Dict[int, Callable[[Dict], Dict]] = {
+    1: _migrate_v1,
+}
+
+
+def migrate(state: Dict) -> Dict:
+    version = state.get("version", 1)
+    if version > SNAPSHOT_VERSION:
+        raise ValueError(f"Save version {version} is newer than this game supports ({SNAPSHOT_VERSION}).")
+    while version < SNAPSHOT_VERSION:
+        state = MIGRATIONS[version](state)
+        version = state["version"]
+    return state
+
+
+class _NameTable:
+    def __init__(self, ids: Dict[str, int]) -> None:
+        self.ids = ids
+        self.base = len(ids)
+        self.extra: Dict[str, int] = {}
+
+    def ref(self, name: str) -> int:
+        ref = self.ids.get(name)
+        if ref is None:
+            ref = self.extra.setdefault(name, len(self.extra))
+            ref += self.base
+        return ref
+
+
+def encode_binary(state: Dict, world: World) -> bytes:
+    rooms = _NameTable(world.room_ids)
+    items = _NameTable(world.item_ids)
+    # Room and item names outside the world share one table, indexed after each id range
+    items.extra = rooms.extra
+
+    location = rooms.ref(state["current_location"])
+    inventory = [items.ref(item) for item in state["inventory"]]
+    visited = [rooms.ref(room) for room in state["visited_locations"]]
+
+    unlocked = 0
+    for room in state["unlocked"]:
+        room_id = world.room_ids.get(room)
+        if room_id is not None:
+            unlocked |= 1 << room_id
+
+    changed: List[bytes] = []
+    for room, room_items in state["room_items"].items():
+        room_id = world.room_ids.get(room)
+        if room_id is None:
+            continue
+        changed.append(_U32.pack(room_id) + _pack_refs([items.ref(item) for item in room_items]))
+
+    names = [_U16.pack(len(rooms.extra))]
+    for name in rooms.extra:
+        encoded = name.encode("utf-8")
+        names.append(_U16.pack(len(encoded)) + encoded)
+
+    flags = _FLAG_SOLVED if state["solved"] else 0
+    return b"".join([
+        _HEADER.pack(BINARY_MAGIC, SNAPSHOT_VERSION, flags, len(world.rooms), len(world.item_names)),
+        *names,
+        _U32.pack(location),
+        _pack_refs(inventory),
+        _pack_refs(visited),
+        unlocked.to_bytes((len(world.rooms) + 7) // 8, "little"),
+        _U32.pack(len(changed)), *changed,
+    ])
+
+
+def _pack_refs(refs: Sequence[int]) -> bytes:
+    # A u32 count, then the references; struct rather than array, whose bytes are in the machine's order
+    return _U32.pack(len(refs)) + struct.pack(f"<{len(refs)}I", *refs)
+
+
+def decode_binary(data: bytes, world: World) -> Dict:
+    try:
+        return _decode_binary(data, world)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Corrupted binary save: {e}") from e
+
+
+def _decode_binary(data: bytes, world: World) -> Dict:
+    magic, version, flags, room_count, item_count = _HEADER.unpack_from(data, 0)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary save.")
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f"Binary save version {version} is not supported.")
+    if room_count != len(world.rooms) or item_count != len(world.item_names):
+        raise ValueError("Binary save was written for a different world.")
+    offset = _HEADER.size
+
+    (name_count,) = _U16.unpack_from(data, offset)
+    offset += _U16.size
+    extra: List[str] = []
+    for _ in range(name_count):
+        (length,) = _U16.unpack_from(data, offset)
+        offset += _U16.size
+        extra.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+
+    room_names, item_names = world.rooms, world.item_names
+
+    def room(ref: int) -> str:
+        return room_names[ref].name if ref < room_count else extra[ref - room_count]
+
+    def item(ref: int) -> str:
+        return item_names[ref] if ref < item_count else extra[ref - item_count]
+
+    def refs(offset: int) -> Tuple[Tuple[int, ...], int]:
+        (count,) = _U32.unpack_from(data, offset)
+        offset += _U32.size
+        if offset + 4 * count > len(data):
+            raise ValueError("Truncated binary save.")
+        return struct.unpack_from(f"<{count}I", data, offset), offset + 4 * count
+
+    (location,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    inventory, offset = refs(offset)
+    visited, offset = refs(offset)
+
+    width = (room_count + 7) // 8
+    unlocked_bits = int.from_bytes(data[offset:offset + width], "little")
+    offset += width
+    unlocked = [room_names[room_id].name for room_id in bit_ids(unlocked_bits)]
+
+    (changed_count,) = _U32.unpack_from(data, offset)
+    offset += _U32.size
+    room_items: Dict[str, List[str]] = {}
+    for _ in range(changed_count):
+        (room_id,) = _U32.unpack_from(data, offset)
+        items, offset = refs(offset + _U32.size)
+        room_items[room_names[room_id].name] = [item(ref) for ref in items]
+
+    return {
+        "version": version,
+        "current_location": room(location),
+        "inventory": [item(ref) for ref in inventory],
+        "visited_locations": [room(ref) for ref in visited],
+        "unlocked": unlocked,
+        "room_items": room_items,
+        "solved": bool(flags & _FLAG_SOLVED),
+    }
@@ -0,0 +1,463 @@
+"""
+State-space solver that checks a world can still be won.
+
+A search state is the player's room, the items they carry, the rooms they have unlocked
+and the items rules have revealed, packed into a single int. Starting from a GameState,
+a breadth-first search applies the same move/take/use semantics as the engine, so the
+first winning state found gives the shortest winning command sequence.
+
+Only items that can change the outcome of a gate or rule are ever picked up, which keeps
+the inventory part of the state small on worlds with thousands of items.
+
+    python Solver.py                       # the manor
+    python Solver.py world_a.json world_b.json --processes 4
+
+The command exits with status 1 if any world cannot be won.
+"""
+from collections import deque
+from typing import Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import argparse
+import multiprocessing
+import sys
+
+from GameState import GameState
+from NameSet import bit_ids
+from Rules import ANYWHERE, Rule, find_rules
+from World import NO_EXIT, World, load_world
+
+# Key of the terminal state reached when a rule ends the game
+WON = -1
+
+
+class SolveReport(NamedTuple):
+    solvable: bool
+    # Command sequence that ends the game, empty if there is none
+    solution: List[str]
+    # Whether the solution is known to be the shortest
+    optimal: bool
+    states: int
+    # False if there were more than max_states states, so the greedy search was used
+    # and dead ends were not looked for
+    complete: bool
+    reachable_rooms: List[str]
+    unreachable_rooms: List[str]
+    reachable_items: List[str]
+    unreachable_items: List[str]
+    # Reachable states from which the game can no longer be won
+    dead_ends: int
+    # Shortest command sequence that leads into a dead end, if any
+    dead_end_path: Optional[List[str]]
+
+
+class _UseRule(NamedTuple):
+    # A Rule translated into the solver's compact bit spaces
+    requires: int
+    requires_locked: int
+    absent: int
+    absent_in_room: int
+    unlock: int
+    reveal: Tuple[int, ...]
+    end_game: bool
+
+
+class _Model:
+    """
+    The world re-indexed for search: relevant items and initially locked rooms each get
+    a dense bit, and every (room, item) a rule can reveal gets a reveal slot.
+    """
+
+    def __init__(self, world: World) -> None:
+        self.world = world
+        relevant: Dict[int, None] = {}
+        for room in world.rooms:
+            if room.required_item is not None:
+                relevant[world.item_ids[room.required_item]] = None
+        for (item_id, _), rules in world.rules.items():
+            for rule in rules:
+                if rule.unlock or rule.reveal or rule.end_game:
+                    relevant[item_id] = None
+                if rule.requires_items or rule.absent_items:
+                    for other_id in bit_ids(rule.requires_items | rule.absent_items):
+                        relevant[other_id] = None
+        self.items: List[int] = list(relevant)
+        self.item_bits: Dict[int, int] = {item_id: bit for bit, item_id in enumerate(self.items)}
+        self.locks: List[int] = list(bit_ids(world.locked_mask))
+        self.lock_bits: Dict[int, int] = {room_id: bit for bit, room_id in enumerate(self.locks)}
+        self.slots: Dict[Tuple[int, int], int] = {}
+        self.slot_keys: List[Tuple[int, int]] = []
+        self._room_bits = max(len(world.rooms) - 1, 1).bit_length()
+        self._item_width = len(self.items)
+        self._lock_width = len(self.locks)
+        self._room_items: Dict[int, Tuple[int, ...]] = {}
+        self._uses: Dict[Tuple[int, int], Tuple[_UseRule, ...]] = {}
+        # Items whose rules can change something, by room; ANYWHERE rules count in every room
+        self.usable: Dict[int, List[int]] = {}
+        for (item_id, location_id), rules in world.rules.items():
+            if any(rule.unlock or rule.reveal or rule.end_game for rule in rules):
+                self.usable.setdefault(location_id, []).append(self.item_bits[item_id])
+        self._anywhere = self.usable.pop(ANYWHERE, [])
+
+    def item_mask(self, mask: int) -> int:
+        # World item ids -> relevant item bits; rule items are always relevant
+        result = 0
+        for item_id in bit_ids(mask):
+            result |= 1 << self.item_bits[item_id]
+        return result
+
+    def lock_mask(self, mask: int) -> int:
+        result = 0
+        for room_id in bit_ids(mask):
+            bit = self.lock_bits.get(room_id)
+            if bit is not None:
+                result |= 1 << bit
+        return result
+
+    def slot(self, room_id: int, item_id: int) -> int:
+        slot = self.slots.get((room_id, item_id))
+        if slot is None:
+            slot = self.slots[room_id, item_id] = len(self.slot_keys)
+            self.slot_keys.append((room_id, item_id))
+        return slot
+
+    def pack(self, room_id: int, carried: int, unlocked: int, revealed: int) -> int:
+        return (((revealed << self._lock_width | unlocked) << self._item_width | carried)
+                << self._room_bits | room_id)
+
+    def unpack(self, key: int) -> Tuple[int, int, int, int]:
+        room_id = key & ((1 << self._room_bits) - 1)
+        key >>= self._room_bits
+        carried = key & ((1 << self._item_width) - 1)
+        key >>= self._item_width
+        unlocked = key & ((1 << self._lock_width) - 1)
+        return room_id, carried, unlocked, key >> self._lock_width
+
+    def room_items(self, room_id: int) -> Tuple[int, ...]:
+        # Relevant items lying in a room at the start, as item bits
+        items = self._room_items.get(room_id)
+        if items is None:
+            world = self.world
+            items = tuple(self.item_bits[world.item_ids[name]] for name in world.rooms[room_id].items
+                          if world.item_ids[name] in self.item_bits)
+            self._room_items[room_id] = items
+        return items
+
+    def usable_here(self, room_id: int, carried: int) -> Iterator[int]:
+        for bit in self.usable.get(room_id, ()):
+            if carried >> bit & 1:
+                yield bit
+        for bit in self._anywhere:
+            if carried >> bit & 1:
+                yield bit
+
+    def uses(self, item_bit: int, room_id: int) -> Tuple[_UseRule, ...]:
+        # The rules for using an item in a room, in the order the engine tries them
+        uses = self._uses.get((item_bit, room_id))
+        if uses is None:
+            uses = self._uses[item_bit, room_id] = tuple(
+                self._compile(rule, room_id) for rule in find_rules(self.world.rules, self.items[item_bit], room_id))
+        return uses
+
+    def _compile(self, rule: Rule, room_id: int) -> _UseRule:
+        world = self.world
+        initial = world.room_item_set(room_id)
+        absent_in_room = 0
+        for name in rule.absent:
+            if name in initial:
+                absent_in_room |= 1 << self.item_bits[world.item_ids[name]]
+        requires_locked = self.lock_mask(rule.requires_locked)
+        if rule.requires_locked & ~world.locked_mask:
+            # Needs a room locked that never was, so it can never apply
+            requires_locked = -1
+        return _UseRule(
+            requires=self.item_mask(rule.requires_items),
+            requires_locked=requires_locked,
+            absent=self.item_mask(rule.absent_items),
+            absent_in_room=absent_in_room,
+            unlock=self.lock_mask(rule.unlock),
+            reveal=tuple(self.slot(room_id, world.item_ids[name]) for name in rule.reveal),
+            end_game=rule.end_game,
+        )
+
+    def visible(self, room_id: int, carried: int, revealed: int) -> Iterator[int]:
+        # Relevant items, as item bits, that could be taken in this room
+        for bit in self.room_items(room_id):
+            if not carried >> bit & 1:
+                yield bit
+        if revealed:
+            for slot in bit_ids(revealed):
+                slot_room, item_id = self.slot_keys[slot]
+                bit = self.item_bits.get(item_id)
+                if slot_room == room_id and bit is not None and not carried >> bit & 1:
+                    yield bit
+
+
+def _applies(use: _UseRule, carried: int, unlocked: int, revealed_here: int) -> bool:
+    if use.requires & carried != use.requires:
+        return False
+    if use.requires_locked < 0 or use.requires_locked & unlocked:
+        return False
+    # Absent items must be neither carried nor lying here, from the start or revealed
+    if use.absent & (carried | revealed_here) or use.absent_in_room & ~carried:
+        return False
+    return True
+
+
+def _successors(model: _Model, key: int) -> Iterator[Tuple[int, str]]:
+    world = model.world
+    room_id, carried, unlocked, revealed = model.unpack(key)
+    width = len(world.directions)
+
+    for direction_id in range(width):
+        target = world.exits[room_id * width + direction_id]
+        if target == NO_EXIT:
+            continue
+        command = f"move {world.directions[direction_id]}"
+        lock_bit = model.lock_bits.get(target)
+        if lock_bit is None or unlocked >> lock_bit & 1:
+            yield model.pack(target, carried, unlocked, revealed), command
+        else:
+            required = world.rooms[target].required_item
+            if required is not None and carried >> model.item_bits[world.item_ids[required]] & 1:
+                yield model.pack(target, carried, unlocked | 1 << lock_bit, revealed), command
+
+    for bit in model.visible(room_id, carried, revealed):
+        yield model.pack(room_id, carried | 1 << bit, unlocked, revealed), f"take {world.item_names[model.items[bit]]}"
+
+    # Relevant items revealed here, as item bits, for rules that need them absent
+    revealed_here = 0
+    for slot in bit_ids(revealed):
+        slot_room, item_id = model.slot_keys[slot]
+        if slot_room == room_id and item_id in model.item_bits:
+            revealed_here |= 1 << model.item_bits[item_id]
+
+    for bit in model.usable_here(room_id, carried):
+        for use in model.uses(bit, room_id):
+            if _applies(use, carried, unlocked, revealed_here):
+                command = f"use {world.item_names[model.items[bit]]}"
+                if use.end_game:
+                    yield WON, command
+                elif use.unlock & ~unlocked or any(not revealed >> slot & 1 for slot in use.reveal):
+                    new_revealed = revealed
+                    for slot in use.reveal:
+                        new_revealed |= 1 << slot
+                    yield model.pack(room_id, carried, unlocked | use.unlock, new_revealed), command
+                break
+
+
+def _start_key(model: _Model, game_state: GameState) -> int:
+    world = model.world
+    room_id = world.room_ids[game_state.current_location]
+    carried = 0
+    for name in game_state.inventory:
+        bit = model.item_bits.get(world.item_ids.get(name, -1))
+        if bit is not None:
+            carried |= 1 << bit
+    unlocked = model.lock_mask(game_state._unlocked)
+    revealed = 0
+    for overlay_room, items in game_state._room_items.items():
+        initial = world.room_item_set(overlay_room)
+        for name in items:
+            if name not in initial and name in world.item_ids:
+                revealed |= 1 << model.slot(overlay_room, world.item_ids[name])
+    return model.pack(room_id, carried, unlocked, revealed)
+
+
+def _path(parents: Dict[int, Tuple[int, str]], key: int) -> List[str]:
+    commands: List[str] = []
+    while True:
+        parent = parents.get(key)
+        if parent is None:
+            return commands[::-1]
+        key, command = parent
+        commands.append(command)
+
+
+def _explore(model: _Model, start: int, max_states: int):
+    # Breadth-first search of every reachable state, keeping the graph for the dead-end pass
+    parents: Dict[int, Tuple[int, str]] = {}
+    successors: Dict[int, List[int]] = {}
+    order: List[int] = [start]
+    queue: Deque[int] = deque(order)
+    seen = {start}
+    while queue:
+        if len(seen) > max_states:
+            return parents, successors, order, False
+        key = queue.popleft()
+        next_keys = successors[key] = []
+        for next_key, command in _successors(model, key):
+            next_keys.append(next_key)
+            if next_key in seen:
+                continue
+            seen.add(next_key)
+            parents[next_key] = (key, command)
+            if next_key != WON:
+                order.append(next_key)
+                queue.append(next_key)
+    return parents, successors, order, True
+
+
+def _progress(model: _Model, start: int) -> Tuple[Optional[List[str]], List[int]]:
+    """
+    Greedy search for worlds too large to explore exhaustively: repeatedly walk to the
+    nearest state where something changes (an item taken, a room unlocked, an item
+    revealed). Nothing is ever lost in play, so when no rule needs an item absent this
+    finds every reachable room and item, and a win if there is one, just not the shortest.
+    """
+    room_mask = (1 << model._room_bits) - 1
+    commands: List[str] = []
+    won_path: Optional[List[str]] = None
+    order: List[int] = [start]
+    key = start
+    while True:
+        progress = key & ~room_mask
+        parents: Dict[int, Tuple[int, str]] = {key: (-1, "")}
+        queue: Deque[int] = deque([key])
+        found = None
+        while queue and found is None:
+            current = queue.popleft()
+            for next_key, command in _successors(model, current):
+                if next_key in parents:
+                    continue
+                parents[next_key] = (current, command)
+                if next_key == WON:
+                    # Keep exploring after the win so the reachability report is complete
+                    if won_path is None:
+                        won_path = commands + _walk(parents, key, WON)
+                elif next_key & ~room_mask != progress:
+                    found = next_key
+                    break
+                else:
+                    order.append(next_key)
+                    queue.append(next_key)
+        if found is None:
+            return won_path, order
+        commands.extend(_walk(parents, key, found))
+        order.append(found)
+        key = found
+
+
+def _walk(parents: Dict[int, Tuple[int, str]], origin: int, key: int) -> List[str]:
+    commands: List[str] = []
+    while key != origin:
+        key, command = parents[key]
+        commands.append(command)
+    return commands[::-1]
+
+
+def solve(game_state: Optional[GameState] = None, max_states: int = 200_000) -> SolveReport:
+    """
+    Explores every state reachable from game_state (a new game by default) and reports
+    the shortest win, which rooms and items can be reached, and the dead ends. Past
+    max_states it falls back to a greedy search, and the solution is no longer minimal.
+    """
+    if game_state is None:
+        game_state = GameState()
+    world = game_state.world
+    model = _Model(world)
+    start = _start_key(model, game_state)
+
+    dead_ends = 0
+    dead_end: Optional[List[str]] = None
+    if game_state.is_over:
+        won_path: Optional[List[str]] = []
+        order, complete = [start], True
+    else:
+        parents, successors, order, complete = _explore(model, start, max_states)
+        won_path = _path(parents, WON) if WON in parents else None
+        if complete:
+            # Walk the graph backwards from the win to find the states that can still reach it
+            winning = {WON}
+            predecessors: Dict[int, List[int]] = {}
+            for key, next_keys in successors.items():
+                for next_key in next_keys:
+                    predecessors.setdefault(next_key, []).append(key)
+            stack = [WON]
+            while stack:
+                for key in predecessors.get(stack.pop(), ()):
+                    if key not in winning:
+                        winning.add(key)
+                        stack.append(key)
+            stuck = [key for key in order if key not in winning]
+            dead_ends = len(stuck)
+            if stuck:
+                dead_end = _path(parents, stuck[0])
+        else:
+            del parents, successors
+            won_path, order = _progress(model, start)
+
+    room_ids = set()
+    carried_ever = 0
+    revealed_ever = 0
+    for key in order:
+        room_id, carried, _, revealed = model.unpack(key)
+        room_ids.add(room_id)
+        carried_ever |= carried
+        revealed_ever |= revealed
+
+    reachable_item_ids = {world.item_ids[name] for name in game_state.inventory if name in world.item_ids}
+    for room_id in room_ids:
+        reachable_item_ids.update(world.item_ids[name] for name in world.rooms[room_id].items)
+    reachable_item_ids.update(model.items[bit] for bit in bit_ids(carried_ever))
+    reachable_item_ids.update(model.slot_keys[slot][1] for slot in bit_ids(revealed_ever))
+
+    return SolveReport(
+        solvable=won_path is not None,
+        solution=won_path or [],
+        optimal=complete,
+        states=len(order),
+        complete=complete,
+        reachable_rooms=[room.name for room in world.rooms if room.id in room_ids],
+        unreachable_rooms=[room.name for room in world.rooms if room.id not in room_ids],
+        reachable_items=[name for name in world.item_names if world.item_ids[name] in reachable_item_ids],
+        unreachable_items=[name for name in world.item_names if world.item_ids[name] not in reachable_item_ids],
+        dead_ends=dead_ends,
+        dead_end_path=dead_end,
+    )
+
+
+def solve_file(filename: str, max_states: int = 200_000) -> SolveReport:
+    return solve(GameState(load_world(filename)), max_states)
+
+
+def solve_files(filenames: List[str], processes: int = 1, max_states: int = 200_000) -> List[SolveReport]:
+    # Worlds are independent, so several can be checked at once across a process pool
+    if processes <= 1 or len(filenames) <= 1:
+        return [solve_file(filename, max_states) for filename in filenames]
+    with multiprocessing.Pool(min(processes, len(filenames))) as pool:
+        return pool.starmap(solve_file, [(filename, max_states) for filename in filenames])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check that worlds can be won and find the shortest solution.")
+    parser.add_argument("worlds", nargs="*", help="World definition files (default: the manor).")
+    parser.add_argument("--processes", type=int, default=1, help="Solve this many worlds at once.")
+    parser.add_argument("--max-states", type=int, default=200_000)
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary line per world.")
+    args = parser.parse_args()
+
+    filenames = args.worlds or [None]
+    reports = solve_files([f for f in filenames if f is not None], args.processes, args.max_states) \
+        if args.worlds else [solve()]
+    failed = False
+    for filename, report in zip(filenames, reports):
+        name = filename or "manor"
+        status = "solvable" if report.solvable else "NOT SOLVABLE"
+        if not report.complete:
+            status += " (too many states to search exhaustively; solution may not be shortest)"
+        print(f"{name}: {status}, {len(report.solution)} commands, {report.states} states, "
+              f"{report.dead_ends} dead ends")
+        if not args.quiet:
+            if report.solution:
+                print("  solution: " + "; ".join(report.solution))
+            if report.unreachable_rooms:
+                print("  unreachable rooms: " + ", ".join(report.unreachable_rooms))
+            if report.unreachable_items:
+                print("  unreachable items: " + ", ".join(report.unreachable_items))
+            if report.dead_end_path is not None:
+                print("  shortest way to a dead end: " + "; ".join(report.dead_end_path))
+        failed = failed or not report.solvable
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
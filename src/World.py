@@ -0,0 +1,192 @@
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import hashlib
+import json
+import os
+import sys
+
+from ContentPack import ContentPack
+from ItemCatalog import ItemCatalog
+from NameSet import mask_of
+from Rules import RuleIndex, compile_rules, revealed_items
+
+DEFAULT_WORLD_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "manor.json")
+
+# Marks a missing exit in the flat exit table
+NO_EXIT = -1
+
+
+class Room(NamedTuple):
+    id: int
+    name: str
+    # Display name, e.g. "Master Bedroom"
+    title: str
+    # None when the world's text lives in a content pack
+    description: Optional[str]
+    items: Tuple[str, ...]
+    locked: bool
+    required_item: Optional[str]
+
+
+class World:
+    """
+    The static, compiled form of a world definition. One instance is shared by
+    every GameState playing that world, so nothing here may be mutated per session.
+    """
+
+    __slots__ = ("start", "rooms", "room_ids", "directions", "direction_ids",
+                 "exits", "item_names", "item_ids", "rules", "catalog", "_item_sets", "locked_mask", "_renders", "pack",
+                 "routes", "hints", "digest", "synonyms", "resolver")
+
+    def __init__(self, definition: Dict, base_dir: Optional[str] = None) -> None:
+        room_defs: Dict[str, Dict] = definition["rooms"]
+        packed = definition.get("content_pack") is not None
+
+        self.room_ids: Dict[str, int] = {}
+        for name in room_defs:
+            self.room_ids[sys.intern(name)] = len(self.room_ids)
+
+        directions: Dict[str, int] = {}
+        items: Dict[str, int] = {}
+        for name, room in room_defs.items():
+            for direction, target in room.get("exits", {}).items():
+                if target not in self.room_ids:
+                    raise ValueError(f"Room '{name}' has an exit to unknown room '{target}'.")
+                directions.setdefault(sys.intern(direction), len(directions))
+            for item in room.get("items", []):
+                items.setdefault(sys.intern(item), len(items))
+            required = room.get("required_item")
+            if required is not None:
+                items.setdefault(sys.intern(required), len(items))
+        rule_defs = definition.get("rules", [])
+        for item in revealed_items(rule_defs):
+            items.setdefault(sys.intern(item), len(items))
+
+        self.direction_ids: Dict[str, int] = directions
+        self.directions: Tuple[str, ...] = tuple(directions)
+        self.item_ids: Dict[str, int] = items
+        self.item_names: Tuple[str, ...] = tuple(items)
+
+        # Exits are one flat table of room ids, indexed by room_id * len(directions) + direction_id
+        width = len(directions)
+        self.exits = array("i", [NO_EXIT]) * (len(self.room_ids) * width)
+        rooms: List[Room] = []
+        for room_id, (name, room) in enumerate(room_defs.items()):
+            for direction, target in room.get("exits", {}).items():
+                self.exits[room_id * width + directions[direction]] = self.room_ids[target]
+            required = room.get("required_item")
+            rooms.append(Room(
+                id=room_id,
+                name=sys.intern(name),
+                title=name.replace("_", " ").title(),
+                description=None if packed else room["description"],
+                items=tuple(sys.intern(item) for item in room.get("items", [])),
+                locked=bool(room.get("locked", False)),
+                required_item=sys.intern(required) if required is not None else None,
+            ))
+        self.rooms: Tuple[Room, ...] = tuple(rooms)
+        # Bit n is set when room n starts locked
+        self.locked_mask: int = mask_of(room.id for room in rooms if room.locked)
+
+        start = definition.get("start")
+        if start not in self.room_ids:
+            raise ValueError(f"Start location '{start}' is not a room in this world.")
+        self.start: str = sys.intern(start)
+        self.rules: RuleIndex = compile_rules(rule_defs, self.room_ids, self.item_ids)
+        # Other words players may use for items, e.g. "lamp" for the lantern
+        self.synonyms: Dict[str, Tuple[str, ...]] = {}
+        for item, words in definition.get("synonyms", {}).items():
+            if item not in self.item_ids:
+                raise ValueError(f"Synonyms are given for unknown item '{item}'.")
+            self.synonyms[sys.intern(item)] = tuple(words)
+
+        # Item text is a content file beside the world definition, read on first use
+        item_text = definition.get("item_text")
+        if item_text is not None and base_dir is not None:
+            item_text = os.path.join(base_dir, item_text)
+        self.catalog = ItemCatalog(item_text)
+        # With a content pack the text stays in a shared memory-mapped file, and the pack is also the catalog
+        self.pack: Optional[ContentPack] = None
+        if packed:
+            pack_file = definition["content_pack"]
+            if base_dir is not None:
+                pack_file = os.path.join(base_dir, pack_file)
+            self.pack = ContentPack(pack_file, self.item_ids)
+            self.pack.check(self.room_ids, self.item_names)
+            self.catalog = self.pack
+        self._item_sets: Dict[int, frozenset] = {}
+        self._renders: Dict[int, str] = {}
+        # Route tables for `go`, shared by every session; built on the first trip (see Routing.py)
+        self.routes = None
+        # The hint checklist, built on the first hint (see Hints.py)
+        self.hints = None
+        # The name index for typo-tolerant commands, built when first needed (see Resolver.py)
+        self.resolver = None
+        # SHA-1 of the definition file, set by read_world; keys caches derived from the world
+        self.digest: Optional[str] = None
+
+    def room(self, name: str) -> Room:
+        return self.rooms[self.room_ids[name]]
+
+    def room_item_set(self, room_id: int) -> frozenset:
+        # Built per room on first use; a cache of immutable data, so safe to share
+        item_set = self._item_sets.get(room_id)
+        if item_set is None:
+            item_set = self._item_sets[room_id] = frozenset(self.rooms[room_id].items)
+        return item_set
+
+    def description(self, room_id: int) -> str:
+        if self.pack is not None:
+            return self.pack.room_description(room_id)
+        return self.rooms[room_id].description
+
+    def render_room(self, room_id: int) -> str:
+        # A room as it looks before any session has changed it; shared by every session.
+        # Packed worlds are not cached here, as that would keep every room's text resident.
+        if self.pack is not None:
+            return render_location(self.pack.room_description(room_id), self.rooms[room_id].items)
+        text = self._renders.get(room_id)
+        if text is None:
+            room = self.rooms[room_id]
+            text = self._renders[room_id] = render_location(room.description, room.items)
+        return text
+
+    def exit_target(self, room_id: int, direction: str) -> Optional[int]:
+        direction_id = self.direction_ids.get(direction)
+        if direction_id is None:
+            return None
+        target = self.exits[room_id * len(self.directions) + direction_id]
+        return None if target == NO_EXIT else target
+
+    def exits_of(self, room_id: int) -> Dict[str, str]:
+        width = len(self.directions)
+        row = self.exits[room_id * width:(room_id + 1) * width]
+        return {self.directions[d]: self.rooms[t].name for d, t in enumerate(row) if t != NO_EXIT}
+
+
+def render_location(description: str, items: Sequence[str]) -> str:
+    if items:
+        return description + "\n\nYou see: " + ", ".join(items)
+    return description
+
+
+_loaded_worlds: Dict[str, World] = {}
+
+
+def read_world(filename: str = DEFAULT_WORLD_FILE) -> World:
+    # A freshly compiled world of its own; most callers want load_world's shared one
+    filename = os.path.abspath(filename)
+    with open(filename, "rb") as f:
+        data = f.read()
+    world = World(json.loads(data), base_dir=os.path.dirname(filename))
+    world.digest = hashlib.sha1(data).hexdigest()
+    return world
+
+
+def load_world(filename: str = DEFAULT_WORLD_FILE) -> World:
+    # Worlds are compiled once per process and shared by every session
+    key = os.path.abspath(filename)
+    world = _loaded_worlds.get(key)
+    if world is None:
+        world = _loaded_worlds[key] = read_world(key)
+    return world
@@ -0,0 +1,248 @@
+"""
+Seeded, deterministic generator of manor-like worlds for scale and stress testing.
+
+Rooms are laid out on a grid of floors and grown outwards as a tree from the start room,
+then a share of neighbouring rooms are joined to form loops. Exits always come in
+matching pairs (north/south, east/west, up/down). Some rooms are locked: either they
+need a key, or a tool must be used next door to open them. Every key or tool lies in a
+room generated before the one it opens, and a room's path back to the start only passes
+through earlier rooms, so every world is winnable by construction. The game is won by
+bringing the case file from the last room back to the start and using it there.
+
+    python WorldGenerator.py 100000 --seed 7 --out big_manor.json
+
+The same arguments always produce the same world, in the schema World consumes.
+"""
+from typing import Dict, List, NamedTuple, Tuple
+import argparse
+import json
+import math
+import os
+import random
+
+from ContentPack import pack_world
+from World import World
+
+ROOM_KINDS = [
+    "hall", "library", "gallery", "parlour", "pantry", "scullery", "study", "chapel",
+    "conservatory", "nursery", "armoury", "ballroom", "billiard_room", "boudoir", "cloakroom",
+    "corridor", "larder", "laundry", "music_room", "observatory", "office", "smoking_room",
+    "solar", "stillroom", "storeroom", "trophy_room", "vestibule", "wine_cellar", "workshop",
+]
+ADJECTIVES = [
+    "brass", "silver", "cracked", "dusty", "faded", "gilded", "heavy", "iron", "ivory",
+    "lacquered", "oak", "pewter", "rusty", "small", "stained", "tarnished", "velvet", "worn",
+]
+NOUNS = [
+    "candlestick", "clock", "compass", "decanter", "diary", "figurine", "glove", "hatpin",
+    "inkwell", "letter", "locket", "magnifier", "medal", "music_box", "pipe", "quill",
+    "snuffbox", "spectacles", "teacup", "thimble", "ticket", "watch",
+]
+TOOLS = ["crowbar", "chisel", "hacksaw", "poker", "screwdriver"]
+WORDS = [
+    "a", "the", "old", "dark", "faint", "smell", "of", "dust", "and", "wax", "hangs", "in",
+    "air", "shadows", "gather", "under", "portraits", "floorboards", "creak", "curtains",
+    "are", "drawn", "against", "grey", "light", "cold", "draught", "stirs", "ashes",
+    "grate", "someone", "left", "here", "recently", "clock", "ticks", "somewhere", "nearby",
+    "wallpaper", "peels", "from", "damp", "walls", "rug", "is", "scuffed", "by", "boots",
+]
+
+# (direction, opposite, dx, dy, dz)
+DIRECTIONS = [
+    ("north", "south", 0, 1, 0), ("south", "north", 0, -1, 0),
+    ("east", "west", 1, 0, 0), ("west", "east", -1, 0, 0),
+    ("up", "down", 0, 0, 1), ("down", "up", 0, 0, -1),
+]
+
+CASE_FILE = "case_file"
+
+
+class GeneratedWorld(NamedTuple):
+    definition: Dict
+    # Item descriptions, kept apart from the definition like manor_items.json
+    item_texts: Dict[str, str]
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    # Knuth's method; means here are small
+    limit = math.exp(-mean)
+    count, product = 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _text(rng: random.Random, words: int) -> str:
+    if words <= 0:
+        return ""
+    text = " ".join(rng.choices(WORDS, k=words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _layout(rng: random.Random, rooms: int, floors: int, branching: float):
+    """
+    Grows a tree of rooms on a grid. Returns each room's parent in the tree, its exits as
+    direction -> room index, its grid position, and the position -> room map. New rooms
+    usually attach to one of the last few rooms, which gives corridors, and with
+    probability `branching` to any room that still has a free side.
+    """
+    cells: Dict[Tuple[int, int, int], int] = {(0, 0, 0): 0}
+    positions = [(0, 0, 0)]
+    parents = [-1]
+    exits: List[Dict[str, int]] = [{}]
+    open_rooms = [0]
+    while len(positions) < rooms:
+        if rng.random() < branching:
+            slot = rng.randrange(len(open_rooms))
+        else:
+            slot = max(len(open_rooms) - 1 - rng.randrange(4), 0)
+        parent = open_rooms[slot]
+        x, y, z = positions[parent]
+        # Stairs are rarer than doors
+        sides = DIRECTIONS if rng.random() < 0.1 else DIRECTIONS[:4]
+        free = [(direction, opposite, (x + dx, y + dy, z + dz)) for direction, opposite, dx, dy, dz in sides
+                if 0 <= z + dz < floors and (x + dx, y + dy, z + dz) not in cells]
+        if not free:
+            if all((x + dx, y + dy, z + dz) in cells or not 0 <= z + dz < floors
+                   for _, _, dx, dy, dz in DIRECTIONS):
+                # Boxed in on every side; no longer a candidate
+                open_rooms[slot] = open_rooms[-1]
+                open_rooms.pop()
+            continue
+        direction, opposite, cell = free[rng.randrange(len(free))]
+        room = len(positions)
+        cells[cell] = room
+        positions.append(cell)
+        parents.append(parent)
+        exits.append({})
+        exits[parent][direction] = room
+        exits[room][opposite] = parent
+        open_rooms.append(room)
+    return parents, exits, positions, cells
+
+
+def _add_loops(rng: random.Random, exits: List[Dict[str, int]], positions: List[Tuple[int, int, int]],
+               cells: Dict[Tuple[int, int, int], int], loop_fraction: float) -> None:
+    # Open a door between some rooms and a neighbour they do not yet connect to
+    for room, (x, y, z) in enumerate(positions):
+        if rng.random() >= loop_fraction:
+            continue
+        for direction, opposite, dx, dy, dz in DIRECTIONS[:4]:
+            other = cells.get((x + dx, y + dy, z + dz))
+            if other is not None and direction not in exits[room] and opposite not in exits[other]:
+                exits[room][direction] = other
+                exits[other][opposite] = room
+                break
+
+
+def _title(name: str) -> str:
+    return name.rsplit("_", 1)[0].replace("_", " ").title()
+
+
+def generate_world(rooms: int, seed: int = 0, items_per_room: float = 1.5, description_words: int = 24,
+                   item_words: int = 12, lock_fraction: float = 0.08, tool_fraction: float = 0.3,
+                   key_distance: int = 64, loop_fraction: float = 0.15, floors: int = 3,
+                   branching: float = 0.3, flavour_rules: float = 0.2) -> GeneratedWorld:
+    """
+    Generates a winnable world of `rooms` rooms. A locked room's key or tool is placed
+    at most `key_distance` rooms earlier in generation order; `flavour_rules` is the share
+    of ordinary items given a "use" rule of their own, to exercise the rule index.
+    """
+    if rooms < 1:
+        raise ValueError("A world needs at least one room.")
+    rng = random.Random(seed)
+    parents, exits, positions, cells = _layout(rng, rooms, floors, branching)
+    _add_loops(rng, exits, positions, cells, loop_fraction)
+
+    names = ["entrance_hall_0"] + [f"{rng.choice(ROOM_KINDS)}_{index}" for index in range(1, rooms)]
+    room_defs: Dict[str, Dict] = {}
+    for index, name in enumerate(names):
+        room_defs[name] = {
+            "description": f"You are in the {_title(name)}. {_text(rng, description_words)}".rstrip(),
+            "exits": {direction: names[target] for direction, target in exits[index].items()},
+            "items": [],
+        }
+
+    rules: List[Dict] = []
+    item_texts: Dict[str, str] = {}
+    for index, name in enumerate(names):
+        for _ in range(_poisson(rng, items_per_room)):
+            adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+            item = f"{adjective}_{noun}_{len(item_texts)}"
+            room_defs[name]["items"].append(item)
+            item_texts[item] = f"A {adjective} {noun.replace('_', ' ')}. {_text(rng, item_words)}".rstrip()
+            if rng.random() < flavour_rules:
+                rules.append({"item": item, "location": name, "success": False,
+                              "message": "You turn the {item} over in your hands. It reminds you of this room."})
+
+    # Gates: each opener lies in an earlier room, so it can be reached without passing this gate
+    for index in range(1, rooms):
+        if rng.random() >= lock_fraction:
+            continue
+        name = names[index]
+        holder = names[rng.randrange(max(0, index - key_distance), index)]
+        room_defs[name]["locked"] = True
+        if rng.random() < tool_fraction:
+            tool = f"{rng.choice(TOOLS)}_{index}"
+            item_texts[tool] = f"A sturdy {_title(tool).lower()}, good for forcing things."
+            rules.append({"item": tool, "location": names[parents[index]], "requires": {"locked": [name]},
+                          "effects": {"unlock": [name]}, "success": True,
+                          "message": f"You force the door to the {_title(name)} open with the {{item}}."})
+        else:
+            tool = f"{rng.choice(ADJECTIVES)}_key_{index}"
+            item_texts[tool] = f"A {_title(tool).lower()} with a paper tag: '{_title(name)}'."
+            room_defs[name]["required_item"] = tool
+        room_defs[holder]["items"].append(tool)
+
+    start, last = names[0], names[-1]
+    room_defs[last]["items"].append(CASE_FILE)
+    item_texts[CASE_FILE] = "A thick case file. Laid out in the right place, it names the murderer."
+    rules.append({"item": CASE_FILE, "location": start, "effects": {"end_game": True}, "success": True,
+                  "message": "You lay out the evidence in the entrance hall. The mystery is solved!"})
+    rules.append({"item": CASE_FILE, "message": "This is not the place to lay out the case."})
+    return GeneratedWorld({"start": start, "rooms": room_defs, "rules": rules}, item_texts)
+
+
+def build_world(rooms: int, seed: int = 0, **options) -> World:
+    # A compiled generated world, for benchmarks and tests
+    return World(generate_world(rooms, seed, **options).definition)
+
+
+def write_world(generated: GeneratedWorld, filename: str, pack: bool = False) -> None:
+    # Writes the definition and, beside it, its item descriptions or a content pack holding all its text
+    base, _ = os.path.splitext(filename)
+    if pack:
+        definition = pack_world(generated.definition, generated.item_texts, base + ".pack")
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(definition, f, separators=(",", ":"))
+        return
+    item_file = base + "_items.json"
+    definition = dict(generated.definition, item_text=os.path.basename(item_file))
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(definition, f, separators=(",", ":"))
+    with open(item_file, "w", encoding="utf-8") as f:
+        json.dump(generated.item_texts, f, separators=(",", ":"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a winnable manor of any size.")
+    parser.add_argument("rooms", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--items-per-room", type=float, default=1.5)
+    parser.add_argument("--description-words", type=int, default=24)
+    parser.add_argument("--item-words", type=int, default=12)
+    parser.add_argument("--lock-fraction", type=float, default=0.08)
+    parser.add_argument("--floors", type=int, default=3)
+    parser.add_argument("--out", help="Output file (default: generated_<rooms>.json).")
+    parser.add_argument("--pack", action="store_true", help="Put the text in a memory-mapped content pack.")
+    args = parser.parse_args()
+
+    generated = generate_world(args.rooms, args.seed, items_per_room=args.items_per_room,
+                               description_words=args.description_words, item_words=args.item_words,
+                               lock_fraction=args.lock_fraction, floors=args.floors)
+    write_world(generated, args.out or f"generated_{args.rooms}.json", pack=args.pack)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,783 @@
+"""
+Standalone micro-benchmarks for the game engine.
+
+Run from the src directory:
+
+    python benchmarks.py              # every benchmark
+    python benchmarks.py construction # only the named ones
+    python benchmarks.py --json results.json
+    python benchmarks.py --baseline baselines/default.json --threshold 25
+
+The hot-path benchmarks run against the stock manor and a generated world of --rooms
+rooms. With --baseline, every timing or memory metric is compared with the stored run
+and the exit status is 1 if any regressed by more than --threshold percent. Baselines
+are only meaningful on the machine that recorded them; refresh one with --save-baseline.
+"""
+from typing import Callable, Dict, List, Optional
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import Analytics
+from Commands import COMMANDS, tokenize
+from GameLoop import process_command
+from GameState import GameState
+from History import History
+import Hints
+import Metrics
+from NameSet import NameSet, mask_of
+from Replay import Session, replay
+import Resolver
+from SaveJournal import SaveJournal
+from SaveSlots import SaveSlots
+from SessionManager import SessionManager
+from Routing import Router
+from Solver import solve
+from Snapshot import decode_binary, encode_binary
+from World import World, load_world
+from WorldGenerator import build_world, generate_world, write_world
+
+# A full winning playthrough of the manor, padded with the read-only commands real players type
+PLAYTHROUGH = [
+    "look", "help", "take matches", "examine matches", "move east", "look",
+    "move east", "take old_key", "inventory", "move west", "move south", "look",
+    "take carving_knife", "move south", "take lantern", "examine lantern", "move north",
+    "move north", "move east", "move north", "look", "take incriminating_ledger",
+    "move south", "move west", "inventory", "move north", "move west", "look",
+    "use incriminating_ledger",
+]
+
+BENCHMARKS: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+# Size of the generated world the hot paths are also measured on; set by --rooms
+LARGE_ROOMS = 20000
+
+
+def benchmark(func: Callable[[], Dict[str, float]]) -> Callable[[], Dict[str, float]]:
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def per_call_us(func: Callable[[], object], number: int) -> float:
+    # Best of three runs, in microseconds per call
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def bytes_per_object(factory: Callable[[], object], count: int) -> float:
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        objects = [factory() for _ in range(count)]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def peak_bytes_per_call(func: Callable[[], object]) -> float:
+    # Transient memory a single call allocates, measured as the traced peak above the baseline
+    func()
+    tracemalloc.start()
+    try:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - current
+
+
+@benchmark
+def construction() -> Dict[str, float]:
+    load_world()  # The shared world is compiled once per process, outside the measurement
+    return {
+        "construct_us": per_call_us(GameState, 20000),
+        "bytes_per_session": bytes_per_object(GameState, 10000),
+    }
+
+
+def _worlds() -> Dict[str, World]:
+    return {"manor": load_world(), "generated": build_world(LARGE_ROOMS, seed=1)}
+
+
+def _scenario(world: World) -> Dict[str, str]:
+    # An open room holding an item, with an open neighbour that leads straight back
+    for room in world.rooms:
+        if room.locked or not room.items:
+            continue
+        for direction, neighbour in world.exits_of(room.id).items():
+            target = world.room(neighbour)
+            back = [d for d, name in world.exits_of(target.id).items() if name == room.name]
+            if not target.locked and back:
+                return {"location": room.name, "there": direction, "back": back[0], "item": room.items[0]}
+    raise ValueError("The world has no open room with an item and a way back.")
+
+
+def _session(world: World, scenario: Dict[str, str]) -> GameState:
+    game_state = GameState(world)
+    game_state.current_location = scenario["location"]
+    return game_state
+
+
+def _walk(scenario: Dict[str, str]) -> List[str]:
+    return [
+        "look", f"take {scenario['item']}", f"move {scenario['there']}", "look",
+        f"move {scenario['back']}", "inventory", f"examine {scenario['item']}",
+    ]
+
+
+def per_session_us(sessions: List[GameState], action: Callable[[GameState], object]) -> float:
+    # For actions that change the state: each runs once on its own fresh session
+    start = time.perf_counter()
+    for game_state in sessions:
+        action(game_state)
+    return (time.perf_counter() - start) / len(sessions) * 1e6
+
+
+@benchmark
+def verbs() -> Dict[str, float]:
+    # process_command throughput per verb; each command is paired with its inverse where it changes state
+    results: Dict[str, float] = {}
+    for label, world in _worlds().items():
+        scenario = _scenario(world)
+        game_state = _session(world, scenario)
+        item = scenario["item"]
+        holder = _session(world, scenario)
+        holder.pick_up_item(item)
+        corpus = {
+            "look": lambda: process_command("look", game_state),
+            "move": lambda: (process_command(f"move {scenario['there']}", game_state),
+                             process_command(f"move {scenario['back']}", game_state)),
+            "use": lambda: process_command(f"use {item}", holder),
+            "examine": lambda: process_command(f"examine {item}", game_state),
+            "inventory": lambda: process_command("inventory", holder),
+            "help": lambda: process_command("help", game_state),
+            "unknown": lambda: process_command("xyzzy", game_state),
+        }
+        for verb, func in corpus.items():
+            per_command = per_call_us(func, 5000) / (2 if verb == "move" else 1)
+            results[f"{label}_{verb}_per_sec"] = 1e6 / per_command
+        sessions = [_session(world, scenario) for _ in range(5000)]
+        results[f"{label}_take_per_sec"] = 1e6 / per_session_us(sessions, lambda s: process_command(f"take {item}", s))
+    return results
+
+
+@benchmark
+def engine() -> Dict[str, float]:
+    # The GameState methods behind the verbs, without parsing and dispatch
+    results: Dict[str, float] = {}
+    for label, world in _worlds().items():
+        scenario = _scenario(world)
+        game_state = _session(world, scenario)
+        item = scenario["item"]
+        results[f"{label}_construct_us"] = per_call_us(lambda: GameState(world), 20000)
+        results[f"{label}_describe_us"] = per_call_us(game_state.describe_current_location, 20000)
+        results[f"{label}_move_us"] = per_call_us(
+            lambda: (game_state.move_player(scenario["there"]), game_state.move_player(scenario["back"])), 10000) / 2
+        sessions = [_session(world, scenario) for _ in range(10000)]
+        results[f"{label}_pick_up_us"] = per_session_us(sessions, lambda s: s.pick_up_item(item))
+        results[f"{label}_use_us"] = per_call_us(lambda: sessions[0].use_item(item), 20000)
+    return results
+
+
+@benchmark
+def saves() -> Dict[str, float]:
+    # save_to_file / load_from_file latency after a short walk, in both encodings
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for label, world in _worlds().items():
+            scenario = _scenario(world)
+            game_state = _session(world, scenario)
+            for command in _walk(scenario):
+                process_command(command, game_state)
+            restored = GameState(world)
+            for encoding, binary in (("json", False), ("binary", True)):
+                filename = os.path.join(directory, f"{label}.{encoding}")
+                results[f"{label}_save_{encoding}_us"] = per_call_us(
+                    lambda: game_state.save_to_file(filename, binary=binary), 500)
+                results[f"{label}_load_{encoding}_us"] = per_call_us(lambda: restored.load_from_file(filename), 500)
+                results[f"{label}_{encoding}_bytes"] = os.path.getsize(filename)
+    return results
+
+
+@benchmark
+def memory() -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for label, world in _worlds().items():
+        scenario = _scenario(world)
+        walk = _walk(scenario)
+
+        def played() -> GameState:
+            game_state = _session(world, scenario)
+            for command in walk:
+                process_command(command, game_state)
+            return game_state
+
+        results[f"{label}_fresh_session_bytes"] = bytes_per_object(lambda: GameState(world), 5000)
+        results[f"{label}_played_session_bytes"] = bytes_per_object(played, 2000)
+    return results
+
+
+@benchmark
+def persistence() -> Dict[str, float]:
+    # Plays the same session with a full save rewrite per command, then with the journal
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        save_file = os.path.join(directory, "savegame.json")
+        game_state = GameState()
+        written = 0
+        start = time.perf_counter()
+        for command in PLAYTHROUGH:
+            process_command(command, game_state)
+            game_state.save_to_file(save_file)
+            written += os.path.getsize(save_file)
+        results["rewrite_us_per_command"] = (time.perf_counter() - start) / len(PLAYTHROUGH) * 1e6
+        results["rewrite_bytes_per_command"] = written / len(PLAYTHROUGH)
+
+        journal = SaveJournal(os.path.join(directory, "journaled.json"))
+        game_state = GameState()
+        start = time.perf_counter()
+        for command in PLAYTHROUGH:
+            process_command(command, game_state, journal)
+            journal.record(command, game_state)
+        journal.close()
+        results["journal_us_per_command"] = (time.perf_counter() - start) / len(PLAYTHROUGH) * 1e6
+        results["journal_bytes_per_command"] = journal.bytes_written / len(PLAYTHROUGH)
+    return results
+
+
+@benchmark
+def snapshots() -> Dict[str, float]:
+    game_state = GameState()
+    for command in PLAYTHROUGH[:-1]:
+        process_command(command, game_state)
+    world = game_state.world
+    state = game_state.save_state()
+    text = json.dumps(state, separators=(",", ":"))
+    data = encode_binary(state, world)
+    restored = GameState()
+    return {
+        "save_state_us": per_call_us(game_state.save_state, 20000),
+        "load_state_us": per_call_us(lambda: restored.load_state(state), 20000),
+        "json_encode_us": per_call_us(lambda: json.dumps(state, separators=(",", ":")), 20000),
+        "json_decode_us": per_call_us(lambda: json.loads(text), 20000),
+        "binary_encode_us": per_call_us(lambda: encode_binary(state, world), 20000),
+        "binary_decode_us": per_call_us(lambda: decode_binary(data, world), 20000),
+        "json_bytes": len(text),
+        "binary_bytes": len(data),
+    }
+
+
+# Commands that leave the state alone, so they can be replayed against one session
+READ_ONLY_CORPUS = [
+    "look", "inventory", "help", "examine matches", "x cigarette_case", "use rope",
+    "take nothing", "move nowhere", "lookout", "inv", "xyzzy", "move",
+]
+
+
+@benchmark
+def dispatch() -> Dict[str, float]:
+    game_state = GameState()
+
+    def resolve_corpus() -> None:
+        for command in READ_ONLY_CORPUS:
+            COMMANDS.resolve(tokenize(command)[0])
+
+    def dispatch_corpus() -> None:
+        for command in READ_ONLY_CORPUS:
+            process_command(command, game_state)
+
+    def playthrough() -> None:
+        session = GameState()
+        for command in PLAYTHROUGH:
+            process_command(command, session)
+
+    return {
+        "resolve_per_sec": 1e6 / per_call_us(resolve_corpus, 5000) * len(READ_ONLY_CORPUS),
+        "read_only_per_sec": 1e6 / per_call_us(dispatch_corpus, 2000) * len(READ_ONLY_CORPUS),
+        "playthrough_per_sec": 1e6 / per_call_us(playthrough, 1000) * len(PLAYTHROUGH),
+    }
+
+
+@benchmark
+def rendering() -> Dict[str, float]:
+    # Location text per look/move, cached against rebuilt on every call as it used to be
+    world = load_world()
+    game_state = GameState()
+    changed = GameState()
+    changed.pick_up_item("matches")
+    room = world.room(game_state.current_location)
+
+    def uncached() -> str:
+        items = changed.items_at(room.name)
+        title = room.name.replace("_", " ").title()
+        return title + (room.description + "\n\nYou see: " + ", ".join(items) if items else room.description)
+
+    # Hit rate over many sessions playing through, counting the renders that missed every cache
+    misses = 0
+    render_changed = GameState._render_changed
+
+    def counting(self, room_id, items):
+        nonlocal misses
+        if self._rendered is None or room_id not in self._rendered:
+            misses += 1
+        return render_changed(self, room_id, items)
+
+    world._renders.clear()
+    describes = 0
+    GameState._render_changed = counting
+    try:
+        for _ in range(1000):
+            session = GameState()
+            for command in PLAYTHROUGH:
+                verb = COMMANDS.dispatch(command, session)
+                describes += verb.verb in ("look", "move") and verb.success
+    finally:
+        GameState._render_changed = render_changed
+    misses += len(world._renders)
+    return {
+        "uncached_describe_us": per_call_us(uncached, 50000),
+        "shared_describe_us": per_call_us(game_state.describe_current_location, 50000),
+        "session_describe_us": per_call_us(changed.describe_current_location, 50000),
+        "hit_rate": (describes - misses) / describes,
+    }
+
+
+# Run in a fresh interpreter so each world's resident memory is measured on its own
+_RSS_SCRIPT = """
+import resource, sys, tracemalloc
+from GameState import GameState
+from World import load_world
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS")) / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+before = rss_mb()
+tracemalloc.start()
+world = load_world(sys.argv[1])
+retained = tracemalloc.get_traced_memory()[0] / 2**20
+tracemalloc.stop()
+loaded = rss_mb()
+game_state = GameState(world)
+for room in world.rooms[:2000]:
+    game_state.current_location = room.name
+    game_state.describe_current_location()
+print(retained, loaded - before, rss_mb() - before)
+"""
+
+
+@benchmark
+def content_pack() -> Dict[str, float]:
+    # Resident memory for a generated world with inline text against the same world packed
+    results: Dict[str, float] = {}
+    generated = generate_world(LARGE_ROOMS, seed=1, description_words=64, item_words=32)
+    with tempfile.TemporaryDirectory() as directory:
+        for label, pack in (("inline", False), ("packed", True)):
+            filename = os.path.join(directory, f"{label}.json")
+            write_world(generated, filename, pack=pack)
+            output = subprocess.run([sys.executable, "-c", _RSS_SCRIPT, filename], capture_output=True, text=True,
+                                    check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            retained, loaded, looked = (float(value) for value in output.split())
+            results[f"{label}_world_heap_mb"] = retained
+            results[f"{label}_world_rss_mb"] = loaded
+            results[f"{label}_after_2000_looks_rss_mb"] = looked
+        packed = GameState(load_world(os.path.join(directory, "packed.json")))
+        inline = GameState(load_world(os.path.join(directory, "inline.json")))
+        results["inline_describe_us"] = per_call_us(inline.describe_current_location, 20000)
+        results["packed_describe_us"] = per_call_us(packed.describe_current_location, 20000)
+        packed.world.pack.close()
+    return results
+
+
+@benchmark
+def instrumentation() -> Dict[str, float]:
+    # Dispatch cost with metrics never enabled, enabled, and enabled then disabled again
+    game_state = GameState()
+
+    def dispatch_corpus() -> None:
+        for command in READ_ONLY_CORPUS:
+            process_command(command, game_state)
+
+    results = {"off_us_per_command": per_call_us(dispatch_corpus, 2000) / len(READ_ONLY_CORPUS)}
+    Metrics.enable()
+    try:
+        results["on_us_per_command"] = per_call_us(dispatch_corpus, 2000) / len(READ_ONLY_CORPUS)
+    finally:
+        Metrics.disable()
+    results["after_disable_us_per_command"] = per_call_us(dispatch_corpus, 2000) / len(READ_ONLY_CORPUS)
+    return results
+
+
+@benchmark
+def use_item() -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    manor = GameState()
+    manor.current_location = "master_bedroom"
+    manor.inventory = ["old_key", "rope"]
+    results["manor_use_us"] = per_call_us(lambda: manor.use_item("old_key"), 50000)
+    results["manor_fallback_us"] = per_call_us(lambda: manor.use_item("rope"), 50000)
+    for items in (100, 10000):
+        world = build_world(items // 10, seed=1, items_per_room=10, flavour_rules=1.0)
+        game_state = GameState(world)
+        here, elsewhere = world.rooms[0].items[0], world.rooms[-1].items[0]
+        game_state.inventory = [here, elsewhere]
+        results[f"use_{items}_items_us"] = per_call_us(lambda: game_state.use_item(here), 50000)
+        results[f"fallback_{items}_items_us"] = per_call_us(lambda: game_state.use_item(elsewhere), 50000)
+    return results
+
+
+@benchmark
+def bitsets() -> Dict[str, float]:
+    # Membership and multi-item requirements with thousands of items carried, list against bitset
+    world = build_world(500, seed=1, items_per_room=10)
+    carried = list(world.item_names[::2])
+    inventory = NameSet(world.item_ids, carried)
+    needed = world.item_names[:100:2]
+    needed_mask = mask_of(world.item_ids[name] for name in needed)
+    missing = world.item_names[-1]
+    return {
+        "list_contains_us": per_call_us(lambda: missing in carried, 2000),
+        "bitset_contains_us": per_call_us(lambda: missing in inventory, 200000),
+        "list_requires_50_us": per_call_us(lambda: all(name in carried for name in needed), 200),
+        "bitset_requires_50_us": per_call_us(lambda: inventory.has_all(needed_mask), 200000),
+        "bitset_bytes": float(sys.getsizeof(inventory.mask)),
+    }
+
+
+@benchmark
+def solver() -> Dict[str, float]:
+    results = {"manor_solve_ms": per_call_us(solve, 5) / 1000, "manor_states": float(solve().states)}
+    for rooms in (300, 3000):
+        game_state = GameState(build_world(rooms, seed=1))
+        report = solve(game_state)
+        results[f"generated_{rooms}_solve_ms"] = per_call_us(lambda: solve(game_state), 1) / 1000
+        results[f"generated_{rooms}_states"] = float(report.states)
+    return results
+
+
+@benchmark
+def examine() -> Dict[str, float]:
+    game_state = GameState()
+    game_state.inventory = ["old_key"]
+
+    def examine_three() -> None:
+        game_state.examine_item("matches")
+        game_state.examine_item("old_key")
+        game_state.examine_item("lantern")
+
+    return {
+        "examine_per_sec": 3e6 / per_call_us(examine_three, 20000),
+        "examine_peak_bytes": peak_bytes_per_call(lambda: game_state.examine_item("matches")),
+    }
+
+
+@benchmark
+def hibernation() -> Dict[str, float]:
+    # Players mostly revisit a hot set; the manager keeps 1 in 10 sessions resident
+    import random
+
+    rng = random.Random(0)
+    players = [f"player-{number}" for number in range(5000)]
+    hot = players[:400]
+    commands = ["look", "move east", "move west", "inventory", "take matches"]
+    with tempfile.TemporaryDirectory() as directory:
+        sessions = SessionManager(directory, max_resident=500, max_idle=None)
+        for player in players:
+            sessions.run(player, "move east")
+        hits, misses = sessions.hits, sessions.misses
+        start = time.perf_counter()
+        count = 20000
+        for _ in range(count):
+            player = rng.choice(hot) if rng.random() < 0.8 else rng.choice(players)
+            sessions.run(player, rng.choice(commands))
+        elapsed = time.perf_counter() - start
+        stats = sessions.stats()
+        sessions.close()
+    return {
+        "command_us": elapsed / count * 1e6,
+        "hit_rate": (sessions.hits - hits) / (sessions.hits - hits + sessions.misses - misses),
+        "rehydration_p50_us": stats["rehydration_p50_us"],
+        "rehydration_p99_us": stats["rehydration_p99_us"],
+        "resident": stats["resident"],
+    }
+
+
+@benchmark
+def history() -> Dict[str, float]:
+    # A 10k-turn session on the manor that keeps every turn, walking and picking things up
+    turns = 10000
+    loop = ["move east", "move east", "take old_key", "move west", "move south", "take carving_knife",
+            "move north", "move west", "take matches", "look"]
+    commands = [loop[turn % len(loop)] for turn in range(turns)]
+    game_state = GameState()
+    game_state.history = History(game_state, retain=turns)
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for command in commands:
+            COMMANDS.dispatch(command, game_state)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    retained = game_state.history.undoable
+
+    rewind_start = time.perf_counter()
+    game_state.history.rewind(0)
+    rewind_ms = (time.perf_counter() - rewind_start) * 1000
+
+    def pair(keep_history: bool) -> Callable[[], None]:
+        session = GameState()
+        session.keep_history = keep_history
+
+        def move_and_back() -> None:
+            COMMANDS.dispatch("move east", session)
+            COMMANDS.dispatch("move west", session)
+        return move_and_back
+
+    return {
+        "bytes_per_turn": (after - before) / retained,
+        "retained_turns": retained,
+        "rewind_10k_ms": rewind_ms,
+        "dispatch_us": per_call_us(pair(True), 20000) / 2,
+        "dispatch_without_history_us": per_call_us(pair(False), 20000) / 2,
+    }
+
+
+@benchmark
+def routing() -> Dict[str, float]:
+    # `go` across the generated world: the lazy route tables, and trips once they exist
+    world = build_world(LARGE_ROOMS, seed=1)
+    home = world.room_ids[world.start]
+
+    start = time.perf_counter()
+    router = world.routes = Router(world)
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    distance = router.distances(home, 0)
+    table_ms = (time.perf_counter() - start) * 1000
+    far = world.rooms[max(range(len(distance)), key=distance.__getitem__)]
+    # A locked door on the edge of the open part of the world, so opening it changes routes
+    locked = next(room.id for room in world.rooms if room.locked
+                  and any(distance[world.room_ids[name]] >= 0 for name in world.exits_of(room.id).values()))
+    start = time.perf_counter()
+    router.distances(home, 1 << locked)
+    flip_ms = (time.perf_counter() - start) * 1000
+
+    game_state = GameState(world)
+    game_state.keep_history = False
+    game_state.visited_locations = [world.start, far.name]
+    COMMANDS.dispatch(f"go {far.name}", game_state)
+    route_length = len(router.route(home, far.id, 0))
+
+    def round_trip() -> None:
+        COMMANDS.dispatch(f"go {far.name}", game_state)
+        COMMANDS.dispatch(f"go {world.start}", game_state)
+
+    return {
+        "router_build_ms": build_ms,
+        "first_table_ms": table_ms,
+        "lock_flip_ms": flip_ms,
+        "route_moves": route_length,
+        "go_us": per_call_us(round_trip, 200) / 2,
+    }
+
+
+@benchmark
+def hints() -> Dict[str, float]:
+    results: Dict[str, float] = {}
+    for label, world in _worlds().items():
+        world.hints = None
+        start = time.perf_counter()
+        Hints.hint_table(world)
+        results[f"{label}_checklist_ms"] = (time.perf_counter() - start) * 1000
+        game_state = GameState(world)
+        Hints.hint(game_state)
+        results[f"{label}_hint_us"] = per_call_us(lambda: Hints.hint(game_state), 5000)
+    return results
+
+
+@benchmark
+def save_slots() -> Dict[str, float]:
+    # One player's 10k slots: listing reads the index alone, a load reads and checks one save
+    count = 10000
+    game_state = GameState()
+    for command in PLAYTHROUGH[:12]:
+        process_command(command, game_state)
+    with tempfile.TemporaryDirectory() as directory:
+        slots = SaveSlots(directory, durable=False)
+        start = time.perf_counter()
+        for number in range(count):
+            slots.save(f"slot-{number}", game_state)
+        fill_us = (time.perf_counter() - start) / count * 1e6
+        index_bytes = os.path.getsize(slots.index_path)
+        list_ms = per_call_us(lambda: SaveSlots(directory).list(), 20) / 1000
+        loaded = GameState()
+        load_us = per_call_us(lambda: slots.load(f"slot-{count // 2}", loaded), 2000)
+        durable = SaveSlots(directory)
+        durable.list()
+        save_us = per_call_us(lambda: durable.save(f"slot-{count - 1}", game_state), 50)
+    return {
+        "slots": count,
+        "index_bytes": index_bytes,
+        "list_10k_ms": list_ms,
+        "load_us": load_us,
+        "save_us": save_us,
+        "save_without_fsync_us": fill_us,
+    }
+
+
+@benchmark
+def analytics() -> Dict[str, float]:
+    # 20k replayed transcripts of the manor, cut short at every point of the playthrough
+    count = 20000
+    lines = [json.dumps(replay(Session(str(cut), PLAYTHROUGH[:cut]))) + "\n" for cut in range(len(PLAYTHROUGH) + 1)]
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "transcripts.jsonl")
+        with open(filename, "w", encoding="utf-8") as f:
+            for number in range(count):
+                f.write(lines[number % len(lines)])
+        file_bytes = os.path.getsize(filename)
+        start = time.perf_counter()
+        summary = Analytics.summarize([filename])
+        elapsed = time.perf_counter() - start
+        # Streaming keeps memory flat however large the file
+        tracemalloc.start()
+        try:
+            Analytics.summarize([filename])
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {
+        "sessions_per_sec": summary.sessions / elapsed,
+        "file_mb": file_bytes / 1e6,
+        "peak_mb": peak / 1e6,
+    }
+
+
+@benchmark
+def resolution() -> Dict[str, float]:
+    # Names as players type them, against a tenth of the generated world's items carried
+    world = build_world(LARGE_ROOMS, seed=1)
+    start = time.perf_counter()
+    Resolver.resolver(world)
+    build_ms = (time.perf_counter() - start) * 1000
+    game_state = GameState(world)
+    game_state.keep_history = False
+    game_state.inventory = world.item_names[::10]
+    carried = game_state.inventory[len(game_state.inventory) // 2]
+    adjective, noun = carried.split("_")[:2]
+    phrases = {
+        "exact": carried,
+        "spaced": carried.replace("_", " "),
+        "word": noun,
+        "prefix": adjective[:3],
+        "typo": carried[:2] + carried[3:],
+        "missing": "zzz",
+    }
+    results: Dict[str, float] = {"items": len(world.item_names), "carried": len(game_state.inventory),
+                                 "index_build_ms": build_ms}
+    for label, phrase in phrases.items():
+        results[f"{label}_us"] = per_call_us(lambda: Resolver.find_item(game_state, phrase), 2000)
+    results["dispatch_typo_verb_us"] = per_call_us(lambda: COMMANDS.dispatch(f"exmaine {carried}", game_state), 2000)
+    return results
+
+
+def higher_is_better(metric: str) -> Optional[bool]:
+    # Throughputs and rates should not drop, times and sizes should not grow; anything
+    # else (state counts, ...) is informational and never flagged
+    if metric.endswith(("_per_sec", "_rate")):
+        return True
+    if "_us" in metric or "_ms" in metric or "bytes" in metric:
+        return False
+    return None
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """
+    Returns a line per metric that got worse than the baseline by more than `threshold`
+    percent. Metrics missing from either side are skipped.
+    """
+    regressions: List[str] = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            before = baseline.get(name, {}).get(metric)
+            direction = higher_is_better(metric)
+            if before is None or direction is None or before <= 0:
+                continue
+            change = (value - before) / before * 100
+            if (-change if direction else change) > threshold:
+                regressions.append(f"{name} {metric}: {before:.2f} -> {value:.2f} ({change:+.1f}%)")
+    return regressions
+
+
+def run(names: List[str]) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    for name in names:
+        results[name] = {metric: float(value) for metric, value in BENCHMARKS[name]().items()}
+        for metric, value in results[name].items():
+            print(f"{name:<20} {metric:<32} {value:>14.2f}")
+    return results
+
+
+def _write_results(filename: str, results: Dict[str, Dict[str, float]]) -> None:
+    document = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "generated_rooms": LARGE_ROOMS,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def main(argv: List[str]) -> int:
+    global LARGE_ROOMS
+    parser = argparse.ArgumentParser(description="Benchmark the game engine's hot paths.")
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)}).")
+    parser.add_argument("--rooms", type=int, default=LARGE_ROOMS, help="Size of the generated world.")
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--baseline", help="Compare against a stored results file.")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="Percentage a metric may get worse before it counts as a regression.")
+    parser.add_argument("--save-baseline", help="Store the results as a baseline file.")
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    LARGE_ROOMS = args.rooms
+
+    results = run(args.names or list(BENCHMARKS))
+    for filename in (args.json, args.save_baseline):
+        if filename:
+            _write_results(filename, results)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print("REGRESSION " + line)
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:g}% against {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
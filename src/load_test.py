@@ -0,0 +1,221 @@
+"""
+Load test for GameServer. Simulated clients connect, then each plays a short script
+while per-command round-trip latencies are recorded.
+
+    python load_test.py 1000 10000
+    python load_test.py --connect 127.0.0.1:4000 1000
+    python load_test.py --shared 200 500
+    python load_test.py --workers 1 2 4 8 -- 2000
+
+Without --connect the server is started in a child process, so the clients and the
+server each stay within their own file-descriptor limit. With --shared every client
+plays in one shared manor, served in-process so the report can include its lock
+contention and how long room events took to reach the other players. With --workers the
+child is a supervisor forking that many worker processes, for each count given in turn.
+"""
+from typing import Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import time
+
+from GameServer import PROMPT, GameServer, run_server
+from ShardedServer import Supervisor, run_supervisor
+from SharedWorld import SharedWorld
+
+PROMPT_BYTES = PROMPT.encode("utf-8")
+
+SCRIPT = [
+    "look",
+    "take bloody_handkerchief",
+    "examine matches",
+    "move east",
+    "inventory",
+    "move west",
+    "help",
+    "look",
+]
+
+# Detectives crowding through the same rooms and reaching for the same items
+SHARED_SCRIPT = [
+    "look",
+    "take matches",
+    "move east",
+    "take bloody_handkerchief",
+    "move east",
+    "take old_key",
+    "move west",
+    "move south",
+    "take carving_knife",
+    "move north",
+]
+
+
+def raise_fd_limit() -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def _open(address) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+
+async def drive_clients(address, clients: int, script: List[str] = SCRIPT,
+                        connect_concurrency: int = 256) -> Dict[str, float]:
+    connect_slots = asyncio.Semaphore(connect_concurrency)
+    all_connected = asyncio.Event()
+    connected = 0
+    latencies: List[float] = []
+    errors = 0
+
+    async def client() -> None:
+        nonlocal connected, errors
+        async with connect_slots:
+            reader, writer = await _open(address)
+            await reader.readuntil(PROMPT_BYTES)
+        connected += 1
+        if connected == clients:
+            all_connected.set()
+        await all_connected.wait()
+        try:
+            for command in script:
+                start = time.perf_counter()
+                writer.write(command.encode("utf-8") + b"\n")
+                await reader.readuntil(PROMPT_BYTES)
+                latencies.append(time.perf_counter() - start)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            errors += 1
+        finally:
+            writer.close()
+
+    # Every connection is established first, so the measured phase has all clients live
+    tasks = [asyncio.ensure_future(client()) for _ in range(clients)]
+    await all_connected.wait()
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "clients": clients,
+        "commands": len(latencies),
+        "errors": errors,
+        "commands_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def _serve_in_child(ready: "multiprocessing.Queue", unix_path: Optional[str]) -> None:
+    raise_fd_limit()
+
+    async def serve() -> None:
+        server = GameServer(unix_path=unix_path, backlog=4096)
+        await server.start()
+        ready.put(server.address)
+        await run_server(server)
+
+    asyncio.run(serve())
+
+
+def _supervise_in_child(ready: "multiprocessing.Queue", workers: int) -> None:
+    raise_fd_limit()
+    asyncio.run(run_supervisor(Supervisor(workers), ready))
+
+
+def run_load_test(clients: int, script: List[str] = SCRIPT, address=None,
+                  connect_concurrency: int = 256, workers: int = 0) -> Dict[str, float]:
+    raise_fd_limit()
+    child = None
+    if address is None:
+        ready: multiprocessing.Queue = multiprocessing.Queue()
+        if workers:
+            # Not a daemon, as daemonic processes may not fork workers of their own
+            child = multiprocessing.Process(target=_supervise_in_child, args=(ready, workers))
+        else:
+            child = multiprocessing.Process(target=_serve_in_child, args=(ready, None), daemon=True)
+        child.start()
+        address = tuple(ready.get(timeout=30))
+    try:
+        return asyncio.run(drive_clients(address, clients, script, connect_concurrency))
+    finally:
+        if child is not None:
+            child.terminate()
+            child.join()
+
+
+async def _shared_load_test(players: int, script: List[str], threads: int) -> Dict[str, float]:
+    shared = SharedWorld()
+    server = GameServer(shared=shared, threads=threads, backlog=4096)
+    await server.start()
+    try:
+        results = await drive_clients(server.address, players, script)
+    finally:
+        await server.shutdown()
+    results.update(shared.stats())
+    results["broadcast_p50_ms"] = server.broadcast_latency.percentile(50) / 1e6
+    results["broadcast_p99_ms"] = server.broadcast_latency.percentile(99) / 1e6
+    results["events_delivered"] = server.broadcast_latency.count
+    results["events_dropped"] = server.events_dropped
+    return results
+
+
+def run_shared_load_test(players: int, script: List[str] = SHARED_SCRIPT, threads: int = 8) -> Dict[str, float]:
+    raise_fd_limit()
+    return asyncio.run(_shared_load_test(players, script, threads))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the game server with simulated clients.")
+    parser.add_argument("clients", type=int, nargs="*", default=[1000, 10000])
+    parser.add_argument("--connect", help="HOST:PORT of a running server (default: start one).")
+    parser.add_argument("--shared", action="store_true", help="Play every client in one shared manor.")
+    parser.add_argument("--threads", type=int, default=8, help="Command threads of the shared server.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[],
+                        help="Serve from a supervisor with this many worker processes; one run per count.")
+    args = parser.parse_args()
+
+    if args.shared:
+        for players in args.clients:
+            results = run_shared_load_test(players, threads=args.threads)
+            print(f"{players:>6} players  {results['commands_per_sec']:>7.0f} cmd/s  p99 {results['p99_ms']:.2f} ms  "
+                  f"locks {results['lock_acquisitions']} ({results['contention_rate']:.1%} contended, "
+                  f"wait p99 {results['lock_wait_p99_us']:.0f} us)  events {results['events_delivered']} "
+                  f"(p50 {results['broadcast_p50_ms']:.2f} ms, p99 {results['broadcast_p99_ms']:.2f} ms, "
+                  f"{results['events_dropped']} dropped)  errors {results['errors']}")
+        return
+
+    address = None
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        address = (host, int(port))
+    if args.workers:
+        print(f"{os.cpu_count()} CPUs available")
+        for workers in args.workers:
+            for clients in args.clients:
+                results = run_load_test(clients, workers=workers)
+                print(f"{workers:>3} workers  {clients:>6} clients  {results['commands_per_sec']:>9.0f} cmd/s  "
+                      f"p50 {results['p50_ms']:.2f} ms  p99 {results['p99_ms']:.2f} ms  errors {results['errors']}")
+        return
+    for clients in args.clients:
+        results = run_load_test(clients, address=address)
+        print(f"{clients:>6} clients  {results['commands']:>7} commands  "
+              f"{results['commands_per_sec']:>9.0f} cmd/s  p50 {results['p50_ms']:.2f} ms  "
+              f"p99 {results['p99_ms']:.2f} ms  errors {results['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,94 @@
+from contextlib import nullcontext
+import argparse
+import json
+import sys
+import time
+
+import Metrics
 from GameState import GameState
 from GameLoop import run_game_loop
+from Replay import diff_golden, load_sessions, replay_all, write_golden
+from SaveJournal import SaveJournal
+from SaveSlots import SaveSlots
+from World import DEFAULT_WORLD_FILE
+
+def run_headless(args):
+    # Replays scripted sessions without a terminal, printing only a summary and any golden diffs
+    sessions = load_sessions(args.replay)
+    start = time.perf_counter()
+    results = replay_all(sessions, args.processes, args.world)
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, separators=(",", ":")) + "\n")
+
+    mismatches = 0
+    if args.golden:
+        for result in results:
+            if args.update_golden:
+                write_golden(result, args.golden)
+                continue
+            diff = diff_golden(result, args.golden)
+            if diff is not None:
+                mismatches += 1
+                print(diff, end="")
+
+    commands = sum(len(result["transcript"]) for result in results)
+    solved = sum(result["solved"] for result in results)
+    rate = len(results) / elapsed if elapsed > 0 else float("inf")
+    print(f"{len(results)} sessions ({solved} solved), {commands} commands in {elapsed:.2f}s "
+          f"({rate:.0f} sessions/sec)")
+    if mismatches:
+        print(f"{mismatches} transcripts differ from {args.golden}")
+        return 1
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manor Murder Mystery")
+    parser.add_argument("--replay", nargs="+", metavar="FILE",
+                        help="Run command scripts (.txt) or session streams (.jsonl) headlessly.")
+    parser.add_argument("--processes", type=int, default=1, help="Replay sessions across this many processes.")
+    parser.add_argument("--world", default=DEFAULT_WORLD_FILE, help="World definition to replay against.")
+    parser.add_argument("--out", help="Write each session's transcript and final state to this JSONL file.")
+    parser.add_argument("--golden", metavar="DIR", help="Compare transcripts with the golden files in DIR.")
+    parser.add_argument("--update-golden", action="store_true", help="Rewrite the golden files instead.")
+    parser.add_argument("--saves", default="saves", metavar="DIR",
+                        help="Directory of the save slots used by 'save <slot>' and 'load <slot>'.")
+    parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file on exit.")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on localhost:PORT/metrics.")
+    parser.add_argument("--profile", metavar="PREFIX",
+                        help="Profile the run into PREFIX.prof and PREFIX.memory.txt (in-process sessions only).")
+    args = parser.parse_args(argv)
+
+    metrics = None
+    if args.metrics_file or args.metrics_port is not None:
+        metrics = Metrics.enable()
+        if args.metrics_port is not None:
+            metrics.serve(port=args.metrics_port)
+    try:
+        with Metrics.profile_session(args.profile) if args.profile else nullcontext():
+            return run_headless(args) if args.replay else play(args)
+    finally:
+        if metrics is not None:
+            if args.metrics_file:
+                metrics.write_prometheus(args.metrics_file)
+            Metrics.disable()
 
-def main():
+def play(args):
     # TODO: Add a load save function
 
     # Create new game state
     game_state = GameState()
 
-    # Start the game loop with the new game state
-    run_game_loop(game_state)
+    # Start the game loop with the new game state, journaling changes to savegame.json
+    journal = SaveJournal("savegame.json")
+    try:
+        run_game_loop(game_state, journal, SaveSlots(args.saves))
+    finally:
+        journal.close()
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
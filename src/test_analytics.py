@@ -0,0 +1,80 @@
+import json
+
+import Analytics
+from Analytics import format_report, report, summarize
+from Commands import COMMANDS
+from GameState import GameState
+from Replay import Session, replay
+from SaveJournal import SaveJournal
+from SaveSlots import SaveSlots
+from World import load_world
+
+WIN = ["take matches", "e", "e", "take old_key", "w", "s", "take carving_knife", "s", "take lantern", "n", "n",
+       "e", "n", "take incriminating_ledger", "s", "w", "n", "w", "use incriminating_ledger"]
+
+def _transcripts(path, sessions):
+    with open(path, "w", encoding="utf-8") as f:
+        for number, commands in enumerate(sessions):
+            f.write(json.dumps(replay(Session(str(number), commands))) + "\n")
+
+def test_transcripts_give_heatmap_funnel_and_time_to_solve(tmp_path):
+    _transcripts(tmp_path / "runs.jsonl", [WIN, WIN[:5], ["look", "take matches"]])
+    document = report(summarize([str(tmp_path)]), load_world())
+
+    assert document["sessions"] == 3 and document["solved"] == 1
+    assert document["heatmap"]["garden"] == 1
+    assert document["heatmap"]["study"] == 2
+    assert document["heatmap"]["master_bedroom"] == 1
+    funnel = {step["item"]: step for step in document["funnel"]}
+    assert funnel["old_key"]["sessions"] == 2 and funnel["old_key"]["mean_turn"] == 4
+    assert funnel["lantern"]["sessions"] == 1
+    assert document["time_to_solve"]["p50"] == len(WIN)
+    stuck = {entry["step"]: entry["sessions"] for entry in document["stuck"]}
+    assert stuck == {"find the carving_knife in the kitchen": 1, "find the old_key in the study": 1}
+    assert "3 sessions from 1 files, 1 solved" in format_report(document)
+
+def test_pickups_by_alias_or_misspelt_verb_are_counted(tmp_path):
+    _transcripts(tmp_path / "runs.jsonl", [["grab matches", "e", "e", "tkae old_key", "w", "s", "get the knife"]])
+    document = report(summarize([str(tmp_path)]), load_world())
+    funnel = {step["item"]: step["sessions"] for step in document["funnel"]}
+    assert funnel["old_key"] == funnel["carving_knife"] == 1
+
+def test_saves_journals_and_streams_are_all_read(tmp_path):
+    played = GameState()
+    for command in WIN[:9]:
+        COMMANDS.dispatch(command, played)
+    played.save_to_file(str(tmp_path / "player.json"))
+    played.save_to_file(str(tmp_path / "hibernated.sav"), binary=True)
+    SaveSlots(str(tmp_path / "slots"), durable=False).save("cellar", played)
+
+    journal = SaveJournal(str(tmp_path / "savegame.json"))
+    journaled = GameState()
+    for command in WIN:
+        COMMANDS.dispatch(command, journaled)
+        journal.record(command, journaled)
+    journal.close()
+
+    with open(tmp_path / "stream.jsonl", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"name": "short", "commands": ["e", "e", "take old_key"]}) + "\n")
+    (tmp_path / "broken.json").write_text("{not json")
+
+    summary = summarize([str(tmp_path)])
+    document = report(summary, load_world())
+    # The journal's snapshot is read as part of the journal, not as a session of its own
+    assert document["files"] == 6 and document["sessions"] == 5
+    assert document["unreadable_files"] == 1
+    assert document["solved"] == 1
+    funnel = {step["item"]: step["sessions"] for step in document["funnel"]}
+    assert funnel["lantern"] == 4 and funnel["old_key"] == 5
+
+def test_a_process_pool_gives_the_same_report(tmp_path):
+    for part in range(3):
+        _transcripts(tmp_path / f"part{part}.jsonl", [WIN[:cut] for cut in range(part, len(WIN), 3)])
+    world = load_world()
+    assert report(summarize([str(tmp_path)], processes=2), world) == report(summarize([str(tmp_path)]), world)
+
+def test_columns_are_counted_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(Analytics, "BATCH", 2)
+    _transcripts(tmp_path / "runs.jsonl", [WIN[:3]] * 5)
+    document = report(summarize([str(tmp_path)]), load_world())
+    assert document["heatmap"]["foyer"] == 5
@@ -0,0 +1,26 @@
+import json
+import benchmarks
+from benchmarks import compare, higher_is_better
+
+def test_metric_direction_follows_its_name():
+    assert higher_is_better("manor_look_per_sec") is True
+    assert higher_is_better("generated_save_json_us") is False
+    assert higher_is_better("played_session_bytes") is False
+    assert higher_is_better("manor_states") is None
+
+def test_compare_flags_only_regressions_beyond_the_threshold():
+    baseline = {"verbs": {"look_per_sec": 1000.0, "states": 10.0}, "engine": {"move_us": 2.0}}
+    results = {"verbs": {"look_per_sec": 850.0, "states": 50.0}, "engine": {"move_us": 1.0}, "new": {"x_us": 9.0}}
+    assert compare(results, baseline, threshold=20) == []
+    assert compare(results, baseline, threshold=10) == ["verbs look_per_sec: 1000.00 -> 850.00 (-15.0%)"]
+    results["engine"]["move_us"] = 3.0
+    assert compare(results, baseline, threshold=20) == ["engine move_us: 2.00 -> 3.00 (+50.0%)"]
+
+def test_baseline_comparison_sets_the_exit_status(tmp_path, monkeypatch, capsys):
+    monkeypatch.setitem(benchmarks.BENCHMARKS, "fake", lambda: {"step_us": 10.0})
+    baseline = tmp_path / "baseline.json"
+    assert benchmarks.main(["fake", "--save-baseline", str(baseline)]) == 0
+    assert json.loads(baseline.read_text())["results"] == {"fake": {"step_us": 10.0}}
+    monkeypatch.setitem(benchmarks.BENCHMARKS, "fake", lambda: {"step_us": 20.0})
+    assert benchmarks.main(["fake", "--baseline", str(baseline), "--threshold", "50"]) == 1
+    assert "REGRESSION fake step_us" in capsys.readouterr().out
@@ -0,0 +1,59 @@
+import pytest
+from Commands import COMMANDS, UNKNOWN_COMMAND, CommandRegistry, tokenize
+from GameLoop import process_command
+from GameState import GameState
+
+@pytest.fixture
+def game_instance():
+    return GameState()
+
+def test_tokenize_splits_verb_from_arguments():
+    assert tokenize("  Take   Old_Key ") == ("take", "old_key")
+    assert tokenize("look") == ("look", "")
+    assert tokenize("   ") == ("", "")
+
+@pytest.mark.parametrize("command", ["user", "lookout", "moved east", "takeover", "loadgame", ""])
+def test_words_that_merely_start_with_a_verb_are_not_routed_to_it(game_instance, command):
+    result = COMMANDS.dispatch(command, game_instance)
+    assert result.verb is None
+    assert result.message == UNKNOWN_COMMAND
+
+@pytest.mark.parametrize("alias, verb", [("n", "move"), ("east", "move"), ("inv", "inventory"),
+                                         ("i", "inventory"), ("x", "examine"), ("l", "look"), ("q", "quit")])
+def test_aliases_resolve_to_their_verb(alias, verb):
+    assert COMMANDS.resolve(alias) == verb
+
+def test_direction_aliases_move_the_player(game_instance):
+    result = COMMANDS.dispatch("e", game_instance)
+    assert result.verb == "move" and result.success
+    assert game_instance.current_location == "foyer"
+    assert "You are now in the Foyer." in result.message
+
+def test_results_are_structured(game_instance):
+    failed = COMMANDS.dispatch("take lantern", game_instance)
+    assert (failed.verb, failed.success) == ("take", False)
+    taken = COMMANDS.dispatch("take matches", game_instance)
+    assert (taken.verb, taken.success) == ("take", True)
+    assert "You now carry: matches" in taken.message
+
+def test_new_verbs_can_be_registered_without_touching_the_dispatcher(game_instance):
+    registry = CommandRegistry()
+
+    @registry.command("whistle", aliases=("w",), description="Whistle a tune.")
+    def whistle(game_state, args, **context):
+        return True, f"You whistle {args or 'a tune'} in the {game_state.current_location}."
+
+    assert registry.dispatch("w", game_instance).message == "You whistle a tune in the garden."
+    assert registry.help_lines() == ["  whistle           - Whistle a tune."]
+    with pytest.raises(ValueError):
+        registry.register("whistle", whistle)
+
+def test_help_lists_registered_commands(game_instance):
+    message = process_command("help", game_instance)
+    assert "  move <direction>  - Move north, south, east, west, etc." in message
+    assert "  examine <item>    - Take a closer look at an item." in message
+
+def test_load_reports_its_outcome_instead_of_printing(game_instance, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    assert process_command("load", game_instance) == "No save game file found."
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,55 @@
+import json
+import pytest
+from ContentPack import ContentPack, pack_world
+from GameLoop import process_command
+from GameState import GameState
+from World import DEFAULT_WORLD_FILE, World, load_world
+from WorldGenerator import generate_world, write_world
+
+@pytest.fixture
+def packed_manor(tmp_path):
+    with open(DEFAULT_WORLD_FILE, "r", encoding="utf-8") as f:
+        definition = json.load(f)
+    with open(DEFAULT_WORLD_FILE.replace("manor.json", "manor_items.json"), "r", encoding="utf-8") as f:
+        item_texts = json.load(f)
+    stripped = pack_world(definition, item_texts, str(tmp_path / "manor.pack"))
+    (tmp_path / "manor.json").write_text(json.dumps(stripped))
+    return str(tmp_path / "manor.json")
+
+def test_packed_world_plays_exactly_like_the_original(packed_manor):
+    """
+    The same commands should give the same responses whether text is inline or packed.
+    """
+    world = load_world(packed_manor)
+    assert world.pack is not None and all(room.description is None for room in world.rooms)
+    plain, packed = GameState(), GameState(world)
+    for command in ["look", "examine matches", "take matches", "look", "move east", "examine rope",
+                    "move south", "take carving_knife", "examine carving_knife", "move south", "look"]:
+        assert process_command(command, packed) == process_command(command, plain)
+
+def test_decoded_text_is_kept_in_a_small_lru(packed_manor):
+    world = load_world(packed_manor)
+    pack = ContentPack(world.pack.filename, world.item_ids, cache_size=3)
+    assert not pack.loaded
+    for room in world.rooms:
+        assert pack.room_description(room.id)
+    assert len(pack._cache) == 3
+    pack.close()
+
+def test_pack_must_match_its_world(tmp_path, packed_manor):
+    with open(packed_manor, "r", encoding="utf-8") as f:
+        definition = json.load(f)
+    definition["rooms"]["attic"] = {"exits": {}}
+    with pytest.raises(ValueError):
+        World(definition, base_dir=str(tmp_path))
+    (tmp_path / "manor.pack").write_bytes(b"not a pack")
+    with pytest.raises(ValueError):
+        load_world(packed_manor)
+
+def test_generated_world_can_be_written_as_a_pack(tmp_path):
+    generated = generate_world(100, seed=3)
+    write_world(generated, str(tmp_path / "big.json"), pack=True)
+    world = load_world(str(tmp_path / "big.json"))
+    name = next(iter(generated.item_texts))
+    assert world.catalog.describe(name) == generated.item_texts[name]
+    assert world.description(5) == list(generated.definition["rooms"].values())[5]["description"]
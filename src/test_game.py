@@ -1,7 +1,9 @@
 import json
+import struct
 import pytest
 from pathlib import Path
 from GameState import GameState
+from Snapshot import SNAPSHOT_VERSION, decode_binary, encode_binary
 
 @pytest.fixture
 def game_instance():
@@ -10,7 +12,7 @@ def game_instance():
 
 def test_save_state_structure(game_instance):
     state = game_instance.save_state()
-    expected_keys = {"current_location", "inventory", "visited_locations"}
+    expected_keys = {"version", "current_location", "inventory", "visited_locations", "unlocked", "room_items", "solved"}
     assert set(state.keys()) == expected_keys, "Missing or extra keys in saved state."
 
     assert isinstance(state["current_location"], str), "current_location should be a string."
@@ -122,3 +124,77 @@ def test_load_incomplete_state(game_instance):
     assert game_instance.current_location == "strange_room", "current_location should be updated"
     assert game_instance.inventory == [], "Default inventory should be an empty list"
     assert game_instance.visited_locations == [], "Default visited_locations should be empty list"
+
+def _play(game, *commands):
+    from GameLoop import process_command
+    for command in commands:
+        process_command(command, game)
+
+def test_round_trip_keeps_world_changes(game_instance):
+    """
+    Unlocked doors, taken items, revealed items and the solved ending must all survive a save.
+    """
+    _play(game_instance, "move east", "move east", "take old_key", "move west", "move north", "move east",
+          "move south", "take silk_scarf", "move down", "move east", "take pruning_shears", "use pruning_shears")
+    game_instance.solved = game_instance.is_over = True
+
+    state = game_instance.save_state()
+    assert state["unlocked"] == ["orchard", "greenhouse"]
+    assert set(state["room_items"]) == {"study", "balcony", "greenhouse"}
+
+    new_game = GameState()
+    new_game.load_state(state)
+    assert new_game.current_location == "greenhouse"
+    assert not new_game.is_locked("orchard") and not new_game.is_locked("greenhouse")
+    assert list(new_game.items_at("study")) == []
+    assert list(new_game.items_at("greenhouse")) == ["rare_seed_pouch"]
+    assert new_game.is_over and new_game.solved
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_load_from_file_restores_full_state(game_instance, tmp_path: Path, binary):
+    _play(game_instance, "look", "take matches", "move east", "move south", "take carving_knife", "move south")
+    save_file = tmp_path / "savegame"
+    game_instance.save_to_file(str(save_file), binary=binary)
+
+    new_game = GameState()
+    new_game.load_from_file(str(save_file))
+    assert new_game.save_state() == game_instance.save_state()
+
+def test_binary_snapshot_keeps_names_unknown_to_the_world(game_instance):
+    game_instance.load_state({
+        "current_location": "dungeon",
+        "inventory": ["sword", "old_key"],
+        "visited_locations": ["entrance", "garden"],
+    })
+    state = game_instance.save_state()
+    assert decode_binary(encode_binary(state, game_instance.world), game_instance.world) == state
+
+def test_version_one_saves_are_migrated(game_instance):
+    game_instance.load_state({"current_location": "foyer", "inventory": ["matches"], "visited_locations": ["garden"]})
+    state = game_instance.save_state()
+    assert state["version"] == SNAPSHOT_VERSION
+    assert state["unlocked"] == [] and state["room_items"] == {} and state["solved"] is False
+
+def test_newer_save_versions_are_rejected(game_instance):
+    with pytest.raises(ValueError):
+        game_instance.load_state({"version": SNAPSHOT_VERSION + 1, "current_location": "foyer"})
+
+def test_corrupted_binary_save_raises_value_error(game_instance, tmp_path: Path):
+    save_file = tmp_path / "savegame.bin"
+    game_instance.save_to_file(str(save_file), binary=True)
+    save_file.write_bytes(save_file.read_bytes()[:-3])
+    with pytest.raises(ValueError):
+        game_instance.load_from_file(str(save_file))
+
+def test_binary_snapshots_are_little_endian_on_every_machine(game_instance):
+    _play(game_instance, "take matches", "move east")
+    data = encode_binary(game_instance.save_state(), game_instance.world)
+    matches = game_instance.world.item_ids["matches"]
+    # The inventory: a count of one, then the matches' id
+    assert struct.pack("<II", 1, matches) in data
+
+def test_version_two_saves_missing_world_changes_load_with_defaults(game_instance):
+    game_instance.load_state({"version": SNAPSHOT_VERSION, "current_location": "foyer", "inventory": ["matches"]})
+    state = game_instance.save_state()
+    assert state["current_location"] == "foyer" and state["inventory"] == ["matches"]
+    assert state["unlocked"] == [] and state["room_items"] == {} and state["solved"] is False
@@ -0,0 +1,88 @@
+from Commands import COMMANDS
+from GameState import GameState
+import Hints
+import Routing
+from Hints import hint_table
+from World import load_world
+from WorldGenerator import build_world, generate_world, write_world
+
+def test_manor_checklist_follows_the_dependencies():
+    steps = hint_table(load_world()).steps
+    assert steps[-1].kind == "win" and steps[-1].item == "incriminating_ledger"
+    taken = []
+    for step in steps:
+        if step.kind == "take":
+            taken.append(step.item)
+        else:
+            # Whatever opens a room or wins the game was picked up first
+            assert step.item in taken
+
+def test_hints_point_to_the_next_step_and_its_distance():
+    game_state = GameState()
+    assert COMMANDS.dispatch("hint", game_state).message == \
+        "You will need the old_key. It lies in the Study, 2 moves away."
+
+    game_state.inventory = ["old_key", "carving_knife"]
+    game_state.current_location = "foyer"
+    message = COMMANDS.dispatch("hint", game_state).message
+    assert "The Cellar is locked, and the carving_knife opens it" in message
+    assert "2 moves away" in message
+
+def test_hints_skip_steps_done_out_of_order():
+    game_state = GameState()
+    game_state.inventory = ["old_key", "carving_knife", "lantern", "incriminating_ledger"]
+    game_state.current_location = "staircase"
+    game_state._unlocked = 1 << game_state.world.room_ids["cellar"] | 1 << game_state.world.room_ids["secret_library"]
+    assert "Master Bedroom is locked" in COMMANDS.dispatch("hint", game_state).message
+
+    game_state.solved = True
+    assert "solved" in COMMANDS.dispatch("hint", game_state).message
+
+def test_hints_do_not_change_the_game():
+    game_state = GameState()
+    revision = game_state.revision
+    COMMANDS.dispatch("hint", game_state)
+    assert game_state.revision == revision
+
+def test_hint_distances_follow_the_rooms_the_player_has_opened():
+    world = load_world()
+    world.hints = world.routes = None
+    game_state = GameState(world)
+    for command in ["move east", "move south", "take carving_knife", "move south", "take lantern", "move north",
+                    "move north", "move east", "move north", "take incriminating_ledger"]:
+        COMMANDS.dispatch(command, game_state)
+    # In the Secret Library, opened on the way, the Study is next door
+    assert game_state.current_location == "secret_library"
+    assert COMMANDS.dispatch("hint", game_state).message == \
+        "You will need the old_key. It lies in the Study, 1 move away."
+
+    game_state = GameState(world)
+    game_state.inventory = ["old_key", "carving_knife", "lantern"]
+    game_state._unlocked = 1 << world.room_ids["cellar"]
+    game_state.current_location = "cellar"
+    assert COMMANDS.dispatch("hint", game_state).message == \
+        "The Secret Library is locked, and the lantern opens it. Head for its door, 4 moves away."
+    # Asking again reads the route table cached for this player's unlocks
+    built = Routing.router(world).built
+    COMMANDS.dispatch("hint", game_state)
+    assert Routing.router(world).built == built
+
+def test_checklists_are_cached_by_world_digest(tmp_path, monkeypatch):
+    filename = str(tmp_path / "world.json")
+    write_world(generate_world(60, seed=2), filename)
+    cache = tmp_path / "cache"
+    steps = hint_table(load_world(filename), cache_dir=str(cache)).steps
+    assert [path.name for path in cache.iterdir()] == [f"hints-{load_world(filename).digest}.json"]
+
+    # A second process would find the checklist on disk rather than build it
+    def no_build(world):
+        raise AssertionError("The checklist should come from the cache.")
+    monkeypatch.setattr(Hints, "build_steps", no_build)
+    monkeypatch.setattr(load_world(filename), "hints", None)
+    assert hint_table(load_world(filename), cache_dir=str(cache)).steps == steps
+
+def test_generated_worlds_have_a_winnable_checklist():
+    world = build_world(300, seed=5)
+    steps = hint_table(world).steps
+    assert steps[-1].kind == "win"
+    assert all(step.item in world.item_ids for step in steps)
@@ -0,0 +1,95 @@
+import pytest
+from Commands import COMMANDS
+from GameState import GameState
+from History import History
+
+WALKTHROUGH = [
+    "look", "take matches", "move east", "move east", "take old_key", "move west", "move south",
+    "take carving_knife", "move south", "take lantern", "move north", "move north", "move east",
+    "move north", "take incriminating_ledger", "move south", "move west", "move north", "move west",
+    "use incriminating_ledger",
+]
+
+def _play(game_state: GameState, commands):
+    # The state after each turn, starting with turn 0
+    states = [game_state.save_state()]
+    for command in commands:
+        COMMANDS.dispatch(command, game_state)
+        states.append(game_state.save_state())
+    return states
+
+def test_undo_takes_back_the_last_changes():
+    game_state = GameState()
+    _play(game_state, ["look", "take matches", "move east"])
+
+    result = COMMANDS.dispatch("undo", game_state)
+    assert result.success
+    assert game_state.current_location == "garden"
+    assert "matches" in game_state.inventory
+
+    COMMANDS.dispatch("undo", game_state)
+    assert "matches" not in game_state.inventory
+    assert "matches" in game_state.items_at("garden")
+    assert "matches" in game_state.describe_current_location()
+    assert "Garden" in result.message
+    # The first look marked the garden as visited, so it is a turn too
+    COMMANDS.dispatch("undo", game_state)
+    assert len(game_state.visited_locations) == 0
+    assert not COMMANDS.dispatch("undo", game_state).success
+
+def test_undo_several_moves_at_once():
+    game_state = GameState()
+    start = _play(game_state, ["move east", "move east", "take old_key"])[0]
+    assert "3 moves" in COMMANDS.dispatch("undo 5", game_state).message
+    assert game_state.save_state() == start
+
+@pytest.mark.parametrize("checkpoint_every", [3, 100])
+def test_rewind_restores_every_turn_of_a_winning_game(checkpoint_every):
+    game_state = GameState()
+    game_state.history = History(game_state, checkpoint_every=checkpoint_every)
+    states = _play(game_state, WALKTHROUGH)
+    assert game_state.solved
+
+    for turn in (len(WALKTHROUGH) - 1, 12, 5, 0):
+        assert COMMANDS.dispatch(f"rewind {turn}", game_state).success
+        assert game_state.save_state() == states[turn]
+        assert game_state.history.turn == turn
+    assert not game_state.is_over
+
+def test_play_continues_after_a_rewind():
+    game_state = GameState()
+    states = _play(game_state, ["move east", "move east", "take old_key"])
+    COMMANDS.dispatch("rewind 1", game_state)
+    COMMANDS.dispatch("move east", game_state)
+    COMMANDS.dispatch("take old_key", game_state)
+    assert game_state.save_state() == states[3]
+    assert game_state.history.turn == 3
+
+    COMMANDS.dispatch("undo", game_state)
+    assert game_state.save_state() == states[2]
+
+def test_rewind_is_limited_to_retained_turns():
+    game_state = GameState()
+    game_state.history = History(game_state, retain=2)
+    _play(game_state, ["move east", "move east", "move west", "move west"])
+    result = COMMANDS.dispatch("rewind 1", game_state)
+    assert not result.success and "turns 2 to 4" in result.message
+    assert COMMANDS.dispatch("rewind 2", game_state).success
+    assert game_state.current_location == "study"
+
+def test_loading_a_game_clears_the_history(tmp_path):
+    save_file = str(tmp_path / "save.json")
+    game_state = GameState()
+    _play(game_state, ["move east"])
+    game_state.save_to_file(save_file)
+    COMMANDS.dispatch("move east", game_state)
+    COMMANDS.dispatch("load", game_state, save_file=save_file)
+    assert game_state.history.undoable == 0
+    assert not COMMANDS.dispatch("undo", game_state).success
+
+def test_history_can_be_turned_off():
+    game_state = GameState()
+    game_state.keep_history = False
+    _play(game_state, ["move east"])
+    assert game_state.history is None
+    assert not COMMANDS.dispatch("undo", game_state).success
@@ -0,0 +1,100 @@
+import json
+import os
+from pathlib import Path
+from GameLoop import process_command
+from GameState import GameState
+from SaveJournal import SaveJournal
+
+def _play(commands, journal, game_state=None):
+    game_state = game_state or GameState()
+    for command in commands:
+        process_command(command, game_state, journal)
+        journal.record(command, game_state)
+    return game_state
+
+def test_read_only_commands_cost_no_io(tmp_path: Path):
+    journal = SaveJournal(str(tmp_path / "save.json"))
+    game_state = _play(["move east"], journal)
+    journal.sync()
+    written = journal.bytes_written
+    _play(["look", "help", "inventory", "look", "examine bloody_handkerchief"], journal, game_state)
+    assert journal.bytes_written == written
+    journal.close()
+
+def test_recovery_replays_snapshot_and_tail(tmp_path: Path):
+    journal = SaveJournal(str(tmp_path / "save.json"))
+    original = _play(["take matches", "move east", "move east", "take old_key", "look"], journal)
+    journal.close()
+
+    recovered = GameState()
+    replayed = SaveJournal(str(tmp_path / "save.json")).recover(recovered)
+    assert replayed == 3
+    assert recovered.current_location == original.current_location == "study"
+    assert recovered.inventory == ["matches", "old_key"]
+    assert recovered.visited_locations == original.visited_locations
+
+def test_torn_final_record_is_ignored(tmp_path: Path):
+    journal = SaveJournal(str(tmp_path / "save.json"), sync_every=1)
+    _play(["take matches", "move east"], journal)
+    journal.close()
+    with open(tmp_path / "save.json.journal", "ab") as f:
+        f.write(b'"move ea')
+
+    recovered = GameState()
+    recovering = SaveJournal(str(tmp_path / "save.json"))
+    assert recovering.recover(recovered) == 1
+    assert recovered.current_location == "foyer"
+
+    # Journaling continues cleanly after the last complete record
+    _play(["move west"], recovering, recovered)
+    recovering.close()
+    again = GameState()
+    SaveJournal(str(tmp_path / "save.json")).recover(again)
+    assert again.current_location == "drawing_room"
+
+def test_compaction_snapshot_is_atomic_and_truncates_journal(tmp_path: Path):
+    journal = SaveJournal(str(tmp_path / "save.json"), compact_every=2)
+    _play(["take matches", "move east", "move west", "move east", "move east"], journal)
+    journal.close()
+
+    assert not os.path.exists(tmp_path / "save.json.tmp")
+    snapshot = json.loads((tmp_path / "save.json").read_text())
+    assert snapshot["current_location"] == "foyer"
+    recovered = GameState()
+    assert SaveJournal(str(tmp_path / "save.json")).recover(recovered) == 1
+    assert recovered.current_location == "study"
+
+def test_journal_from_another_generation_is_not_replayed(tmp_path: Path):
+    """
+    Simulates a crash after a compaction snapshot was written but before the journal restarted.
+    """
+    journal = SaveJournal(str(tmp_path / "save.json"))
+    _play(["take matches", "move east"], journal)
+    journal.close()
+    stale_journal = (tmp_path / "save.json.journal").read_bytes()
+
+    journal = SaveJournal(str(tmp_path / "save.json"))
+    _play(["move east"], journal)
+    journal.close()
+    (tmp_path / "save.json.journal").write_bytes(stale_journal)
+
+    recovered = GameState()
+    assert SaveJournal(str(tmp_path / "save.json")).recover(recovered) == 0
+    assert recovered.current_location == "foyer"
+
+def test_undo_and_rewind_survive_recovery(tmp_path: Path):
+    journal = SaveJournal(str(tmp_path / "save.json"), compact_every=2)
+    original = _play(["move east", "move east", "take old_key", "move west", "undo 3"], journal)
+    journal.close()
+    recovered = GameState()
+    SaveJournal(str(tmp_path / "save.json")).recover(recovered)
+    assert recovered.current_location == original.current_location == "foyer"
+    assert recovered.inventory == original.inventory == []
+
+    journal = SaveJournal(str(tmp_path / "rewound.json"))
+    original = _play(["take matches", "move east", "move east", "rewind 1", "move east"], journal)
+    journal.close()
+    recovered = GameState()
+    SaveJournal(str(tmp_path / "rewound.json")).recover(recovered)
+    assert recovered.current_location == original.current_location == "foyer"
+    assert recovered.inventory == original.inventory == ["matches"]
@@ -0,0 +1,115 @@
+import sys
+import threading
+import urllib.request
+import pytest
+import Metrics
+from Commands import COMMANDS
+from GameLoop import process_command
+from GameState import GameState
+from Metrics import Histogram
+from SaveJournal import SaveJournal
+
+@pytest.fixture
+def metrics():
+    active = Metrics.enable()
+    yield active
+    Metrics.disable()
+
+def test_histogram_buckets_stay_within_an_eighth_of_their_values():
+    histogram = Histogram()
+    for value in (0, 15, 16, 17, 1000, 1_000_000, 123_456_789):
+        index = Histogram.bucket(value)
+        low, high = Histogram.bucket_bounds(index)
+        assert low <= value <= high and high - low <= max(low // 8, 1)
+        histogram.record(value)
+    assert histogram.count == 7 and histogram.percentile(50) == 17
+    assert histogram.percentile(100) >= 123_456_789
+    assert histogram.cumulative_below(1024) == 5
+
+def test_disabled_instrumentation_leaves_the_original_code_in_place():
+    """
+    With metrics off, the dispatcher and GameState must be exactly the uninstrumented ones.
+    """
+    original_move = GameState.move_player
+    Metrics.enable()
+    assert GameState.move_player is not original_move and "dispatch" in vars(COMMANDS)
+    Metrics.disable()
+    assert GameState.move_player is original_move and "dispatch" not in vars(COMMANDS)
+
+def test_commands_are_counted_and_timed_per_verb(metrics):
+    game_state = GameState()
+    for command in ["look", "take lantern", "take matches", "xyzzy", "move east"]:
+        process_command(command, game_state)
+    assert metrics.counters["game_commands_total"] == {
+        (("verb", "look"),): 1, (("verb", "take"),): 2, (("verb", "unknown"),): 1, (("verb", "move"),): 1}
+    assert metrics.counters["game_command_failures_total"] == {(("verb", "take"),): 1}
+    assert metrics.counters["game_unknown_commands_total"] == {(): 1}
+    assert metrics.histograms["game_command_duration_seconds"][(("verb", "take"),)].count == 2
+    assert metrics.histograms["game_state_call_duration_seconds"][(("method", "move_player"),)].count == 1
+
+def test_save_io_is_measured(metrics, tmp_path):
+    game_state = GameState()
+    game_state.save_to_file(str(tmp_path / "save.json"))
+    journal = SaveJournal(str(tmp_path / "journaled.json"))
+    process_command("move east", game_state, journal)
+    journal.record("move east", game_state)
+    journal.close()
+    saved = metrics.counters["game_save_bytes_total"]
+    assert saved[(("kind", "snapshot"),)] == (tmp_path / "save.json").stat().st_size
+    assert saved[(("kind", "journal"),)] > 0
+
+def test_prometheus_export_to_file_and_http(metrics, tmp_path):
+    process_command("look", GameState())
+    text = metrics.render_prometheus()
+    assert 'game_commands_total{verb="look"} 1' in text
+    assert 'game_command_duration_seconds_bucket{verb="look",le="+Inf"} 1' in text
+    assert 'game_command_duration_seconds_count{verb="look"} 1' in text
+    metrics.write_prometheus(str(tmp_path / "metrics.prom"))
+    assert (tmp_path / "metrics.prom").read_text() == text
+    server = metrics.serve(port=0)
+    host, port = server.server_address[:2]
+    with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+        assert 'game_commands_total{verb="look"} 1' in response.read().decode("utf-8")
+
+def test_counting_from_threads_while_rendering_loses_nothing():
+    metrics = Metrics.Metrics()
+    done = threading.Event()
+    errors = []
+
+    def render():
+        while not done.is_set():
+            try:
+                metrics.render_prometheus()
+            except RuntimeError as e:
+                errors.append(e)
+
+    def work(thread):
+        for number in range(2000):
+            metrics.count("game_commands_total", (("verb", f"verb{number % 200}"),))
+            metrics.observe("game_command_duration_seconds", (("verb", f"t{thread}-{number % 50}"),), number)
+
+    # Switch threads as often as possible, so unguarded updates would interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        renderer = threading.Thread(target=render)
+        renderer.start()
+        workers = [threading.Thread(target=work, args=(thread,)) for thread in range(8)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        done.set()
+        renderer.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert not errors
+    assert sum(metrics.counters["game_commands_total"].values()) == 8 * 2000
+    assert sum(h.count for h in metrics.histograms["game_command_duration_seconds"].values()) == 8 * 2000
+
+def test_profile_session_writes_cpu_and_memory_reports(tmp_path):
+    prefix = str(tmp_path / "session")
+    with Metrics.profile_session(prefix):
+        process_command("look", GameState())
+    assert (tmp_path / "session.prof").stat().st_size > 0
+    assert (tmp_path / "session.memory.txt").exists()
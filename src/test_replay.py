@@ -0,0 +1,65 @@
+import json
+import os
+import pytest
+from GameLoop import process_command
+from GameState import GameState
+from Replay import Session, diff_golden, load_sessions, replay, replay_all, write_golden
+import main
+
+WIN = ["take matches", "move east", "move south", "take carving_knife", "move south", "take lantern",
+       "move north", "move north", "move east", "move north", "take incriminating_ledger", "move south",
+       "take old_key", "move west", "move north", "move west", "use incriminating_ledger"]
+
+def test_replay_matches_the_interactive_dispatcher(tmp_path, monkeypatch):
+    """
+    A replayed session should produce the same responses as typing the commands, and
+    leave nothing behind in the working directory.
+    """
+    monkeypatch.chdir(tmp_path)
+    result = replay(Session("win", WIN + ["look"]))
+    game_state = GameState()
+    assert result["transcript"] == [[command, process_command(command, game_state)] for command in WIN]
+    assert result["solved"] and result["final_state"]["solved"]
+    assert os.listdir(tmp_path) == []
+
+def test_load_is_disabled_headless(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    GameState().save_to_file("savegame.json")
+    result = replay(Session("load", ["load"]))
+    assert result["transcript"] == [["load", "Saving and loading are disabled."]]
+
+def test_scripts_and_session_streams_are_read(tmp_path):
+    script = tmp_path / "opening.txt"
+    script.write_text("# walk to the foyer\nlook\n\nmove east\n")
+    stream = tmp_path / "players.jsonl"
+    stream.write_text(json.dumps({"name": "alice", "commands": ["take matches"]}) + "\n"
+                      + json.dumps({"commands": ["inventory"]}) + "\n")
+    sessions = load_sessions([str(script), str(stream)])
+    assert sessions == [Session("opening", ["look", "move east"]), Session("alice", ["take matches"]),
+                        Session("players-2", ["inventory"])]
+    stream.write_text("{not json}\n")
+    with pytest.raises(ValueError):
+        load_sessions([str(stream)])
+
+def test_process_pool_gives_the_same_results_in_order():
+    sessions = [Session(f"s{n}", WIN[:n]) for n in range(6)]
+    assert replay_all(sessions, processes=2) == replay_all(sessions)
+
+def test_golden_transcripts_detect_changes(tmp_path):
+    result = replay(Session("opening", ["look", "move east"]))
+    assert diff_golden(result, str(tmp_path)).startswith("No golden transcript")
+    write_golden(result, str(tmp_path))
+    assert diff_golden(result, str(tmp_path)) is None
+    changed = replay(Session("opening", ["look", "move west"]))
+    assert "+> move west" in diff_golden(changed, str(tmp_path))
+
+def test_headless_main_reports_and_fails_on_golden_mismatch(tmp_path, capsys):
+    script = tmp_path / "win.txt"
+    script.write_text("\n".join(WIN))
+    golden = str(tmp_path / "golden")
+    out = tmp_path / "results.jsonl"
+    assert main.main(["--replay", str(script), "--golden", golden, "--update-golden", "--out", str(out)]) == 0
+    assert "1 sessions (1 solved)" in capsys.readouterr().out
+    assert json.loads(out.read_text())["name"] == "win"
+    script.write_text("\n".join(WIN[:3]))
+    assert main.main(["--replay", str(script), "--golden", golden]) == 1
@@ -0,0 +1,70 @@
+import pytest
+
+from Commands import COMMANDS, UNKNOWN_COMMAND
+from GameState import GameState
+from Resolver import NameIndex, find_item, within_one
+from World import World
+from WorldGenerator import build_world
+
+@pytest.mark.parametrize("phrase", ["incriminating_ledger", "the Incriminating Ledger", "incriminatingledger",
+                                    "ledger", "incrim", "ledgr", "incriminating_ledgre", "account book"])
+def test_items_are_found_by_partial_or_misspelt_names(phrase):
+    game_state = GameState()
+    game_state.inventory = ["incriminating_ledger", "lantern"]
+    assert find_item(game_state, phrase) == ["incriminating_ledger"]
+
+def test_only_visible_items_are_candidates():
+    game_state = GameState()
+    game_state.inventory = ["lantern"]
+    assert find_item(game_state, "lamp") == ["lantern"]
+    assert find_item(game_state, "lamp", inventory=False) == []
+    # The old_key is in the study, not here
+    assert find_item(game_state, "key") == []
+    assert find_item(game_state, "case", inventory=False) == ["cigarette_case"]
+
+def test_commands_resolve_their_items_and_ask_when_several_fit():
+    game_state = GameState()
+    result = COMMANDS.dispatch("grab the Cigarette Case", game_state)
+    assert result.success and "You pick up the cigarette_case." in result.message
+    assert "bloody_handkerchief" not in COMMANDS.dispatch("take hanky", game_state).message
+
+    index = NameIndex(["old_key", "velvet_key", "rope"])
+    assert index.find("key") == ["old_key", "velvet_key"]
+    assert index.find("velvet") == ["velvet_key"]
+    assert index.find("key", visible=1 << 2) == []
+
+    world = World({"start": "hall", "rooms": {"hall": {"description": "A hall.",
+                                                       "items": ["old_key", "velvet_key"]}}})
+    game_state = GameState(world)
+    result = COMMANDS.dispatch("take key", game_state)
+    assert not result.success
+    assert result.message == "Which do you mean: the old_key or the velvet_key?"
+    assert "There is no spoon here." in COMMANDS.dispatch("take the spoon", game_state).message
+
+@pytest.mark.parametrize("command, verb", [("tkae matches", "take"), ("exmaine matches", "examine"),
+                                          ("inspect matches", "examine"), ("hel", "help"), ("lok", "look"),
+                                          ("invent", "inventory"), ("mvoe east", "move"), ("esat", "move")])
+def test_misspelt_and_shortened_verbs_are_recognised(command, verb):
+    assert COMMANDS.dispatch(command, GameState()).verb == verb
+
+def test_directions_tolerate_typos_and_ambiguity_is_refused():
+    game_state = GameState()
+    assert COMMANDS.dispatch("move eats", game_state).success
+    assert COMMANDS.dispatch("go nor", game_state).success
+    assert game_state.current_location == "staircase"
+    # "est" is one letter from both east and west
+    assert not COMMANDS.dispatch("move est", game_state).success
+    # Too short, or one letter from two verbs
+    assert COMMANDS.dispatch("sa", game_state).message == UNKNOWN_COMMAND
+    assert within_one("ab", "ba") and within_one("abc", "abcd") and not within_one("abc", "cab")
+
+def test_resolution_on_a_large_world_uses_the_index():
+    world = build_world(2000, seed=1)
+    game_state = GameState(world)
+    game_state.inventory = world.item_names[::3]
+    carried = game_state.inventory[10]
+    misspelt = carried[:2] + carried[3:]
+    assert carried in find_item(game_state, misspelt)
+    assert find_item(game_state, carried.replace("_", " ")) == [carried]
+    word = carried.split("_")[1]
+    assert all(word in name.split("_") for name in find_item(game_state, word))
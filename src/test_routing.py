@@ -0,0 +1,95 @@
+from collections import deque
+
+from Commands import COMMANDS
+from GameState import GameState
+from Routing import UNREACHABLE, Router
+from WorldGenerator import build_world
+
+def _visit(game_state: GameState, commands):
+    for command in commands:
+        COMMANDS.dispatch(command, game_state)
+
+def test_go_walks_to_a_visited_room_in_one_command():
+    game_state = GameState()
+    _visit(game_state, ["look", "e", "look", "e", "look", "w", "s", "look", "w", "look"])
+    assert game_state.current_location == "garden"
+
+    revision = game_state.revision
+    result = COMMANDS.dispatch("go study", game_state)
+    assert result.success
+    assert "(2 moves)" in result.message
+    assert "You are now in the Study." in result.message
+    assert game_state.current_location == "study"
+    # One undoable turn for the whole trip
+    COMMANDS.dispatch("undo", game_state)
+    assert game_state.current_location == "garden"
+    assert game_state.revision > revision
+
+def test_go_only_leads_to_visited_rooms():
+    game_state = GameState()
+    result = COMMANDS.dispatch("go the study", game_state)
+    assert not result.success and "haven't found" in result.message
+    assert not COMMANDS.dispatch("go ballroom", game_state).success
+    assert COMMANDS.dispatch("go east", game_state).success
+    assert game_state.current_location == "foyer"
+
+def test_go_respects_locks_until_they_flip():
+    game_state = GameState()
+    game_state.visited_locations = ["garden", "foyer", "study", "secret_library"]
+    result = COMMANDS.dispatch("go secret library", game_state)
+    # The walk stops at the locked door, as a move would
+    assert result.success
+    assert "locked" in result.message
+    assert game_state.current_location == "study"
+
+    game_state.current_location = "garden"
+    game_state.inventory = ["lantern"]
+    assert COMMANDS.dispatch("go secret_library", game_state).success
+    assert game_state.current_location == "secret_library"
+    assert not game_state.is_locked("secret_library")
+
+def _search(world, destination, opened):
+    # Plain BFS over the forward exits, for comparison
+    width = len(world.directions)
+    passable = lambda room_id: room_id == destination or not world.rooms[room_id].locked or opened >> room_id & 1
+    distance = {}
+    for start in range(len(world.rooms)):
+        if not passable(start):
+            continue
+        seen = {start: 0}
+        queue = deque([start])
+        while queue:
+            room_id = queue.popleft()
+            if room_id == destination:
+                break
+            for target in world.exits[room_id * width:(room_id + 1) * width]:
+                if target >= 0 and target not in seen and passable(target):
+                    seen[target] = seen[room_id] + 1
+                    queue.append(target)
+        distance[start] = seen.get(destination, UNREACHABLE)
+    return distance
+
+def test_tables_derived_after_a_lock_flips_match_a_full_search():
+    world = build_world(150, seed=4)
+    router = Router(world)
+    destination = 3
+    opened = 0
+    router.distances(destination, opened)
+    locked = [room.id for room in world.rooms if room.locked]
+    for room_id in locked[:4]:
+        opened |= 1 << room_id
+        table = router.distances(destination, opened)
+        expected = _search(world, destination, opened)
+        assert all(table[start] == expected[start] for start in expected)
+    assert router.built == 1 and router.derived == 4
+
+def test_routes_are_shortest_and_end_at_the_destination():
+    world = build_world(200, seed=9)
+    router = Router(world)
+    expected = _search(world, 120, 0)
+    for start, distance in expected.items():
+        path = router.route(start, 120, 0)
+        if distance == UNREACHABLE:
+            assert path is None
+        elif start != 120:
+            assert len(path) == distance and path[-1] == 120
@@ -0,0 +1,74 @@
+import pytest
+from GameState import GameState
+from World import World
+
+def _world(rules, **rooms):
+    definition = {
+        "start": "hall",
+        "rooms": {
+            "hall": {"description": "A hall.", "exits": {"north": "vault"}, "items": ["key", "torch"]},
+            "vault": {"description": "A vault.", "exits": {"south": "hall"}, "items": [], "locked": True,
+                      "required_item": "key"},
+        },
+        "rules": rules,
+    }
+    definition["rooms"].update(rooms)
+    return World(definition)
+
+def test_rules_are_indexed_by_item_and_location():
+    world = _world([
+        {"item": "key", "location": "hall", "requires": {"locked": ["vault"]},
+         "effects": {"unlock": ["vault"]}, "message": "Click."},
+        {"item": "key", "message": "Nothing to unlock."},
+    ])
+    game = GameState(world)
+    game.inventory = ["key"]
+    assert game.use_item("key") == (True, "Click.")
+    assert not game.is_locked("vault")
+    # The precondition no longer holds, so the item's fallback rule answers
+    assert game.use_item("key") == (False, "Nothing to unlock.")
+
+def test_reveal_and_end_game_effects():
+    world = _world([
+        {"item": "torch", "location": ["hall", "vault"], "requires": {"absent": ["gem"]},
+         "effects": {"reveal": ["gem"]}, "message": "Something glints."},
+        {"item": "gem", "location": "hall", "requires": {"items": ["torch", "gem"]},
+         "effects": {"end_game": True}, "message": "You win."},
+    ])
+    game = GameState(world)
+    game.inventory = ["torch"]
+    assert game.use_item("torch") == (True, "Something glints.")
+    assert list(game.items_at("hall")) == ["key", "torch", "gem"]
+    assert game.use_item("torch") == (False, "You can't use that here.")
+    game.pick_up_item("gem")
+    assert game.use_item("gem") == (True, "You win.")
+    assert game.is_over and game.solved
+
+def test_item_placeholder_in_messages():
+    world = _world([{"item": "torch", "message": "The {item} does nothing."}])
+    game = GameState(world)
+    game.inventory = ["torch"]
+    assert game.use_item("torch") == (False, "The torch does nothing.")
+
+@pytest.mark.parametrize("rule", [
+    {"item": "sword", "message": "Unknown item."},
+    {"item": "key", "location": "attic", "message": "Unknown room."},
+    {"item": "key", "effects": {"unlock": ["attic"]}, "message": "Unknown unlock target."},
+    {"item": "key", "requires": {"items": ["sword"]}, "message": "Unknown requirement."},
+    {"item": "key", "effects": {"teleport": True}, "message": "Unknown effect."},
+    {"item": "key"},
+])
+def test_invalid_rules_are_rejected_at_load(rule):
+    with pytest.raises(ValueError):
+        _world([rule])
+
+def test_manor_rules_keep_the_ledger_ending():
+    game = GameState()
+    game.current_location = "master_bedroom"
+    game.inventory = ["incriminating_ledger"]
+    success, message = game.use_item("incriminating_ledger")
+    assert not success and "something is missing" in message
+    game.inventory.append("old_key")
+    success, message = game.use_item("incriminating_ledger")
+    assert success and "The mystery is solved" in message
+    assert game.is_over
@@ -0,0 +1,108 @@
+import os
+
+from Commands import COMMANDS
+from GameState import GameState
+from SaveSlots import SaveSlots, _HEADER, _RECORD
+
+def _play(game_state, slots, commands):
+    return [COMMANDS.dispatch(command, game_state, slots=slots) for command in commands]
+
+def test_save_and_load_named_slots(tmp_path):
+    slots = SaveSlots(str(tmp_path / "saves"))
+    game_state = GameState()
+    _play(game_state, slots, ["take matches", "move east", "save foyer", "move east", "take old_key",
+                              "save study"])
+    saved = game_state.save_state()
+
+    result = COMMANDS.dispatch("load foyer", game_state, slots=slots)
+    assert result.success and "You are in the Foyer." in result.message
+    assert game_state.inventory == ["matches"]
+    assert COMMANDS.dispatch("load study", game_state, slots=slots).success
+    assert game_state.save_state() == saved
+    # The turn count carries on from the five commands before the save, the load being one more
+    assert game_state.history.turn == 6
+
+    assert not COMMANDS.dispatch("load attic", game_state, slots=slots).success
+    assert "not available" in COMMANDS.dispatch("save foyer", game_state).message
+    assert not COMMANDS.dispatch("save ../escape", game_state, slots=slots).success
+
+def test_listing_reads_only_the_index(tmp_path, monkeypatch):
+    slots = SaveSlots(str(tmp_path), durable=False)
+    game_state = GameState()
+    for slot in ("first", "second", "first"):
+        slots.save(slot, game_state)
+        COMMANDS.dispatch("move east", game_state)
+    assert [info.name for info in slots.list()] == ["first", "second"]
+    assert slots.info("first").location == "study"
+    assert os.path.getsize(tmp_path / "index") == _HEADER.size + 2 * _RECORD.size
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda name, *args, **kwargs: opened.append(name) or
+                        real_open(name, *args, **kwargs))
+    message = COMMANDS.dispatch("saves", game_state, slots=SaveSlots(str(tmp_path))).message
+    assert opened == [str(tmp_path / "index")]
+    assert "first" in message and "Foyer, turn" in message and "second" in message
+
+def test_corrupted_saves_are_refused(tmp_path):
+    slots = SaveSlots(str(tmp_path), durable=False)
+    game_state = GameState()
+    game_state.inventory = ["old_key"]
+    slots.save("slot", game_state)
+    data = bytearray((tmp_path / "slot.sav").read_bytes())
+    data[-1] ^= 0xFF
+    (tmp_path / "slot.sav").write_bytes(bytes(data))
+
+    fresh = GameState()
+    result = COMMANDS.dispatch("load slot", fresh, slots=slots)
+    assert not result.success and "corrupted" in result.message
+    assert fresh.inventory == []
+
+def test_a_torn_index_is_rebuilt_from_the_saves(tmp_path):
+    slots = SaveSlots(str(tmp_path), durable=False)
+    for slot in ("a", "b", "c"):
+        slots.save(slot, GameState())
+    index = tmp_path / "index"
+    data = bytearray(index.read_bytes())
+    # A torn write in the middle record and a partial append at the end
+    data[_HEADER.size + _RECORD.size + 5] ^= 0xFF
+    index.write_bytes(bytes(data) + b"\x01\x02")
+    assert [info.name for info in SaveSlots(str(tmp_path)).list()] == ["a", "c"]
+
+    assert slots.rebuild() == 3
+    assert [info.name for info in slots.list()] == ["a", "b", "c"]
+    index.unlink()
+    # Saving without an index starts by rebuilding it
+    SaveSlots(str(tmp_path), durable=False).save("d", GameState())
+    assert [info.name for info in slots.list()] == ["a", "b", "c", "d"]
+
+def test_loading_a_slot_restarts_the_journal(tmp_path):
+    from SaveJournal import SaveJournal
+
+    slots = SaveSlots(str(tmp_path / "saves"), durable=False)
+    journal = SaveJournal(str(tmp_path / "savegame.json"))
+    game_state = GameState()
+    for command in ["take matches", "save early", "move east", "load early"]:
+        COMMANDS.dispatch(command, game_state, journal=journal, slots=slots)
+        journal.record(command, game_state)
+    journal.close()
+
+    recovered = GameState()
+    SaveJournal(str(tmp_path / "savegame.json")).recover(recovered)
+    assert recovered.current_location == "garden" and recovered.inventory == ["matches"]
+
+def test_rewind_after_loading_a_slot_stays_within_the_loaded_game(tmp_path):
+    slots = SaveSlots(str(tmp_path / "saves"))
+    game_state = GameState()
+    _play(game_state, slots, ["take matches", "move east", "save foyer", "move east", "take old_key"])
+
+    # Loaded outside a command, the slot's earlier turns are still not there to rewind to
+    slots.load("foyer", game_state)
+    assert game_state.history.turn == game_state.history.floor == 2
+    result = COMMANDS.dispatch("rewind 1", game_state)
+    assert not result.success and "out of range" in result.message
+    assert game_state.current_location == "foyer" and game_state.inventory == ["matches"]
+
+    _play(game_state, slots, ["move east", "take old_key"])
+    assert COMMANDS.dispatch("rewind 2", game_state).success
+    assert game_state.current_location == "foyer" and game_state.inventory == ["matches"]
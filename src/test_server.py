@@ -0,0 +1,143 @@
+import asyncio
+import json
+from pathlib import Path
+from GameServer import PROMPT, GameServer
+from GameState import GameState
+from load_test import drive_clients
+
+PROMPT_BYTES = PROMPT.encode("utf-8")
+
+async def _started(**options) -> GameServer:
+    server = GameServer(**options)
+    await server.start()
+    return server
+
+def test_sessions_are_independent_and_driven_by_process_command():
+    async def scenario():
+        server = await _started()
+        first = await asyncio.open_connection(*server.address)
+        second = await asyncio.open_connection(*server.address)
+        for reader, _ in (first, second):
+            await reader.readuntil(PROMPT_BYTES)
+
+        first[1].write(b"move east\n")
+        moved = (await first[0].readuntil(PROMPT_BYTES)).decode("utf-8")
+        second[1].write(b"look\n")
+        looked = (await second[0].readuntil(PROMPT_BYTES)).decode("utf-8")
+
+        for _, writer in (first, second):
+            writer.close()
+        await server.shutdown()
+        return moved, looked
+
+    moved, looked = asyncio.run(scenario())
+    assert "You are now in the Foyer." in moved
+    assert "You are currently in the Garden." in looked
+
+def test_idle_connections_time_out():
+    async def scenario():
+        server = await _started(read_timeout=0.05)
+        reader, writer = await asyncio.open_connection(*server.address)
+        await reader.readuntil(PROMPT_BYTES)
+        farewell = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        await server.shutdown()
+        return farewell.decode("utf-8")
+
+    assert "too long" in asyncio.run(scenario())
+
+def test_shutdown_flushes_every_session_save(tmp_path: Path):
+    async def scenario():
+        server = await _started(save_dir=str(tmp_path))
+        reader, writer = await asyncio.open_connection(*server.address)
+        await reader.readuntil(PROMPT_BYTES)
+        writer.write(b"move east\n")
+        await reader.readuntil(PROMPT_BYTES)
+        await server.shutdown()
+        goodbye = await reader.read()
+        writer.close()
+        return goodbye.decode("utf-8")
+
+    assert "saved" in asyncio.run(scenario())
+    saves = list(tmp_path.glob("session-*.json"))
+    assert len(saves) == 1
+    assert json.loads(saves[0].read_text())["current_location"] == "foyer"
+
+def test_small_load_test_completes_without_errors():
+    """
+    A scaled-down version of load_test.py: every client plays the whole script.
+    """
+    async def scenario():
+        server = await _started()
+        results = await drive_clients(server.address, clients=50)
+        await server.shutdown()
+        return results
+
+    results = asyncio.run(scenario())
+    assert results["errors"] == 0
+    assert results["commands"] == 50 * 8
+    assert results["p99_ms"] >= results["p50_ms"] > 0
+
+def test_a_network_load_never_reads_the_servers_own_save(tmp_path: Path, monkeypatch):
+    operator = GameState()
+    operator.move_player("east")
+    operator.move_player("east")
+    monkeypatch.chdir(tmp_path)
+    operator.save_to_file("savegame.json")
+
+    async def scenario():
+        server = await _started()
+        reader, writer = await asyncio.open_connection(*server.address)
+        await reader.readuntil(PROMPT_BYTES)
+        replies = []
+        for command in (b"load\n", b"look\n"):
+            writer.write(command)
+            replies.append((await reader.readuntil(PROMPT_BYTES)).decode("utf-8"))
+        writer.close()
+        await server.shutdown()
+        return replies
+
+    loaded, looked = asyncio.run(scenario())
+    assert "disabled" in loaded
+    assert "You are currently in the Garden." in looked
+
+def test_a_failing_command_keeps_the_connection(monkeypatch):
+    def broken(self):
+        raise RuntimeError("broken")
+    monkeypatch.setattr(GameState, "describe_current_location", broken)
+
+    async def scenario():
+        server = await _started()
+        reader, writer = await asyncio.open_connection(*server.address)
+        await reader.readuntil(PROMPT_BYTES)
+        replies = []
+        for command in (b"look\n", b"inventory\n"):
+            writer.write(command)
+            replies.append((await reader.readuntil(PROMPT_BYTES)).decode("utf-8"))
+        writer.close()
+        await server.shutdown()
+        return replies, server.commands_failed
+
+    (failed, carried_on), failures = asyncio.run(scenario())
+    assert "Something went wrong" in failed
+    assert "nothing" in carried_on
+    assert failures == 1
+
+def test_saved_sessions_are_resumed_by_the_token_shown_on_connecting(tmp_path: Path):
+    async def play(commands):
+        server = await _started(save_dir=str(tmp_path))
+        reader, writer = await asyncio.open_connection(*server.address)
+        replies = [(await reader.readuntil(PROMPT_BYTES)).decode("utf-8")]
+        for command in commands:
+            writer.write(command.encode("utf-8") + b"\n")
+            replies.append((await reader.readuntil(PROMPT_BYTES)).decode("utf-8"))
+        writer.close()
+        await server.shutdown()
+        return replies
+
+    greeting, _ = asyncio.run(play(["take matches"]))
+    token = greeting.split("resume ")[1][:32]
+    assert (tmp_path / f"session-{token}.json").exists()
+    _, resumed, inventory = asyncio.run(play([f"resume {token}", "inventory"]))
+    assert "You are in the Garden." in resumed and "matches" in inventory
+    assert "There is no session" in asyncio.run(play(["resume " + "0" * 32]))[1]
@@ -0,0 +1,149 @@
+import asyncio
+from pathlib import Path
+
+from GameServer import PROMPT, GameServer
+from SessionManager import SessionManager
+
+PROMPT_BYTES = PROMPT.encode("utf-8")
+
+def test_lru_hibernates_and_rehydrates_transparently(tmp_path: Path):
+    sessions = SessionManager(str(tmp_path), max_resident=2, max_idle=None)
+    sessions.run("alice", "move east")
+    sessions.run("bob", "look")
+    sessions.run("carol", "look")
+    sessions.run("carol", "look")
+
+    # alice was least recently used, so she was hibernated to make room
+    assert sessions.resident == 2
+    sessions.flush()
+    assert Path(sessions.path("alice")).exists()
+
+    game_state = sessions.get("alice")
+    assert game_state.current_location == "foyer"
+    assert "foyer" in game_state.visited_locations
+    stats = sessions.stats()
+    assert stats["rehydrations"] == 1
+    assert stats["resident"] == 2
+    assert 0 < stats["hit_rate"] < 1
+    sessions.close()
+
+def test_idle_sessions_are_hibernated(tmp_path: Path):
+    sessions = SessionManager(str(tmp_path), max_idle=60)
+    sessions.run("alice", "take matches")
+    assert sessions.evict_idle() == 0
+    assert sessions.evict_idle(now=sessions._resident["alice"].last_used + 61) == 1
+    assert sessions.resident == 0
+
+    assert "matches" in sessions.get("alice").inventory
+    sessions.close()
+
+def test_memory_budget_limits_resident_sessions(tmp_path: Path):
+    sessions = SessionManager(str(tmp_path), memory_budget=4096, session_bytes=1024)
+    for number in range(10):
+        sessions.get(f"player-{number}")
+    assert sessions.resident == 4
+    sessions.close()
+
+def test_unchanged_sessions_are_not_rewritten(tmp_path: Path):
+    sessions = SessionManager(str(tmp_path), max_resident=1, max_idle=None)
+    sessions.run("alice", "move east")
+    sessions.get("bob")
+    assert sessions.snapshots_written == 1
+
+    sessions.run("alice", "inventory")
+    sessions.get("bob")
+    # Checking the inventory changes nothing, so alice's snapshot is not written again
+    assert sessions.snapshots_written == 1
+    assert sessions.get("alice").current_location == "foyer"
+    sessions.close()
+
+def test_close_writes_every_resident_session(tmp_path: Path):
+    sessions = SessionManager(str(tmp_path))
+    sessions.run("alice", "move east")
+    sessions.close()
+
+    reopened = SessionManager(str(tmp_path))
+    assert reopened.get("alice").current_location == "foyer"
+    reopened.close()
+
+def test_server_hibernates_sessions_when_players_leave(tmp_path: Path):
+    async def scenario(sessions: SessionManager):
+        server = GameServer(sessions=sessions)
+        await server.start()
+        reader, writer = await asyncio.open_connection(*server.address)
+        await reader.readuntil(PROMPT_BYTES)
+        writer.write(b"move east\n")
+        moved = await reader.readuntil(PROMPT_BYTES)
+        writer.close()
+        await server.shutdown()
+        return moved.decode("utf-8")
+
+    sessions = SessionManager(str(tmp_path))
+    assert "Foyer" in asyncio.run(scenario(sessions))
+    assert sessions.resident == 0
+    sessions.close()
+    assert len(list(tmp_path.glob("*.sav"))) == 1
+
+def test_sessions_are_resumed_by_token_after_a_restart(tmp_path: Path):
+    async def play(commands):
+        sessions = SessionManager(str(tmp_path))
+        server = GameServer(sessions=sessions)
+        await server.start()
+        reader, writer = await asyncio.open_connection(*server.address)
+        replies = [(await reader.readuntil(PROMPT_BYTES)).decode("utf-8")]
+        for command in commands:
+            writer.write(command.encode("utf-8") + b"\n")
+            replies.append((await reader.readuntil(PROMPT_BYTES)).decode("utf-8"))
+        writer.close()
+        await server.shutdown()
+        sessions.close()
+        return replies
+
+    greeting, _ = asyncio.run(play(["take matches"]))
+    token = greeting.split("resume ")[1][:32]
+    # A new connection after the restart starts a new game rather than whichever hibernated first
+    fresh = asyncio.run(play(["inventory"]))
+    assert "nothing" in fresh[1]
+    resumed = asyncio.run(play([f"resume {token}", "inventory"]))
+    assert "You are in the Garden." in resumed[1]
+    assert "matches" in resumed[2]
+    assert "There is no session" in asyncio.run(play(["resume " + "0" * 32]))[1]
+
+    async def finish():
+        sessions = SessionManager(str(tmp_path))
+        server = GameServer(sessions=sessions)
+        await server.start()
+        reader, writer = await asyncio.open_connection(*server.address)
+        await reader.readuntil(PROMPT_BYTES)
+        writer.write(f"resume {token}\nquit\n".encode("utf-8"))
+        await reader.read()
+        writer.close()
+        await server.shutdown()
+        sessions.close()
+        return sessions.exists(token)
+
+    # A game that is over is not kept
+    assert not asyncio.run(finish())
+    assert not (tmp_path / f"{token}.sav").exists()
+
+def test_a_failed_write_is_logged_and_the_writer_carries_on(tmp_path: Path, monkeypatch, caplog):
+    import SessionManager as session_manager
+
+    def full_disk(filename, data):
+        raise OSError(28, "No space left on device")
+
+    sessions = SessionManager(str(tmp_path), max_idle=None)
+    sessions.run("alice", "move east")
+    with monkeypatch.context() as patch:
+        patch.setattr(session_manager, "atomic_write", full_disk)
+        sessions.hibernate("alice")
+        sessions.flush()
+    assert sessions.stats()["write_errors"] == 1
+    assert "Could not write the snapshot of session alice" in caplog.text
+    # The snapshot is still held in memory, and the next write gets through
+    assert sessions.get("alice").current_location == "foyer"
+    sessions.run("alice", "move east")
+    sessions.hibernate("alice")
+    sessions.flush()
+    assert Path(sessions.path("alice")).exists()
+    sessions.close()
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import signal
+
+from Commands import COMMANDS
+from GameServer import PROMPT
+from GameState import GameState
+from ShardedServer import Supervisor, release_exits, share_exits
+from World import DEFAULT_WORLD_FILE, read_world
+from load_test import drive_clients
+
+PROMPT_BYTES = PROMPT.encode("utf-8")
+
+async def _play(address, commands):
+    reader, writer = await asyncio.open_connection(*address)
+    replies = [(await reader.readuntil(PROMPT_BYTES)).decode("utf-8")]
+    for command in commands:
+        writer.write(command.encode("utf-8") + b"\n")
+        replies.append((await reader.readuntil(PROMPT_BYTES)).decode("utf-8"))
+    writer.close()
+    return replies
+
+def test_sessions_are_spread_over_the_workers():
+    async def scenario():
+        supervisor = Supervisor(workers=3)
+        await supervisor.start()
+        try:
+            reader, writer = await asyncio.open_connection(*supervisor.address)
+            await reader.readuntil(PROMPT_BYTES)
+            live = supervisor.stats()["sessions"]
+            writer.close()
+            results = await drive_clients(supervisor.address, 60, ["look", "move east"])
+            replies = await _play(supervisor.address, ["take matches", "inventory"])
+            # Sessions are counted until their workers report them ended
+            for _ in range(100):
+                stats = supervisor.stats()
+                if stats["sessions"] == 0:
+                    break
+                await asyncio.sleep(0.05)
+        finally:
+            await supervisor.shutdown()
+        return live, results, replies, stats
+
+    live, results, replies, stats = asyncio.run(scenario())
+    assert live == 1
+    assert results["errors"] == 0 and results["commands"] == 120
+    assert "matches" in replies[-1]
+    assert stats["handed_off"] == 62 and stats["sessions"] == 0
+    assert all(worker["handed_off"] > 0 for worker in stats["workers"].values())
+
+def test_routing_only_moves_the_sessions_of_a_dead_worker():
+    async def scenario():
+        supervisor = Supervisor(workers=4, respawn=False)
+        await supervisor.start()
+        try:
+            before = {session_id: supervisor.route(session_id).slot for session_id in range(1, 400)}
+            victim = supervisor.route(1)
+            os.kill(victim.process.pid, signal.SIGKILL)
+            while victim.slot in supervisor.live_workers:
+                await asyncio.sleep(0.01)
+            after = {session_id: supervisor.route(session_id).slot for session_id in before}
+            # The survivors still serve new players
+            replies = await _play(supervisor.address, ["look"])
+            deaths = supervisor.deaths
+        finally:
+            await supervisor.shutdown()
+        return victim.slot, before, after, replies, deaths
+
+    victim, before, after, replies, deaths = asyncio.run(scenario())
+    assert deaths == 1
+    assert "Garden" in replies[-1]
+    for session_id, slot in before.items():
+        if slot == victim:
+            assert after[session_id] != victim
+        else:
+            assert after[session_id] == slot
+    # The dead worker's share is spread over all three survivors
+    assert len({after[session_id] for session_id, slot in before.items() if slot == victim}) == 3
+
+def test_dead_workers_are_replaced():
+    async def scenario():
+        supervisor = Supervisor(workers=2)
+        await supervisor.start()
+        try:
+            first = supervisor.route(1).process.pid
+            os.kill(first, signal.SIGKILL)
+            while supervisor.deaths == 0 or len(supervisor.live_workers) < 2:
+                await asyncio.sleep(0.01)
+            results = await drive_clients(supervisor.address, 20, ["look"])
+            pids = [worker["pid"] for worker in supervisor.stats()["workers"].values()]
+        finally:
+            await supervisor.shutdown()
+        return first, pids, results
+
+    first, pids, results = asyncio.run(scenario())
+    assert first not in pids and len(pids) == 2
+    assert results["errors"] == 0
+
+def test_the_exit_table_is_in_shared_memory():
+    async def scenario():
+        supervisor = Supervisor(workers=1)
+        await supervisor.start()
+        try:
+            exits = supervisor.world.exits
+            shared = isinstance(exits, memoryview) and exits.obj is not None
+            replies = await _play(supervisor.address, ["move east", "move north"])
+        finally:
+            await supervisor.shutdown()
+        return shared, replies, supervisor.world.exits
+
+    shared, replies, exits = asyncio.run(scenario())
+    assert shared
+    assert "Staircase" in replies[-1]
+    # Released on shutdown, leaving an ordinary table behind
+    assert len(exits) > 0 and not isinstance(exits, memoryview)
+
+def test_go_works_with_the_exit_table_in_shared_memory():
+    world = read_world(DEFAULT_WORLD_FILE)
+    memory = share_exits(world)
+    try:
+        game_state = GameState(world)
+        for command in ["move east", "move east", "move west", "move west"]:
+            COMMANDS.dispatch(command, game_state)
+        result = COMMANDS.dispatch("go study", game_state)
+    finally:
+        release_exits(world, memory)
+    assert result.success and game_state.current_location == "study"
+
+    async def scenario():
+        supervisor = Supervisor(workers=1)
+        await supervisor.start()
+        try:
+            return await _play(supervisor.address, ["move east", "move west", "go foyer", "look"])
+        finally:
+            await supervisor.shutdown()
+
+    replies = asyncio.run(scenario())
+    assert "You make your way to the Foyer" in replies[3]
+    assert "You are currently in the Foyer." in replies[4]
+
+def test_resumes_reach_the_worker_holding_the_session(tmp_path):
+    async def scenario():
+        supervisor = Supervisor(workers=3, hibernate_dir=str(tmp_path))
+        await supervisor.start()
+        try:
+            players = []
+            for _ in range(6):
+                reader, writer = await asyncio.open_connection(*supervisor.address)
+                greeting = (await reader.readuntil(PROMPT_BYTES)).decode("utf-8")
+                writer.write(b"take matches\n")
+                await reader.readuntil(PROMPT_BYTES)
+                players.append((greeting.split("resume ")[1][:32], writer))
+            replies = []
+            # Still open elsewhere, so only the worker holding each session has it: none is on disk yet
+            for token, _ in players:
+                reader, writer = await asyncio.open_connection(*supervisor.address)
+                await reader.readuntil(PROMPT_BYTES)
+                # Sent in one go, so the inventory command travels with the handed-back connection
+                writer.write(f"resume {token}\ninventory\n".encode("ascii"))
+                replies.append([(await reader.readuntil(PROMPT_BYTES)).decode("utf-8") for _ in range(2)])
+                writer.close()
+            for _, writer in players:
+                writer.close()
+            refused = await _play(supervisor.address, ["resume " + "0" * 32, "take matches"])
+        finally:
+            await supervisor.shutdown()
+        return replies, refused
+
+    replies, refused = asyncio.run(scenario())
+    for resumed, inventory in replies:
+        assert "You pick up where you left off." in resumed
+        assert "matches" in inventory
+    assert "There is no session" in refused[1]
+    assert "You pick up the matches." in refused[2]
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+
+from Commands import COMMANDS
+from GameServer import PROMPT, GameServer
+from GameState import GameState
+from SaveSlots import SaveSlots
+from SharedWorld import SharedWorld
+from load_test import SHARED_SCRIPT, drive_clients
+
+PROMPT_BYTES = PROMPT.encode("utf-8")
+
+def _join(shared, name):
+    events = []
+    game_state = shared.join(name, lambda text, now: events.append(text))
+    return game_state, events
+
+def test_items_taken_by_one_player_are_gone_for_the_others():
+    shared = SharedWorld()
+    first, _ = _join(shared, "first")
+    second, second_events = _join(shared, "second")
+    assert COMMANDS.dispatch("take matches", first).success
+    assert "matches" in first.inventory
+    assert "matches" not in second.items_at("garden")
+    assert not COMMANDS.dispatch("take matches", second).success
+    assert "first picks up the matches." in second_events
+    # Each player keeps an inventory of their own
+    assert second.inventory == []
+
+def test_an_item_is_taken_only_once_under_contention():
+    shared = SharedWorld()
+    players = [_join(shared, f"detective{index}")[0] for index in range(16)]
+    barrier = threading.Barrier(len(players))
+    taken = []
+
+    def grab(game_state):
+        barrier.wait()
+        if COMMANDS.dispatch("take matches", game_state).success:
+            taken.append(game_state.name)
+
+    threads = [threading.Thread(target=grab, args=(game_state,)) for game_state in players]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(taken) == 1
+
+def test_events_reach_only_the_players_in_the_room():
+    shared = SharedWorld()
+    mover, mover_events = _join(shared, "mover")
+    stayer, stayer_events = _join(shared, "stayer")
+    watcher, watcher_events = _join(shared, "watcher")
+    COMMANDS.dispatch("move east", watcher)
+    watcher_events.clear()
+    stayer_events.clear()
+
+    COMMANDS.dispatch("move east", mover)
+    assert stayer_events == ["mover leaves east."]
+    assert watcher_events == ["mover arrives."]
+    assert shared.occupants(shared.world.room_ids["foyer"]) == ["watcher", "mover"]
+
+    COMMANDS.dispatch("take bloody_handkerchief", mover)
+    assert watcher_events[-1] == "mover picks up the bloody_handkerchief."
+    assert stayer_events == ["mover leaves east."]
+    assert mover_events[-1] == "watcher leaves east."
+
+    shared.leave(stayer)
+    assert shared.occupants(shared.world.room_ids["garden"]) == []
+
+def test_opened_rooms_stay_open_for_everyone():
+    shared = SharedWorld()
+    opener, _ = _join(shared, "opener")
+    other, _ = _join(shared, "other")
+    opener.inventory = ["old_key"]
+    opener.current_location = "staircase"
+    other.current_location = "staircase"
+    assert other.is_locked("master_bedroom")
+    assert COMMANDS.dispatch("move west", opener).success
+    assert not other.is_locked("master_bedroom")
+    assert COMMANDS.dispatch("move west", other).success
+    assert other.current_location == "master_bedroom"
+
+def test_hints_and_routes_see_rooms_opened_by_others():
+    shared = SharedWorld()
+    opener, _ = _join(shared, "opener")
+    other, _ = _join(shared, "other")
+    opener.inventory = ["carving_knife"]
+    opener.current_location = "kitchen"
+    other.inventory = ["old_key", "carving_knife"]
+    other.current_location = "foyer"
+    other.visited_locations = ["garden", "foyer", "kitchen", "cellar"]
+    assert "The Cellar is locked" in COMMANDS.dispatch("hint", other).message
+    assert COMMANDS.dispatch("move south", opener).success
+    assert other._unlocked == 1 << shared.world.room_ids["cellar"]
+    assert "Cellar is locked" not in COMMANDS.dispatch("hint", other).message
+    result = COMMANDS.dispatch("go cellar", other)
+    assert result.success and "(2 moves)" in result.message
+    assert other.current_location == "cellar"
+
+def test_shared_server_reports_contention_and_broadcast_latency():
+    async def scenario():
+        shared = SharedWorld()
+        server = GameServer(shared=shared, threads=4)
+        await server.start()
+        results = await drive_clients(server.address, 30, SHARED_SCRIPT)
+        await server.shutdown()
+        return shared, server, results
+
+    shared, server, results = asyncio.run(scenario())
+    assert results["errors"] == 0
+    assert shared.stats()["lock_acquisitions"] >= 30 * len(SHARED_SCRIPT) // 2
+    assert server.broadcast_latency.count > 0
+    assert server.events_dropped == 0
+
+def test_loading_a_save_leaves_the_shared_manor_alone(tmp_path):
+    shared = SharedWorld()
+    first, _ = _join(shared, "first")
+    second, _ = _join(shared, "second")
+    slots = SaveSlots(str(tmp_path / "saves"))
+    single = GameState(shared.world)
+    for command in ["take matches", "move east", "move south", "take carving_knife", "move south",
+                    "save cellar"]:
+        COMMANDS.dispatch(command, single, slots=slots)
+    rooms, unlocked = dict(shared.room_items), shared.unlocked
+
+    result = COMMANDS.dispatch("load cellar", first, slots=slots)
+    assert not result.success and "shared manor" in result.message
+    assert first._room_items is shared.room_items and second._room_items is shared.room_items
+    assert shared.room_items == rooms and shared.unlocked == unlocked == 0
+    assert first.current_location == "garden" and first.inventory == []
+    assert "matches" in second.items_at("garden")
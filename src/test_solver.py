@@ -0,0 +1,54 @@
+import json
+from GameLoop import process_command
+from GameState import GameState
+from Solver import solve
+from World import DEFAULT_WORLD_FILE, World
+
+def _manor_definition():
+    with open(DEFAULT_WORLD_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def test_manor_is_winnable_and_the_solution_replays():
+    """
+    The solver's shortest solution should win the game when played through the real engine.
+    """
+    report = solve()
+    assert report.solvable and report.complete
+    assert report.solution[-1] == "use incriminating_ledger"
+    game_state = GameState()
+    for command in report.solution:
+        process_command(command, game_state)
+    assert game_state.is_over and game_state.solved
+    assert report.unreachable_rooms == [] and report.dead_ends == 0
+    assert "rare_seed_pouch" in report.reachable_items
+
+def test_solver_continues_from_a_game_in_progress():
+    game_state = GameState()
+    for command in ["move east", "move south", "take carving_knife", "move south", "take lantern"]:
+        process_command(command, game_state)
+    report = solve(game_state)
+    assert len(report.solution) == len(solve().solution) - 5
+
+def test_a_wrong_lock_makes_the_ending_unreachable():
+    definition = _manor_definition()
+    definition["rooms"]["master_bedroom"]["required_item"] = "rare_seed_pouch"
+    definition["rooms"]["greenhouse"]["locked"] = True
+    definition["rooms"]["greenhouse"]["required_item"] = "rare_seed_pouch"
+    report = solve(GameState(World(definition)))
+    assert not report.solvable and report.solution == []
+    assert {"master_bedroom", "greenhouse"} <= set(report.unreachable_rooms)
+    assert "rare_seed_pouch" in report.unreachable_items
+
+def test_dead_ends_are_found():
+    definition = {
+        "start": "hall",
+        "rooms": {
+            "hall": {"description": "A hall.", "exits": {"east": "pit", "north": "study"}},
+            "pit": {"description": "A pit with no way out.", "exits": {}},
+            "study": {"description": "A study.", "exits": {"south": "hall"}, "items": ["confession"]},
+        },
+        "rules": [{"item": "confession", "location": "study", "effects": {"end_game": True}, "message": "Solved."}],
+    }
+    report = solve(GameState(World(definition)))
+    assert report.solution == ["move north", "take confession", "use confession"]
+    assert report.dead_ends >= 1 and report.dead_end_path == ["move east"]
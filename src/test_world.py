@@ -0,0 +1,142 @@
+import tracemalloc
+import pytest
+from GameState import GameState
+from World import World, load_world
+
+def test_world_is_shared_between_sessions():
+    """
+    Every GameState should reference the same compiled world rather than its own copy.
+    """
+    first, second = GameState(), GameState()
+    assert first.world is second.world
+    assert first.world is load_world()
+
+def test_compiled_world_matches_definition():
+    world = load_world()
+    foyer = world.room("foyer")
+    assert world.rooms[foyer.id] is foyer
+    assert world.exits_of(foyer.id) == {
+        "west": "drawing_room",
+        "east": "study",
+        "south": "kitchen",
+        "north": "staircase"
+    }
+    assert world.exit_target(foyer.id, "up") is None
+    assert world.room("cellar").locked and world.room("cellar").required_item == "carving_knife"
+    assert world.room("garden").items == ("cigarette_case", "matches")
+
+def test_session_changes_do_not_leak_into_other_sessions():
+    first, second = GameState(), GameState()
+    first.pick_up_item("matches")
+    assert "matches" not in first.items_at("garden")
+    assert "matches" in second.items_at("garden")
+    assert first.world.room("garden").items == ("cigarette_case", "matches")
+
+def test_invalid_world_definition_is_rejected():
+    with pytest.raises(ValueError):
+        World({"start": "garden", "rooms": {"garden": {"description": "", "exits": {"east": "nowhere"}}}})
+    with pytest.raises(ValueError):
+        World({"start": "nowhere", "rooms": {"garden": {"description": ""}}})
+
+def test_session_memory_scales_with_changes_not_world_size():
+    """
+    Holds 10k concurrent sessions and checks that a fresh session stores no copy of the
+    world, and that a session's footprint only grows with what the player changed.
+    """
+    count = 10000
+    tracemalloc.start()
+    try:
+        start, _ = tracemalloc.get_traced_memory()
+        sessions = [GameState() for _ in range(count)]
+        fresh, _ = tracemalloc.get_traced_memory()
+        for session in sessions:
+            session.pick_up_item("matches")
+        touched, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    fresh_per_session = (fresh - start) / count
+    touched_per_session = (touched - fresh) / count
+    assert fresh_per_session < 1024, f"{fresh_per_session:.0f} bytes per fresh session"
+    assert touched_per_session < 512, f"{touched_per_session:.0f} bytes per changed room"
+    assert all(session.items_at("garden") == ["cigarette_case"] for session in sessions)
+
+def test_item_catalog_is_shared_and_loaded_on_first_examine(tmp_path):
+    (tmp_path / "items.json").write_text('{"lamp": "A brass lamp."}')
+    world = World({"start": "hall", "item_text": "items.json",
+                   "rooms": {"hall": {"description": "A hall.", "items": ["lamp", "rock"]}}},
+                  base_dir=str(tmp_path))
+    first, second = GameState(world), GameState(world)
+    assert not world.catalog.loaded
+    assert first.examine_item("lamp") == "A brass lamp."
+    assert world.catalog.loaded
+    assert second.examine_item("rock") == "It's a rock. Nothing special."
+
+def test_can_see_checks_inventory_and_current_room():
+    game = GameState()
+    assert game.can_see("matches")
+    assert not game.can_see("lantern")
+    game.pick_up_item("matches")
+    game.move_player("east")
+    assert game.can_see("matches") and game.can_see("bloody_handkerchief")
+    assert not game.can_see("cigarette_case")
+    assert "manor’s crest" in game.examine_item("matches")
+
+def test_inventory_is_a_bitset_that_still_behaves_like_a_list():
+    """
+    The inventory keeps pickup order for display and saves, but membership is a bit test.
+    """
+    game_state = GameState()
+    game_state.inventory = ["old_key", "rope"]
+    game_state.inventory.append("old_key")
+    assert game_state.inventory == ["old_key", "rope"]
+    assert game_state.inventory.has_all(1 << game_state.world.item_ids["old_key"])
+    game_state.inventory.remove("old_key")
+    assert "old_key" not in game_state.inventory and list(game_state.inventory) == ["rope"]
+
+def test_names_unknown_to_the_world_are_kept():
+    game_state = GameState()
+    state = GameState().save_state()
+    state.update(inventory=["heirloom"], visited_locations=["attic"])
+    game_state.load_state(state)
+    assert "heirloom" in game_state.inventory
+    assert game_state.save_state()["visited_locations"] == ["attic"]
+
+def test_unlocked_rooms_round_trip_through_the_lock_bitmask():
+    game_state = GameState()
+    game_state.current_location = "kitchen"
+    game_state.inventory = ["carving_knife"]
+    assert game_state.is_locked("cellar")
+    game_state.use_item("carving_knife")
+    assert not game_state.is_locked("cellar")
+    restored = GameState()
+    restored.load_state(game_state.save_state())
+    assert not restored.is_locked("cellar") and restored.is_locked("master_bedroom")
+
+def test_unchanged_rooms_render_from_the_shared_cache():
+    first, second = GameState(), GameState()
+    assert first.describe_current_location() is second.describe_current_location()
+    assert first.world.room("master_bedroom").title == "Master Bedroom"
+
+def test_rendering_follows_item_changes_in_the_room():
+    """
+    Picking up or revealing an item must invalidate only this session's rendering of that room.
+    """
+    game_state, other = GameState(), GameState()
+    game_state.pick_up_item("matches")
+    assert game_state.describe_current_location().endswith("You see: cigarette_case")
+    assert game_state.describe_current_location() is game_state.describe_current_location()
+    game_state.pick_up_item("cigarette_case")
+    assert "You see" not in game_state.describe_current_location()
+    assert other.describe_current_location().endswith("You see: cigarette_case, matches")
+
+    game_state.current_location = "greenhouse"
+    game_state.inventory = ["pruning_shears"]
+    before = game_state.describe_current_location()
+    game_state.use_item("pruning_shears")
+    assert game_state.describe_current_location() == before + ", rare_seed_pouch"
+
+    restored = GameState()
+    restored.load_state(GameState().save_state())
+    restored.current_location = "greenhouse"
+    assert restored.describe_current_location() == before